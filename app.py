@@ -1,20 +1,40 @@
 import os
-import re
 import json
+import math
+import shutil
 import tempfile
+import uuid
 from datetime import datetime
 from io import BytesIO
+from urllib.parse import quote
 from flask_session import Session
 
 
-import requests
 from flask import (
     Flask, render_template, request, redirect, url_for,
-    session, send_file, flash
+    session, send_file, flash, Response, stream_with_context, jsonify
 )
 
 # === Твои модули/конфиги ===
-from config import Config  # динамически грузит varables/*.json :contentReference[oaicite:4]{index=4}
+from flow_store import FlowStore  # серверное хранилище flow_ctx/кодов/логов
+from jobs import JobEngine        # фоновый прогон цепочки
+from batch_transfer import (       # пакетный запуск
+    load_manifest, start_batch, batch_report, settings as batch_settings
+)
+import bulk_ungroup               # массовая разгруппировка
+import requests_service_async     # фоновый event loop для разгруппировки
+import app_logging                # уровни/сводки/JSON-lines (секция LOGGING)
+import metrics                    # длительности/размеры шагов → /metrics
+from code_check import normalize_codes   # КИ/SSCC: дубли, GS1
+from milk_xml import generate_xml   # молочный JSON → XML (общий с milk_batch)
+import milk_batch                 # пакетная конвертация JSON → XML (ZIP)
+from milk_cache import MilkUploads, preview   # загрузки JSON по хэшу + LRU-кэш разбора
+from code_diff import diff_codes  # сравнение N списков кодов (сводка + постраничные различия)
+from transfer_flow import (       # машина шагов auth1 → ... → incom2
+    Step, FlowError, first_step, next_step, send_step, use_cached_auth, log
+)
+from dates import check_dates        # даты → YYYY-MM-DD пачкой (doc_date файлов)
+from move_cache import default_cache  # разобранные XML перемещения по sha256 (секция MOVE_CACHE)
 from requests_service import (
     send_auth_request,        # авторизация   :contentReference[oaicite:5]{index=5}
     send_accept_request,      # заявка на приёмку
@@ -25,6 +45,7 @@ from requests_service import (
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
+app.json.ensure_ascii = False                        # tojson в шаблоне — кириллица как есть
 # --- серверные сессии ---
 app.config['SESSION_TYPE'] = 'filesystem'          # хранить сессии на диске
 app.config['SESSION_FILE_DIR'] = './.flask_session'  # каталог для файлов
@@ -32,6 +53,18 @@ app.config['SESSION_PERMANENT'] = False
 app.config['SESSION_USE_SIGNER'] = True
 app.config['SESSION_FILE_THRESHOLD'] = 200          # максимум файлов
 Session(app)
+app_logging.configure()
+# --- состояние цепочек перемещения: на сервере, в сессии только flow_id ---
+FLOWS = FlowStore(os.path.join(".", ".flow_store", "flows.sqlite3"))
+FLOWS.maybe_cleanup()     # брошенные цепочки старше MAX_AGE — при старте и дальше не чаще раза в час
+JOBS = JobEngine(FLOWS)   # фоновые цепочки (когда DEBUG_MODE выключен)
+BATCH_JOBS = JobEngine(FLOWS, vendor_limits={"*": 2})   # пакеты по манифесту — отдельный пул
+BATCHES = {}              # batch_id → пакет (batch_transfer.start_batch), живут до рестарта
+UNGROUP_JOBS = {}         # job_id → прогресс разгруппировки (bulk_ungroup.run_ungroup)
+KEEP_FINISHED = 20        # завершённых пакетов/разгруппировок держим в памяти (последние), остальные выкидываем
+UNGROUP_DIR = os.path.join(".", ".flow_store", "ungroup")   # checkpoint-файлы
+MILK = MilkUploads()      # молочные JSON: файл по sha256 + разобранный документ в LRU (секция MILK_CACHE)
+MOVES = default_cache()   # XML перемещения: SSCC + doc_num/doc_date по sha256 файла (секция MOVE_CACHE)
 # =========================
 # 🔧 Режим отладки (debug)
 # =========================
@@ -42,102 +75,33 @@ DEBUG_MODE = True  # 👉 ВКЛ/ВЫКЛ интерактивные подтв
 # ============== Блок 1. МОЛОЧНЫЙ JSON-СЕРВИС =============
 # =========================================================
 
-def parse_json(file_content: str) -> dict:
-    """Разбор молочного JSON (из твоего предыдущего кода)"""
-    try:
-        data = json.loads(file_content)
-    except Exception:
-        return {}
-
-    result = {
-        'producer_inn': data.get('producer_inn') or data.get('participant_inn'),
-        'owner_inn': data.get('owner_inn') or data.get('producer_inn'),
-        'production_date': data.get('production_date', ''),
-        'production_type': data.get('production_type', ''),
-        'products': []
-    }
-
-    if not result['production_type']:
-        result['production_type'] = 'OWN_PRODUCTION' if result['producer_inn'] == result['owner_inn'] else 'CONTRACT_PRODUCTION'
-
-    products = data.get('products_list') or data.get('products') or []
-    for p in products:
-        product = {
-            'uit_code': p.get('uit') or p.get('uit_code', ''),
-            'tnved_code': p.get('tnved_code', ''),
-            'production_date': p.get('production_date', ''),
-            'certificate_number': '',
-            'certificate_date': '',
-            'vsd_number': p.get('vsd_number', '')
-        }
-        certs = p.get('certificate_document_data', [])
-        if certs:
-            c = certs[0]
-            product['certificate_number'] = c.get('certificate_number', '')
-            product['certificate_date'] = c.get('certificate_date', '')
-        result['products'].append(product)
-    return result
-
-
-def generate_xml(data: dict, codes: list[str]) -> BytesIO:
-    """Генерация XML для молочного блока (из твоего кода)"""
-    lines = []
-    codes_clean = [line.strip() for line in codes if line.strip()]
-
-    if data.get('production_type') == 'CONTRACT_PRODUCTION':
-        lines.append('<introduce_contract version="7">')
-        lines.append(f'    <producer_inn>{data.get("producer_inn","")}</producer_inn>')
-        lines.append(f'    <owner_inn>{data.get("owner_inn","")}</owner_inn>')
-        lines.append(f'    <production_date>{data.get("production_date","")}</production_date>')
-        lines.append(f'    <production_order>{data.get("production_type","")}</production_order>')
-    else:
-        lines.append('<introduce_rf version="9">')
-        lines.append(f'    <trade_participant_inn>{data.get("producer_inn","")}</trade_participant_inn>')
-        lines.append(f'    <producer_inn>{data.get("producer_inn","")}</producer_inn>')
-        lines.append(f'    <owner_inn>{data.get("owner_inn","")}</owner_inn>')
-        lines.append(f'    <production_date>{data.get("production_date","")}</production_date>')
-        lines.append(f'    <production_order>{data.get("production_type","")}</production_order>')
-
-    lines.append('    <products_list>')
-
-    p = (data.get('products') or [{}])[0]
-
-    for code in codes_clean:
-        lines.append('        <product>')
-        lines.append(f'            <ki><![CDATA[{code.split("<GS>")[0].strip()}]]></ki>')
-        lines.append(f'            <production_date>{data.get("production_date","")}</production_date>')
-        lines.append(f'            <tnved_code>{p.get("tnved_code","")}</tnved_code>')
-        lines.append('            <certificate_type>CONFORMITY_DECLARATION</certificate_type>')
-        lines.append(f'            <certificate_number>{p.get("certificate_number","")}</certificate_number>')
-        lines.append(f'            <certificate_date>{p.get("certificate_date","")}</certificate_date>')
-        if p.get("vsd_number"):
-            lines.append(f'            <vsd_number>{p["vsd_number"]}</vsd_number>')
-        lines.append('        </product>')
-
-    lines.append('    </products_list>')
-    lines.append('</introduce_contract>' if data.get('production_type') == 'CONTRACT_PRODUCTION' else '</introduce_rf>')
-    return BytesIO("\n".join(lines).encode('utf-8'))
-
-
 @app.route('/milk_upload_json', methods=['POST'])
 def milk_upload_json():
-    """Загрузка JSON на первой вкладке: сохраняем во временный файл и показываем распарсенные поля"""
+    """
+    Загрузка JSON на первой вкладке: разбираем один раз, файл и разбор — в MILK по хэшу,
+    в сессии только хэш (скачивания берут документ из кэша).
+    """
     file = request.files.get('json_file')
     if not file:
         flash("Не выбран JSON-файл")
         return redirect(url_for('index'))
 
-    content = file.read()
     try:
-        text = content.decode('utf-8') if isinstance(content, bytes) else content
-        parsed = parse_json(text)
-        # сохраним исходник в temp — для генерации XML по кнопке
-        f = tempfile.NamedTemporaryFile(delete=False, suffix='.json', mode='w', encoding='utf-8')
-        f.write(text)
-        f.close()
-        session['json_path'] = f.name
-        session['milk_parsed'] = parsed
-        flash("✅ JSON загружен и распарсен")
+        digest, parsed = MILK.save(file.stream)
+        if not parsed:
+            raise ValueError("файл не похож на JSON производителя")
+        session['milk_digest'] = digest
+        flash(f"✅ JSON загружен и распарсен: продуктов {parsed['products_count']}")
+        if len(parsed['combos']) > 1:
+            # XML берёт ТН ВЭД/сертификат первого продукта — предупредим, если они не у всех одинаковые
+            flash(f"⚠️ В JSON {len(parsed['combos'])}{'+' if parsed['combos_truncated'] else ''} "
+                  f"разных сочетаний ТН ВЭД/сертификата — в XML пойдут данные первого продукта")
+        if parsed['bad_dates']:
+            shown = ", ".join(f"{d['field']}={d['value']!r} ×{d['count']}" for d in parsed['bad_dates'][:5])
+            flash(f"⚠️ Нераспознанные даты (оставлены как есть): {shown}")
+        if parsed['suspicious_dates']:
+            shown = ", ".join(f"{d['field']}={d['value']!r} ×{d['count']}" for d in parsed['suspicious_dates'][:5])
+            flash(f"⚠️ Подозрительные даты (проверьте год): {shown}")
     except Exception as e:
         flash(f"Ошибка парсинга JSON: {e}")
     return redirect(url_for('index'))
@@ -146,10 +110,12 @@ def milk_upload_json():
 @app.route('/download_csv', methods=['POST'])
 def download_csv():
     """Скачивание CSV (вкладка 1)"""
-    codes_text = request.form.get('codes', '')
+    checked = normalize_codes(request.form.get('codes', ''), "ki")
     file_name = request.form.get('file_name', 'codes')
-    codes_clean = [line.strip() for line in codes_text.splitlines() if line.strip()]
-    csv_content = "\n".join([c.replace('<GS>', '\x1D') for c in codes_clean])
+    if not checked.ok:
+        flash(f"❌ Коды не прошли проверку — {checked.describe()}")
+        return redirect(url_for('index'))
+    csv_content = "\n".join(checked.codes)   # GS уже символом \x1D
     return send_file(BytesIO(csv_content.encode('utf-8')), mimetype='text/csv',
                      as_attachment=True, download_name=f"{file_name}.csv")
 
@@ -157,106 +123,87 @@ def download_csv():
 @app.route('/download_xml', methods=['POST'])
 def download_xml():
     """Скачивание XML (вкладка 1)"""
-    codes_text = request.form.get('codes', '')
-    codes_clean = [line.strip() for line in codes_text.splitlines() if line.strip()]
+    checked = normalize_codes(request.form.get('codes', ''), "ki")
     file_name = request.form.get('file_name', 'file')
+    if not checked.ok:
+        flash(f"❌ Коды не прошли проверку — {checked.describe()}")
+        return redirect(url_for('index'))
+
+    data = MILK.load(session.get('milk_digest'))
+    if not data:
+        flash("JSON не загружен (или устарел — загрузите заново)")
+        return redirect(url_for('index'))
+    # отдаём chunked-ответом: первый байт уходит сразу, память не растёт с числом кодов
+    return Response(
+        stream_with_context(generate_xml(data, checked, stream=True)),
+        mimetype='application/xml',
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(file_name)}.xml"}
+    )
+
 
-    json_path = session.get('json_path')
-    if not json_path or not os.path.exists(json_path):
-        flash("JSON не загружен")
+@app.route('/milk_batch', methods=['POST'])
+def milk_batch_route():
+    """
+    Пакетная конвертация: ZIP-архив (archive) или набор файлов (files) — <имя>.json + <имя>.txt/.csv.
+    Ответ — ZIP с XML, собирается на лету (report.json в конце).
+    """
+    archive = request.files.get('archive')
+    files = [f for f in request.files.getlist('files') if f and f.filename]
+    if not (archive and archive.filename) and not files:
+        flash("Выберите ZIP-архив или JSON-файлы со списками кодов")
         return redirect(url_for('index'))
 
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = parse_json(f.read())
-    xml_bytes = generate_xml(data, codes_clean)
-    return send_file(xml_bytes, mimetype='application/xml', as_attachment=True, download_name=f"{file_name}.xml")
+    work = tempfile.mkdtemp(prefix="milk-batch-")
+    src = os.path.join(work, "src")
+    os.makedirs(src)
+    try:
+        if archive and archive.filename:
+            milk_batch.unpack_archive(archive.stream, src)
+        for f in files:
+            f.save(os.path.join(src, os.path.basename(f.filename)))
+        jobs = milk_batch.find_jobs(src)
+        if not jobs:
+            raise ValueError("нет JSON-файлов")
+    except Exception as e:
+        shutil.rmtree(work, ignore_errors=True)
+        flash(f"Пакетная конвертация: {e}")
+        return redirect(url_for('index'))
+
+    name = request.form.get('file_name') or f"milk_xml_{datetime.now():%Y%m%d_%H%M%S}"
+    return Response(
+        milk_batch.stream_zip(jobs, work),
+        mimetype='application/zip',
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(name)}.zip"}
+    )
 
 
 # =========================================================
 # ============== Блок 2. XML-ПЕРЕМЕЩЕНИЕ ==================
 # =========================================================
 
-def _clean_xml(text: str) -> str:
-    return re.sub(r"^[^<]+<", "<", text.strip(), flags=re.DOTALL)
-
-def extract_sscc_codes_from_text(xml_text: str) -> list[str]:
-    """Извлекаем все <sscc>...</sscc> из XML (устойчиво к мусору в начале)"""
-    xml_text = _clean_xml(xml_text)
-    # сначала CDATA, затем обычный
-    codes = re.findall(r"<\s*sscc\s*>\s*<!\[CDATA\[(.*?)\]\]>\s*</\s*sscc\s*>", xml_text, flags=re.IGNORECASE)
-    if not codes:
-        codes = re.findall(r"<\s*sscc\s*>\s*([^<]+)\s*</\s*sscc\s*>", xml_text, flags=re.IGNORECASE)
-    return [c.strip() for c in codes if c and c.strip()]
-
-def parse_move_info(xml_text: str) -> dict:
-    """Достаём doc_num и doc_date (YYYY-MM-DD) из <move_order_notification> (или просто doc_num/doc_date в документе)"""
-    xml_text = _clean_xml(xml_text)
-    out = {}
-    m_num = re.search(r"<\s*doc_num\s*>\s*([^<]+)\s*</\s*doc_num\s*>", xml_text, flags=re.IGNORECASE)
-    if m_num:
-        out["doc_num"] = m_num.group(1).strip()
-    m_date = re.search(r"<\s*doc_date\s*>\s*([^<]+)\s*</\s*doc_date\s*>", xml_text, flags=re.IGNORECASE)
-    if m_date:
-        raw = m_date.group(1).strip()
-        iso = None
-        for fmt in ("%d.%m.%Y", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%S%z"):
-            try:
-                dt = datetime.strptime(raw, fmt)
-                iso = dt.strftime("%Y-%m-%d")
-                break
-            except Exception:
-                pass
-        if not iso:
-            m_iso = re.search(r"(\d{4}-\d{2}-\d{2})", raw)
-            if m_iso:
-                iso = m_iso.group(1)
-        if iso:
-            out["doc_date"] = iso
-    return out
-
-def compare_arrays(a: list[str], b: list[str]) -> dict:
-    sa, sb = set(a), set(b)
-    return {
-        "equal": sa == sb,
-        "only_in_first": sorted(sa - sb),
-        "only_in_second": sorted(sb - sa)
-    }
-
-def vendor_base_url(cfg: Config, vendor: str) -> str:
-    vendor = vendor.strip().upper()
-    try:
-        return getattr(getattr(cfg, vendor), "dev")
-    except Exception:
-        raise ValueError(f"Нет ссылки dev для {vendor} в varables/links.json")
-OBJECT_TO_MD = {
-    "431982": "27",
-    "528771": "45",
-    "3057": "5",
-    "3060": "7"
-}
-def get_creds_for(cfg: Config, vendor: str, object_id: str) -> tuple[str, str]:
-    md = OBJECT_TO_MD.get(str(object_id), object_id)
-    entity = getattr(cfg, vendor.upper())
-    try:
-        node = entity[md]
-        return node.login, node.password
-    except Exception:
-        raise ValueError(f"Нет логина/пароля для {vendor}:{object_id} (МД {md}) в varables/accounts.json")
-
-# ---------- Логи (в сессии) ----------
+def compare_arrays(named: dict, flow_id: str | None = None) -> dict:
+    """
+    {имя файла: коды} (2 и больше) → сводка code_diff: equal, счётчики и образцы по маскам.
+    Если передан flow_id — все различия кладём в FLOWS (flow_diff), страница листает их оттуда.
+    """
+    sink = (lambda rows: FLOWS.put_diff(flow_id, rows)) if flow_id else None
+    return diff_codes(named, sink).to_dict()
+
+# ---------- Состояние цепочки (в FLOWS, в сессии только flow_id) ----------
+def _flow_id() -> str:
+    """flow_id текущей сессии (создаём пустую цепочку, если её ещё нет)"""
+    flow_id = session.get("flow_id")
+    if not flow_id:
+        flow_id = session["flow_id"] = FLOWS.create()
+    return flow_id
+
+# ---------- Логи ----------
 def add_log(step, action, status, message):
-    session.setdefault("flow_logs", []).append({
-        "time": datetime.now().strftime("%H:%M:%S"),
-        "step": step,
-        "action": action,
-        "status": status,   # 🟢/🔴
-        "message": message
-    })
-    session.modified = True
+    log(FLOWS, _flow_id(), step, action, status, message)
 
 @app.route("/clear_logs")
 def clear_logs():
-    session["flow_logs"] = []
+    FLOWS.clear_logs(_flow_id())
     flash("Лог очищен")
     return redirect(url_for("index"))
 
@@ -271,14 +218,13 @@ def _confirm_or_send(step_key: str, title: str, url: str, payload: dict, method:
     Иначе — сразу отправляем запрос.
     """
     if DEBUG_MODE:
-        session["pending_request"] = {
+        FLOWS.put_json(_flow_id(), "pending_request", {
             "step_key": step_key,
             "title": title,
             "url": url,
             "payload": payload,
             "method": method
-        }
-        session.modified = True
+        })
         return render_template("confirm.html", title=title, url=url, step=step_key, payload=payload)
 
     # обычный режим — просто отправляем
@@ -290,8 +236,9 @@ def confirm_request():
     """Обработчик формы подтверждения/отмены"""
     action = request.form.get("action")
     step_key = request.form.get("step")
+    flow_id = _flow_id()
     try:
-        pending = session.get("pending_request") or {}
+        pending = FLOWS.get_json(flow_id, "pending_request") or {}
         url = pending.get("url")
         payload_text = request.form.get("payload", "")
         payload = json.loads(payload_text) if payload_text.strip() else {}
@@ -301,271 +248,348 @@ def confirm_request():
             add_log(step_key, "Отмена шага", "🔴", "Пользователь отменил отправку")
             # завершаем процесс
             flash("Процесс остановлен пользователем")
-            session.pop("pending_request", None)
+            FLOWS.drop(flow_id, "pending_request")
             return redirect(url_for("index"))
 
         # action == "send"
-        session.pop("pending_request", None)
+        FLOWS.drop(flow_id, "pending_request")
         return _send_raw_request(step_key, url, payload, method)
 
     except Exception as e:
         add_log(step_key or "—", "Ошибка подтверждения", "🔴", str(e))
         flash(f"Ошибка подтверждения: {e}")
-        session.pop("pending_request", None)
+        FLOWS.drop(flow_id, "pending_request")
         return redirect(url_for("index"))
 
 
+def _dispatch(step: Step):
+    """Следующий шаг: авторизацию по кэшу пропускаем, остальное — подтверждение/отправка"""
+    if use_cached_auth(FLOWS, _flow_id(), step):
+        return _advance_flow_after(step.key)
+    return _confirm_or_send(step.key, step.title, step.url, step.payload, step.method)
+
+
 def _send_raw_request(step_key: str, url: str, payload: dict, method: str = "POST"):
     """Фактическая отправка запроса (используется подтверждением и авто-режимом)"""
     try:
-        resp = requests.request(method, url, json=payload, headers={"Content-Type": "application/json"})
-        status = f"{resp.status_code}"
-        text = resp.text
-        # короткий лог
-        add_log(step_key, f"HTTP {method}", "🟢" if resp.ok else "🔴", f"{url} → {status}")
-        # Сохраним ответ в контекст, чтобы следующий шаг мог вытащить токен/id
-        session.setdefault("raw_responses", {})[step_key] = {
-            "status": resp.status_code,
-            "json": safe_json(resp),
-            "text": text[:1000]  # safety
-        }
-        session.modified = True
-        return _advance_flow_after(step_key)
+        send_step(FLOWS, _flow_id(), step_key, url, payload, method)
     except Exception as e:
-        add_log(step_key, "Ошибка HTTP", "🔴", str(e))
-        flash(f"Ошибка запроса: {e}")
+        add_log(step_key, "Ошибка HTTP", "🔴", app_logging.redact(e))
+        flash(f"Ошибка запроса: {app_logging.redact(e)}")
         return redirect(url_for("index"))
-
-
-def safe_json(resp):
-    try:
-        return resp.json()
-    except Exception:
-        return None
+    return _advance_flow_after(step_key)
 
 
 def _advance_flow_after(step_key: str):
     """
     Переход к следующему шагу цепочки (в debug-режиме после отправки).
-    Извлекаем нужные данные из ответа прошлого шага и двигаемся дальше.
+    Сама машина шагов — transfer_flow.next_step.
     """
-    ctx = session.get("flow_ctx") or {}
-    raw = session.get("raw_responses", {})
-    cfg = Config()
-
-    vendor = ctx.get("vendor")
-    base = vendor_base_url(cfg, vendor)
-
-    # вспомогалки для чтения ответов, в твоих ответах поля такие:
-    # auth:   {"token":{"id": "..."}}
-    # accept: {"data":{"id": "..."}}
-    def get_token(step_name):
-        j = raw.get(step_name, {}).get("json") or {}
-        return (((j.get("token") or {}).get("id")) if isinstance(j, dict) else None)
-
-    def get_doc_id(step_name):
-        j = raw.get(step_name, {}).get("json") or {}
-        data = j.get("data") if isinstance(j, dict) else None
-        if isinstance(data, dict):
-            return data.get("id") or data.get("doc_id")
-        return None
-
-    # шаги
-    if step_key == "auth1":
-        token1 = get_token("auth1")
-        if not token1:
-            add_log("auth1", "Ошибка", "🔴", "Не получили token1")
-            return redirect(url_for("index"))
-        ctx["token1"] = token1
-        session["flow_ctx"] = ctx
-        # → заявка 1
-        payload = {
-            "data": {"action_id": 701, "doc_date_mdlp": ctx["doc_date"], "doc_num_mdlp": ctx["doc_num"]},
-            "doc_date": ctx["doc_date"],
-            "doc_id": ctx["doc_num"],
-            "doc_num": ctx["doc_num"],
-            "facility_id": int(ctx["md1"]),
-            "object_id": int(ctx["md1"]),
-            "product_group_id": 12,
-            "type_id": 35
-        }
-        url = f'{base}/api/v1/document/tsd-run?access-token={token1}'
-        return _confirm_or_send("accept1", "Заявка на приёмку (1)", url, payload)
-
-    if step_key == "accept1":
-        doc_id1 = get_doc_id("accept1")
-        if not doc_id1:
-            add_log("accept1", "Ошибка", "🔴", "Не получили document_id (1)")
-            return redirect(url_for("index"))
-        ctx["doc_id1"] = doc_id1
-        session["flow_ctx"] = ctx
-        # → имитация ТСД (1)
-        payload = {
-            "codes": ctx["codes"],
-            "document_id": doc_id1,
-            "hasStaffed": True,
-            "object_uid": int(ctx["md1"])
-        }
-        url = f'{base}/api/incom?access-token={ctx["token1"]}'
-        return _confirm_or_send("incom1", "Имитация ТСД (1)", url, payload)
-
-    if step_key == "incom1":
-        # → перемещение
-        payload = {
-            "codes": ctx["codes"],
-            "hasStaffed": False,
-            "invoice": ctx["invoice"],
-            "invoiceDate": ctx["transfer_date"],
-            "object_uid": int(ctx["md2"])
-        }
-        url = f'{base}/api/outcom?access-token={ctx["token1"]}'
-        return _confirm_or_send("outcom", "Перемещение", url, payload)
-
-    if step_key == "outcom":
-        # → авторизация 2
-        login2, pass2 = get_creds_for(cfg, vendor, ctx["md2"])
-        payload = {"login": login2, "password": pass2}
-        url = f'{base}/api/auth'
-        return _confirm_or_send("auth2", "Авторизация (2)", url, payload)
-
-    if step_key == "auth2":
-        token2 = get_token("auth2")
-        if not token2:
-            add_log("auth2", "Ошибка", "🔴", "Не получили token2")
-            return redirect(url_for("index"))
-        ctx["token2"] = token2
-        session["flow_ctx"] = ctx
-        # → заявка 2
-        payload = {
-            "data": {"action_id": 701, "doc_date_mdlp": ctx["transfer_date"], "doc_num_mdlp": ctx["invoice"]},
-            "doc_date": ctx["transfer_date"],
-            "doc_id": ctx["invoice"],
-            "doc_num": ctx["invoice"],
-            "facility_id": int(ctx["md2"]),
-            "object_id": int(ctx["md2"]),
-            "product_group_id": 12,
-            "type_id": 35
-        }
-        url = f'{base}/api/v1/document/tsd-run?access-token={token2}'
-        return _confirm_or_send("accept2", "Заявка на приёмку (2)", url, payload)
-
-    if step_key == "accept2":
-        doc_id2 = get_doc_id("accept2")
-        if not doc_id2:
-            add_log("accept2", "Ошибка", "🔴", "Не получили document_id (2)")
-            return redirect(url_for("index"))
-        ctx["doc_id2"] = doc_id2
-        session["flow_ctx"] = ctx
-        # → имитация ТСД (2)
-        payload = {
-            "codes": ctx["codes"],
-            "document_id": doc_id2,
-            "hasStaffed": True,
-            "object_uid": int(ctx["md2"])
-        }
-        url = f'{base}/api/incom?access-token={ctx["token2"]}'
-        return _confirm_or_send("incom2", "Имитация ТСД (2)", url, payload)
-
-    if step_key == "incom2":
+    try:
+        step = next_step(FLOWS, _flow_id(), step_key)
+    except FlowError as e:
+        add_log(e.step, "Ошибка", "🔴", str(e))
+        return redirect(url_for("index"))
+
+    if step is None:
         add_log("finish", "Готово", "🟢", "Цепочка завершена")
         flash("✅ Процесс успешно завершён")
         return redirect(url_for("index"))
-
-    # если не узнали шаг — просто на индекс
-    return redirect(url_for("index"))
+    return _dispatch(step)
 
 
 # =========================================================
 # ============== Запуск цепочки перемещения ===============
 # =========================================================
 
-def _start_flow_context(vendor, md1, md2, invoice, transfer_date, codes, doc_num, doc_date):
-    """Инициализация контекста процесса"""
-    session["flow_ctx"] = {
+def _start_flow_context(vendor, md1, md2, invoice, transfer_date, doc_num, doc_date):
+    """Инициализация контекста процесса (коды уже лежат в FLOWS как "base" — не копируем)"""
+    flow_id = _flow_id()
+    FLOWS.update(flow_id, flow_ctx={
         "vendor": vendor.strip().upper(),
         "md1": md1.strip(),
         "md2": md2.strip(),
         "invoice": invoice.strip(),
         "transfer_date": transfer_date.strip(),
-        "codes": codes,
         "doc_num": doc_num,
         "doc_date": doc_date
-    }
-    session["raw_responses"] = {}
-    session["flow_logs"] = []
-    session.modified = True
+    })
+    FLOWS.update(flow_id, last_step=None, current_step=None, job=None)
+    FLOWS.clear_responses(flow_id)
+    FLOWS.clear_logs(flow_id)
 
 
 @app.route("/upload_xmls", methods=["POST"])
 def upload_xmls():
-    """Загрузка двух XML на вкладке 2 и сравнение их кодов"""
+    """
+    Загрузка XML на вкладке 2 и сравнение их кодов: xml1, xml2 и сколько угодно xml_more
+    (например, 601-е уведомление, 701-я приёмка и выгрузка склада).
+    """
     f1 = request.files.get("xml1")
     f2 = request.files.get("xml2")
     if not f1 or not f2:
         flash("Загрузите два XML-файла")
         return redirect(url_for("index"))
+    files = [f1, f2] + [f for f in request.files.getlist("xml_more") if f and f.filename]
+
+    names = [f.filename or f"XML #{i}" for i, f in enumerate(files, 1)]
+    if len(set(names)) < len(names):
+        names = [f"#{i} {n}" for i, n in enumerate(names, 1)]
+
+    # один потоковый проход на файл: коды + doc_num/doc_date; уже виденный файл — из кэша по sha256
+    scans = [MOVES.scan(f.stream) for f in files]
+
+    # SSCC: дубли убираем, контрольные цифры проверяем — до того, как что-то уйдёт наверх
+    checks = [normalize_codes(scan["codes"], "sscc") for scan in scans]
+    for name, checked in zip(names, checks):
+        if checked.duplicates:
+            flash(f"⚠️ {name}: убрано дублей SSCC — {len(checked.duplicates)}")
+        if not checked.ok:
+            flash(f"❌ {name}: {checked.describe()}")
+
+    dates, _ = check_dates((s["doc_date"] for s in scans), "doc_date")
+    for name, scan, date in zip(names, scans, dates):
+        if scan["doc_date"] and date is None:
+            flash(f"⚠️ {name}: дата документа не распознана — {scan['doc_date']!r}")
+    info = {
+        "doc_num": next((s["doc_num"] for s in scans if s["doc_num"]), None),
+        "doc_date": next((d for d in dates if d), None)
+    }
 
-    t1 = f1.read().decode("utf-8", errors="ignore")
-    t2 = f2.read().decode("utf-8", errors="ignore")
-
-    codes1 = extract_sscc_codes_from_text(t1)
-    codes2 = extract_sscc_codes_from_text(t2)
-    cmpres = compare_arrays(codes1, codes2)
-
-    info = parse_move_info(t1) or {}
-    if not info.get("doc_num") or not info.get("doc_date"):
-        info2 = parse_move_info(t2) or {}
-        if not info.get("doc_num"):
-            info["doc_num"] = info2.get("doc_num")
-        if not info.get("doc_date"):
-            info["doc_date"] = info2.get("doc_date")
-
-    session.update({
-        "xml1_name": f1.filename, "xml2_name": f2.filename,
-        "codes_equal": cmpres["equal"],
-        "only_in_first": cmpres["only_in_first"],
-        "only_in_second": cmpres["only_in_second"],
-        "codes_base": codes1,            # берём коды из первого (равны второму, если equal=True)
-        "doc_num_xml": info.get("doc_num"),
-        "doc_date_xml": info.get("doc_date"),
-        "flow_logs": [],
-        "flow_ctx": None,
-        "pending_request": None,
-        "raw_responses": {}
-    })
+    # новая загрузка — новая цепочка; старую вместе с кодами/логами/различиями выбрасываем
+    FLOWS.delete(session.get("flow_id"))
+    FLOWS.maybe_cleanup()
+    flow_id = FLOWS.create(
+        xml1_name=f1.filename, xml2_name=f2.filename, xml_names=names,
+        codes_valid=all(c.ok for c in checks),
+        doc_num_xml=info.get("doc_num"),
+        doc_date_xml=info.get("doc_date")
+    )
+    cmpres = compare_arrays(dict(zip(names, (c.codes for c in checks))), flow_id)
+    FLOWS.update(flow_id, codes_equal=cmpres["equal"])
+    FLOWS.put_json(flow_id, "diff", cmpres)
+    FLOWS.put_codes(flow_id, "base", checks[0].codes)   # берём коды из первого (равны остальным, если equal=True)
+    session["flow_id"] = flow_id
     return redirect(url_for("index"))
 
 
 @app.route("/run_flow", methods=["POST"])
 def run_flow_route():
     """Старт цепочки со вкладки 2"""
-    if not session.get("codes_equal"):
+    flow = FLOWS.get(session.get("flow_id"))
+    if not flow.get("codes_equal"):
         flash("XML-коды не совпадают — запуск невозможен")
         return redirect(url_for("index"))
+    if not flow.get("codes_valid", True):
+        flash("В XML есть некорректные SSCC — запуск невозможен")
+        return redirect(url_for("index"))
 
     vendor = request.form.get("vendor", "SOTEX")
     md1 = request.form.get("md1", "")
     md2 = request.form.get("md2", "")
-    invoice = request.form.get("invoice", "") or session.get("doc_num_xml", "")
-    transfer_date = request.form.get("transfer_date", "") or session.get("doc_date_xml", "")
+    invoice = request.form.get("invoice", "") or flow.get("doc_num_xml", "")
+    transfer_date = request.form.get("transfer_date", "") or flow.get("doc_date_xml", "")
 
     if not (vendor and md1 and md2 and invoice and transfer_date):
         flash("Заполните все поля для запуска процесса")
         return redirect(url_for("index"))
 
-    codes = session.get("codes_base", [])
-    doc_num = session.get("doc_num_xml")
-    doc_date = session.get("doc_date_xml")
+    doc_num = flow.get("doc_num_xml")
+    doc_date = flow.get("doc_date_xml")
+
+    _start_flow_context(vendor, md1, md2, invoice, transfer_date, doc_num, doc_date)
+
+    if not DEBUG_MODE:
+        # обычный режим — цепочка уходит в фоновую задачу, страница опрашивает /flow_status
+        JOBS.submit(_flow_id())
+        flash("Процесс запущен в фоне")
+        return redirect(url_for("index"))
+
+    # debug: шаг 1 — авторизация 1 через страницу подтверждения
+    return _dispatch(first_step(FLOWS, _flow_id()))
+
+
+@app.route("/resume_flow", methods=["POST"])
+def resume_flow():
+    """Продолжить упавшую/прерванную цепочку с шага после последнего выполненного"""
+    flow_id = session.get("flow_id")
+    if not (FLOWS.get(flow_id).get("flow_ctx")):
+        flash("Нет цепочки для продолжения")
+        return redirect(url_for("index"))
+    if JOBS.submit(flow_id) is None:
+        flash("Цепочка уже выполняется")
+    else:
+        flash("Цепочка продолжена в фоне")
+    return redirect(url_for("index"))
+
+
+@app.route("/flow_status", methods=["GET"])
+def flow_status():
+    """Статус фоновой задачи и журнал — для опроса со страницы"""
+    flow_id = session.get("flow_id")
+    if not flow_id:
+        return jsonify({"job": {}, "last_log": None})
+    return jsonify({"job": JOBS.status(flow_id), "last_log": FLOWS.last_log(flow_id)})
+
+
+PAGE_LIMIT = 100       # строк на страницу по умолчанию (/flow_diff, /flow_logs)
+PAGE_LIMIT_MAX = 1000
+
+
+def _page_args() -> tuple[int, int]:
+    """after/limit из query string: курсор — seq последней полученной строки"""
+    after = request.args.get("after", 0, type=int) or 0
+    limit = request.args.get("limit", PAGE_LIMIT, type=int) or PAGE_LIMIT
+    return max(after, 0), max(1, min(limit, PAGE_LIMIT_MAX))
+
+
+@app.route("/flow_diff", methods=["GET"])
+def flow_diff():
+    """
+    Различия кодов текущей цепочки постранично:
+      ?mask=<маска из сводки>&after=<курсор>&limit=<сколько>&q=<подстрока кода>
+    Без mask — только сводка (счётчики по маскам).
+    """
+    flow_id = session.get("flow_id")
+    summary = FLOWS.get_json(flow_id, "diff") if flow_id else None
+    if not summary:
+        return jsonify({"summary": None, "codes": [], "next": None})
+    mask = request.args.get("mask", type=int)
+    if mask is None:
+        patterns = [{k: v for k, v in p.items() if k != "sample"} for p in summary["patterns"]]
+        return jsonify({"summary": {**summary, "patterns": patterns}})
+    after, limit = _page_args()
+    codes, cursor = FLOWS.diff_page(flow_id, mask, after, limit, request.args.get("q", "").strip())
+    return jsonify({"mask": mask, "codes": codes, "next": cursor})
+
+
+@app.route("/flow_logs", methods=["GET"])
+def flow_logs():
+    """
+    Журнал текущей цепочки постранично: ?after=<seq>&limit=&step=&status=&q=
+    next — курсор следующей страницы (None — дальше пока пусто; для дозагрузки новых записей
+    зовём снова с after = seq последней полученной).
+    """
+    after, limit = _page_args()
+    logs, cursor = FLOWS.logs_page(
+        session.get("flow_id"), after, limit,
+        step=request.args.get("step", ""), status=request.args.get("status", ""),
+        q=request.args.get("q", "").strip()
+    )
+    return jsonify({"logs": logs, "next": cursor})
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Метрики шагов цепочки в формате Prometheus"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """Кэши разбора: XML перемещения (попадания/промахи/вытеснения) и молочные JSON"""
+    return jsonify({"move": MOVES.stats(), "milk": MILK.stats()})
+
+
+@app.route("/batch_run", methods=["POST"])
+def batch_run():
+    """Пакетный запуск: манифест (CSV/JSON) с путями к XML на сервере (внутри BATCH_RUN.base_dir)"""
+    file = request.files.get("manifest")
+    if not file:
+        flash("Не выбран манифест")
+        return redirect(url_for("index"))
+    try:
+        rows = load_manifest(file.stream, file.filename)
+    except Exception as e:
+        flash(f"Ошибка чтения манифеста: {e}")
+        return redirect(url_for("index"))
+
+    _prune_finished(BATCHES, lambda b: all(f.done() for f in b["futures"]))
+    batch_id = uuid.uuid4().hex[:12]
+    BATCHES[batch_id] = start_batch(FLOWS, BATCH_JOBS, rows, batch_settings()["base_dir"], confine=True)
+    flash(f"Пакет {batch_id} запущен: {len(rows)} перемещений")
+    return redirect(url_for("batch_status", batch_id=batch_id))
+
+
+@app.route("/batch_status/<batch_id>", methods=["GET"])
+def batch_status(batch_id):
+    """Сводный отчёт по пакету (JSON)"""
+    batch = BATCHES.get(batch_id)
+    if batch is None:
+        return jsonify({"error": "нет такого пакета"}), 404
+    return jsonify(batch_report(FLOWS, BATCH_JOBS, batch))
+
+
+# =========================================================
+# ============== Блок 3. РАЗГРУППИРОВКА ==================
+# =========================================================
+
+def _prune_finished(jobs: dict, finished):
+    """Из завершённых задач (finished(job) → True) оставляем только KEEP_FINISHED последних"""
+    done = [key for key, job in list(jobs.items()) if finished(job)]
+    for key in done[:max(0, len(done) - KEEP_FINISHED)]:
+        jobs.pop(key, None)
+
+
+def _form_number(name: str, default, cast, low, high):
+    """Число из формы: пусто — default, не число — ValueError, иначе прижимаем к [low, high]"""
+    raw = (request.form.get(name) or "").strip()
+    if not raw:
+        return default
+    value = cast(raw)
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(raw)
+    return min(max(value, low), high)
+
+
+@app.route("/ungroup_upload", methods=["POST"])
+def ungroup_upload():
+    """Массовая разгруппировка: файл кодов/XML → фоновая задача с прогрессом"""
+    file = request.files.get("codes_file")
+    vendor = request.form.get("vendor", "SOTEX")
+    md = request.form.get("md", "").strip()
+    if not file or not md:
+        flash("Выберите файл с кодами и укажите МД")
+        return redirect(url_for("index"))
+    try:
+        concurrency = _form_number("concurrency", bulk_ungroup.DEFAULT_CONCURRENCY, int,
+                                   1, bulk_ungroup.MAX_CONCURRENCY)
+        rate = _form_number("rate", bulk_ungroup.DEFAULT_RATE, float, 0.0, math.inf)
+    except ValueError as e:
+        return jsonify({"error": f"concurrency/rate должны быть числами: {e}"}), 400
+
+    try:
+        codes = bulk_ungroup.load_group_codes(file.stream, file.filename)
+        if not codes:
+            flash("В файле нет кодов")
+            return redirect(url_for("index"))
+        base_url, token = bulk_ungroup.authorize(vendor, md)
+    except Exception as e:
+        flash(f"Ошибка разгруппировки: {e}")
+        return redirect(url_for("index"))
+
+    # checkpoint по содержимому: повторная загрузка того же файла продолжит с места остановки
+    os.makedirs(UNGROUP_DIR, exist_ok=True)
+    checkpoint = bulk_ungroup.checkpoint_path_for(codes, UNGROUP_DIR)
+
+    _prune_finished(UNGROUP_JOBS, lambda p: p.get("finished"))
+    job_id = uuid.uuid4().hex[:12]
+    progress = UNGROUP_JOBS[job_id] = {"total": len(codes), "done": 0, "failed": 0, "skipped": 0,
+                                       "reauths": 0, "errors": [], "finished": False, "file": file.filename}
+    requests_service_async.submit(
+        bulk_ungroup.run_ungroup(base_url, token, codes, concurrency, rate, checkpoint, progress,
+                                 reauth=bulk_ungroup.token_refresher(vendor, md))
+    )
+    session["ungroup_job"] = job_id
+    flash(f"Разгруппировка запущена: {len(codes)} кодов")
+    return redirect(url_for("index"))
 
-    _start_flow_context(vendor, md1, md2, invoice, transfer_date, codes, doc_num, doc_date)
 
-    # шаг 1: авторизация 1 (debug-страница или автомат)
-    cfg = Config()
-    base = vendor_base_url(cfg, vendor)
-    login1, pass1 = get_creds_for(cfg, vendor, md1)
-    url = f"{base}/api/auth"
-    payload = {"login": login1, "password": pass1}
-    return _confirm_or_send("auth1", "Авторизация (1)", url, payload)
+@app.route("/ungroup_status", methods=["GET"])
+def ungroup_status():
+    """Прогресс текущей разгруппировки (JSON)"""
+    progress = UNGROUP_JOBS.get(session.get("ungroup_job") or "")
+    return jsonify(progress or {})
 
 
 # =========================================================
@@ -574,20 +598,26 @@ def run_flow_route():
 
 @app.route("/", methods=["GET"])
 def index():
+    flow_id = session.get("flow_id")
+    flow = FLOWS.get(flow_id)
     state = {
         # Вкладка 1 (молочная)
-        "milk_parsed": session.get("milk_parsed"),
-        "json_path": session.get("json_path"),
+        "milk_parsed": preview(MILK.load(session.get("milk_digest"))),
+        "milk_digest": session.get("milk_digest"),
 
         # Вкладка 2 (перемещение)
-        "xml1_name": session.get("xml1_name"),
-        "xml2_name": session.get("xml2_name"),
-        "codes_equal": session.get("codes_equal"),
-        "only_in_first": session.get("only_in_first", []),
-        "only_in_second": session.get("only_in_second", []),
-        "doc_num_xml": session.get("doc_num_xml"),
-        "doc_date_xml": session.get("doc_date_xml"),
-        "flow_logs": session.get("flow_logs", []),
+        "xml1_name": flow.get("xml1_name"),
+        "xml2_name": flow.get("xml2_name"),
+        "xml_names": flow.get("xml_names") or [],
+        "codes_equal": flow.get("codes_equal"),
+        "diff": FLOWS.get_json(flow_id, "diff") if flow_id else None,   # сводка; сами коды — из /flow_diff
+        "doc_num_xml": flow.get("doc_num_xml"),
+        "doc_date_xml": flow.get("doc_date_xml"),
+        "has_logs": FLOWS.last_log(flow_id) is not None,   # сам журнал страница грузит из /flow_logs
+        "job": JOBS.status(flow_id) if flow_id else {},
+
+        # Вкладка 3 (разгруппировка)
+        "ungroup": UNGROUP_JOBS.get(session.get("ungroup_job") or ""),
         "debug_mode": DEBUG_MODE
     }
     return render_template("index.html", state=state)
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import re
+import sys
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import http_client
+
+
+# =========================================================
+# ============ Логи: уровни, сводки, JSON-lines ============
+# =========================================================
+#
+# Вместо print(json.dumps(payload, indent=4)) на каждом запросе:
+#   log = get_logger(__name__)
+#   log.debug("Тело запроса: %s", Summary(payload))
+# Summary форматируется только если запись реально уходит в вывод —
+# на INFO-уровне горячий путь не тратит время на 100k кодов.
+#
+# Настройки — секция LOGGING (varables/http.json) или переменные LOG_LEVEL / LOG_JSONL.
+# URL с ?access-token=... в логи — только через safe_url (схема, хост, путь), текст
+# исключений — через redact: живые токены вендоров не должны оседать в файлах.
+
+ROOT = "milk_prod"
+DEFAULTS = {
+    "level": "INFO",     # DEBUG — печатать тела запросов/ответов (в виде сводки)
+    "jsonl": "",         # путь к JSON-lines файлу ("" — не писать)
+    "max_codes": 5       # сколько первых элементов длинного списка показывать в сводке
+}
+
+_configured = False
+_max_items = DEFAULTS["max_codes"]
+
+# поля LogRecord, которые не считаем пользовательскими extra
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_TOKEN_PARAM = re.compile(r"(access-token=)[^&\s'\"]+", re.IGNORECASE)
+
+
+def safe_url(url: str) -> str:
+    """'https://host/api/incom?access-token=...' → 'https://host/api/incom' (как metrics.endpoint_of, плюс хост)"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def redact(text) -> str:
+    """Текст (например, исключения requests с URL внутри) → то же, но access-token=***"""
+    return _TOKEN_PARAM.sub(r"\1***", str(text))
+
+
+class Summary:
+    """
+    Ленивая сводка значения для логов: длинные списки → первые N + сколько ещё.
+    Строится только при форматировании записи.
+    """
+    __slots__ = ("value", "max_items")
+
+    def __init__(self, value, max_items: int | None = None):
+        self.value = value
+        self.max_items = max_items
+
+    def _short(self, v):
+        n = self.max_items if self.max_items is not None else _max_items
+        if isinstance(v, dict):
+            return {k: self._short(x) for k, x in v.items()}
+        if isinstance(v, (list, tuple)):
+            if len(v) > n:
+                return [self._short(x) for x in v[:n]] + [f"... ещё {len(v) - n} (всего {len(v)})"]
+            return [self._short(x) for x in v]
+        if isinstance(v, str) and len(v) > 500:
+            return v[:500] + f"... ({len(v)} симв.)"
+        return v
+
+    def __str__(self):
+        return json.dumps(self._short(self.value), ensure_ascii=False, default=str)
+
+    __repr__ = __str__
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Одна запись — одна JSON-строка: время, уровень, логгер, сообщение и все extra-поля"""
+
+    def format(self, record):
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for k, v in record.__dict__.items():
+            if k not in _RECORD_FIELDS and not k.startswith("_"):
+                out[k] = v if isinstance(v, (int, float, bool, type(None))) else str(v)
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False)
+
+
+def configure(level: str | None = None, jsonl: str | None = None):
+    """Один раз на процесс: консоль + (опционально) JSON-lines файл"""
+    global _configured, _max_items
+    if _configured:
+        return
+    s = http_client.load_section("LOGGING", DEFAULTS)
+    level = (level or os.environ.get("LOG_LEVEL") or s["level"]).upper()
+    jsonl = jsonl if jsonl is not None else os.environ.get("LOG_JSONL", s["jsonl"])
+    _max_items = int(s["max_codes"])
+
+    root = logging.getLogger(ROOT)
+    root.setLevel(level)
+    root.propagate = False
+
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s", "%H:%M:%S"))
+    root.addHandler(console)
+
+    if jsonl:
+        os.makedirs(os.path.dirname(os.path.abspath(jsonl)), exist_ok=True)
+        sink = logging.FileHandler(jsonl, encoding="utf-8")
+        sink.setFormatter(JsonLinesFormatter())
+        root.addHandler(sink)
+    _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Логгер внутри общего дерева milk_prod.* (настраивается при первом обращении)"""
+    configure()
+    return logging.getLogger(f"{ROOT}.{name}")
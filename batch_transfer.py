@@ -0,0 +1,209 @@
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import wait
+
+import http_client
+from flow_store import FlowStore, DEFAULT_PATH
+from code_check import normalize_codes
+from jobs import JobEngine
+from move_xml import normalize_doc_date
+from move_cache import default_cache
+
+
+# =========================================================
+# ===== Пакетный запуск перемещений по манифесту ==========
+# =========================================================
+#
+# Манифест — CSV (с заголовком) или JSON-массив объектов с полями:
+#   vendor, md1, md2, invoice, date, xml1, xml2
+# invoice/date можно не заполнять — возьмутся doc_num/doc_date из XML.
+# xml2 необязателен: если он есть, коды обоих XML должны совпасть.
+#
+# Каждая строка — отдельная цепочка в FlowStore; все цепочки крутятся в JobEngine
+# с ограничением по вендору. Токены (token_cache) и соединения (http_client) общие,
+# поэтому строки с одинаковыми МД авторизуются один раз.
+#
+# Манифест, загруженный через веб (/batch_run), может ссылаться только на файлы внутри
+# каталога BATCH_RUN.base_dir (varables/http.json): абсолютные пути и ".." за его пределы отклоняются.
+
+MANIFEST_FIELDS = ("vendor", "md1", "md2", "invoice", "date", "xml1", "xml2")
+DEFAULTS = {
+    "base_dir": os.path.join(".", "batch_xml")    # откуда веб-пакеты берут XML
+}
+
+
+def settings() -> dict:
+    return http_client.load_section("BATCH_RUN", DEFAULTS)
+
+
+def load_manifest(source, filename: str = "") -> list[dict]:
+    """source — путь к файлу или уже открытый бинарный/текстовый поток"""
+    if isinstance(source, str):
+        filename = filename or source
+        with open(source, "rb") as f:
+            raw = f.read()
+    else:
+        raw = source.read()
+    text = raw.decode("utf-8-sig") if isinstance(raw, bytes) else raw
+
+    if filename.lower().endswith(".json") or text.lstrip().startswith("["):
+        rows = json.loads(text)
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+    return [{k: str(row.get(k) or "").strip() for k in MANIFEST_FIELDS} for row in rows]
+
+
+def resolve_path(base_dir: str, name: str, confine: bool = False) -> str:
+    """Путь из манифеста относительно base_dir; confine — не выпускать за пределы base_dir (ValueError)"""
+    path = os.path.realpath(os.path.join(base_dir, name))
+    if confine:
+        root = os.path.realpath(base_dir)
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"путь вне каталога пакетов: {name}")
+    return path
+
+
+def _scan_file(path: str) -> dict:
+    return default_cache().scan_path(path)     # тот же файл в другом пакете — из кэша
+
+
+def _checked_codes(scan: dict, field: str) -> list[str]:
+    checked = normalize_codes(scan["codes"], "sscc")
+    if not checked.ok:
+        raise ValueError(f"некорректные SSCC в {field} — {checked.describe(3)}")
+    return checked.codes
+
+
+def prepare_flow(store: FlowStore, row: dict, base_dir: str = "", confine: bool = False) -> str:
+    """Строка манифеста → готовая к запуску цепочка (коды в store). Бросает ValueError."""
+    if not (row["vendor"] and row["md1"] and row["md2"] and row["xml1"]):
+        raise ValueError("нужны vendor, md1, md2 и xml1")
+
+    scan1 = _scan_file(resolve_path(base_dir, row["xml1"], confine))
+    codes = _checked_codes(scan1, "xml1")
+    doc_num, doc_date = scan1["doc_num"], normalize_doc_date(scan1["doc_date"])
+    if row["xml2"]:
+        scan2 = _scan_file(resolve_path(base_dir, row["xml2"], confine))
+        if set(codes) != set(_checked_codes(scan2, "xml2")):
+            raise ValueError("коды в xml1 и xml2 различаются")
+        doc_num = doc_num or scan2["doc_num"]
+        doc_date = doc_date or normalize_doc_date(scan2["doc_date"])
+    if not codes:
+        raise ValueError("в XML нет SSCC")
+
+    invoice = row["invoice"] or doc_num
+    transfer_date = row["date"] or doc_date
+    if not (invoice and transfer_date):
+        raise ValueError("нет invoice/date ни в манифесте, ни в XML")
+
+    flow_id = store.create(
+        xml1_name=row["xml1"], xml2_name=row["xml2"],
+        codes_equal=True,
+        doc_num_xml=doc_num, doc_date_xml=doc_date,
+        flow_ctx={
+            "vendor": row["vendor"].upper(),
+            "md1": row["md1"],
+            "md2": row["md2"],
+            "invoice": invoice,
+            "transfer_date": transfer_date,
+            "doc_num": doc_num,
+            "doc_date": doc_date
+        }
+    )
+    store.put_codes(flow_id, "base", codes)
+    return flow_id
+
+
+def start_batch(store: FlowStore, engine: JobEngine, rows: list[dict], base_dir: str = "",
+                confine: bool = False) -> dict:
+    """
+    Готовит цепочки и ставит их в очередь (confine — см. resolve_path). Возвращает описание пакета:
+      {"items": [{"row": ..., "flow_id": ... | None, "error": ... | None}], "futures": [...], "started": ts}
+    """
+    store.maybe_cleanup()                       # цепочки прошлых пакетов старше MAX_AGE
+    items, futures = [], []
+    for i, row in enumerate(rows, 1):
+        item = {"n": i, "row": row, "flow_id": None, "error": None}
+        try:
+            item["flow_id"] = prepare_flow(store, row, base_dir, confine)
+            fut = engine.submit(item["flow_id"])
+            if fut is not None:
+                futures.append(fut)
+        except Exception as e:
+            item["error"] = str(e)
+        items.append(item)
+    return {"items": items, "futures": futures, "started": time.time()}
+
+
+def batch_report(store: FlowStore, engine: JobEngine, batch: dict) -> dict:
+    """Сводный отчёт по пакету (можно звать, пока пакет ещё идёт)"""
+    results, totals = [], {}
+    for item in batch["items"]:
+        row = item["row"]
+        if item["flow_id"]:
+            state = store.get(item["flow_id"])
+            job = engine.status(item["flow_id"])
+            status = job.get("status", "queued")
+            error = job.get("error")
+            step = job.get("step") or state.get("last_step")
+            codes = store.count_codes(item["flow_id"], "base")
+            invoice = (state.get("flow_ctx") or {}).get("invoice")
+        else:
+            status, error, step, codes, invoice = "rejected", item["error"], None, 0, row["invoice"]
+        totals[status] = totals.get(status, 0) + 1
+        results.append({
+            "n": item["n"], "vendor": row["vendor"], "md1": row["md1"], "md2": row["md2"],
+            "invoice": invoice,
+            "flow_id": item["flow_id"], "status": status, "step": step, "codes": codes, "error": error
+        })
+    return {
+        "total": len(results),
+        "totals": totals,
+        "seconds": round(time.time() - batch["started"], 2),
+        "results": results
+    }
+
+
+def run_batch(rows: list[dict], store: FlowStore | None = None, workers: int = 4,
+              vendor_limit: int = 2, base_dir: str = "") -> dict:
+    """Синхронно: запустить все строки и дождаться конца. Возвращает отчёт."""
+    store = store or FlowStore(DEFAULT_PATH)
+    engine = JobEngine(store, workers=workers, vendor_limits={"*": vendor_limit})
+    try:
+        batch = start_batch(store, engine, rows, base_dir)
+        wait(batch["futures"])
+        return batch_report(store, engine, batch)
+    finally:
+        engine.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетные перемещения по манифесту (CSV/JSON)")
+    parser.add_argument("manifest", help="CSV или JSON: vendor, md1, md2, invoice, date, xml1, xml2")
+    parser.add_argument("--workers", type=int, default=4, help="сколько цепочек одновременно")
+    parser.add_argument("--vendor-limit", type=int, default=2, help="сколько цепочек одного вендора одновременно")
+    parser.add_argument("--report", help="куда записать JSON-отчёт")
+    args = parser.parse_args(argv)
+
+    rows = load_manifest(args.manifest)
+    base_dir = os.path.dirname(os.path.abspath(args.manifest))
+    report = run_batch(rows, workers=args.workers, vendor_limit=args.vendor_limit, base_dir=base_dir)
+
+    for r in report["results"]:
+        mark = "🟢" if r["status"] == "done" else "🔴"
+        print(f'{mark} #{r["n"]} {r["vendor"]} {r["md1"]}→{r["md2"]} {r["invoice"] or ""}: '
+              f'{r["status"]}{" — " + r["error"] if r["error"] else ""}')
+    print(f'Итого: {report["totals"]} за {report["seconds"]} с')
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report["totals"].get("done", 0) == report["total"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
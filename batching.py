@@ -0,0 +1,156 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import http_client
+from app_logging import redact
+
+
+# =========================================================
+# ===== Отправка кодов в /api/incom и /api/outcom чанками ==
+# =========================================================
+
+DEFAULTS = {
+    "chunk_size": 5000,     # кодов в одном запросе; 0 — не делить
+    "workers": 4,           # сколько чанков летит одновременно
+    "retries": 2            # сколько раз переотправляем только упавшие чанки
+}
+
+_settings: dict | None = None
+
+
+def settings() -> dict:
+    """Настройки батчинга: DEFAULTS, перекрытые секцией BATCH из varables/http.json"""
+    global _settings
+    if _settings is None:
+        _settings = http_client.load_section("BATCH", DEFAULTS)
+    return _settings
+
+
+def should_chunk(codes: list, chunk_size: int | None = None) -> bool:
+    size = settings()["chunk_size"] if chunk_size is None else chunk_size
+    return bool(size) and len(codes) > size
+
+
+def split_chunks(codes: list, size: int) -> list[list]:
+    return [codes[i:i + size] for i in range(0, len(codes), size)]
+
+
+class ChunkPlan:
+    """
+    План отправки кодов чанками — общий для sync (send_codes_in_chunks) и async
+    (requests_service_async): делит коды, раздаёт раунды попыток и собирает сводку.
+    Отправку делает вызывающий: на каждый раунд — индексы чанков, результат — record(i, {ok, status, json, ...}).
+    """
+
+    def __init__(self, codes: list, chunk_size: int | None = None, workers: int | None = None,
+                 retries: int | None = None):
+        s = settings()
+        self.chunk_size = chunk_size or s["chunk_size"]
+        self.workers = workers or s["workers"]
+        self.retries = s["retries"] if retries is None else retries
+        self.chunks = split_chunks(codes, self.chunk_size)
+        self.results: dict[int, dict] = {}
+        self.pending = list(range(len(self.chunks)))
+        self.attempts = 0
+
+    def rounds(self):
+        """
+        Раунды попыток: индексы чанков, которые ещё не ушли (первый раунд — все, дальше — упавшие).
+        Чанк, на который ответили 413, делится пополам (половины — новые чанки в следующем раунде);
+        такой раунд не тратит retries — их тратят только прочие ошибки (5xx, сеть).
+        """
+        retries_left = self.retries
+        while self.pending:
+            self.attempts += 1
+            yield list(self.pending)
+            failed = [i for i in self.pending if not self.results[i]["ok"]]
+            if any(not self._too_large(i) for i in failed):
+                if not retries_left:
+                    self.pending = failed
+                    return
+                retries_left -= 1
+            self.pending = []
+            for i in failed:
+                self.pending += self._split(i) if self._too_large(i) else [i]
+
+    def _too_large(self, i: int) -> bool:
+        return self.results[i].get("status") == 413 and len(self.chunks[i]) > 1
+
+    def _split(self, i: int) -> list[int]:
+        chunk = self.chunks[i]
+        half = len(chunk) // 2
+        self.chunks[i] = chunk[:half]
+        self.chunks.append(chunk[half:])
+        return [i, len(self.chunks) - 1]
+
+    def record(self, i: int, result: dict):
+        self.results[i] = result
+
+    @property
+    def failed(self) -> list[int]:
+        return sorted(self.pending)
+
+    @property
+    def first_error(self) -> dict | None:
+        return self.results[self.failed[0]] if self.pending else None
+
+    def summary(self) -> dict:
+        return {
+            "chunks": len(self.chunks),
+            "chunk_size": self.chunk_size,
+            "codes": sum(len(c) for c in self.chunks),
+            "ok_chunks": len(self.chunks) - len(self.pending),
+            "failed_chunks": self.failed,
+            "attempts": self.attempts,
+            "results": [self.results[i]["json"] for i in range(len(self.chunks))]
+        }
+
+
+def _send_chunk(method: str, url: str, payload: dict, codes_key: str, chunk: list) -> dict:
+    body = dict(payload)
+    body[codes_key] = chunk
+    try:
+        resp = http_client.request(method, url, json=body)
+        try:
+            data = resp.json()
+        except ValueError:
+            data = None
+        return {"ok": resp.ok, "status": resp.status_code, "json": data, "text": resp.text[:300],
+                "request_bytes": len(resp.request.body or b""), "response_bytes": len(resp.content)}
+    except Exception as e:
+        return {"ok": False, "status": None, "json": None, "text": redact(e), "request_bytes": 0, "response_bytes": 0}
+
+
+def send_codes_in_chunks(url: str, payload: dict, codes_key: str = "codes", method: str = "POST",
+                         chunk_size: int | None = None, workers: int | None = None,
+                         retries: int | None = None) -> dict:
+    """
+    Делит payload[codes_key] на чанки и шлёт их параллельно (пул из workers потоков).
+    Упавшие чанки переотправляются до retries раз — успешные повторно не уходят;
+    чанк, на который ответили 413, делится пополам (см. ChunkPlan.rounds).
+
+    Возвращает агрегат в формате raw_responses:
+      {"status": 200 | код первой ошибки, "json": {...сводка по чанкам...}, "text": "..."}
+    плюс ok и request_bytes/response_bytes (сумма по всем отправкам) — для метрик.
+    """
+    plan = ChunkPlan(payload.get(codes_key) or [], chunk_size, workers, retries)
+    sent_bytes = received_bytes = 0      # по всем попыткам, включая повторы
+
+    with ThreadPoolExecutor(max_workers=max(1, min(plan.workers, len(plan.chunks) or 1))) as pool:
+        for batch in plan.rounds():
+            futures = {i: pool.submit(_send_chunk, method, url, payload, codes_key, plan.chunks[i]) for i in batch}
+            for i, fut in futures.items():
+                result = fut.result()
+                plan.record(i, result)
+                sent_bytes += result["request_bytes"]
+                received_bytes += result["response_bytes"]
+
+    first_error = plan.first_error
+    return {
+        "status": first_error["status"] if first_error else 200,
+        "ok": first_error is None,
+        "json": plan.summary(),
+        "request_bytes": sent_bytes,
+        "response_bytes": received_bytes,
+        "text": (f"чанков {len(plan.chunks)}, ошибок {len(plan.failed)}"
+                 + (f": {first_error['status']} {first_error['text']}" if first_error else ""))
+    }
@@ -0,0 +1,341 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from code_check import check_digit
+
+
+# =========================================================
+# ====== Бенчмарки горячих путей (разбор, сравнение, XML) ==
+# =========================================================
+#
+# Синтетические данные (XML перемещения, молочный JSON, списки КИ/SSCC) нужного размера,
+# замер времени (лучший/медиана из нескольких прогонов) и пиковой памяти (tracemalloc,
+# отдельным прогоном — он замедляет). Результат — JSON, два таких файла сравниваются:
+#
+#   python bench.py                              # все сценарии, 1k..1M → bench_<дата>.json
+#   python bench.py --sizes 1000,10000 --cases parse_json,generate_xml -o before.json
+#   python bench.py --compare before.json after.json
+#
+# Данные детерминированы (--seed), поэтому прогоны разных версий кода сравнимы.
+# Flask-приложение (app) не импортируется: оно заводит .flask_session/.flow_store в текущей папке;
+# сценарии зовут функции модулей, кэш move_cache — во временном файле.
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+REPEAT = 5                # прогонов на замер (большие размеры — меньше, см. MIN_SECONDS)
+MIN_SECONDS = 1.0         # набрали столько — дальше не повторяем
+REGRESSION = 1.2          # в --compare: медленнее в столько раз — помечаем
+
+
+# ---------- генераторы данных ----------
+def gen_sscc(n: int, seed: int = 1) -> list[str]:
+    """n разных корректных SSCC (с контрольной цифрой)"""
+    rnd = random.Random(seed)
+    base = rnd.randrange(10 ** 16)
+    out = []
+    for i in range(n):
+        body = f"4{(base + i) % 10 ** 16:016d}"
+        out.append(body + str(check_digit(body)))
+    return out
+
+
+def gen_ki(n: int, seed: int = 1, gtins: int = 50) -> list[str]:
+    """n разных корректных КИ (01 + GTIN + 21 + серийный <GS> 93 + крипто-хвост), как их вставляют"""
+    rnd = random.Random(seed)
+    gtin_list = []
+    for _ in range(gtins):
+        body = f"0460{rnd.randrange(10 ** 9):09d}"
+        gtin_list.append(body + str(check_digit(body)))
+    alphabet = "ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz0123456789"
+    return [f"01{gtin_list[i % gtins]}21{i:06d}{''.join(rnd.choices(alphabet, k=7))}<GS>93{rnd.choice(alphabet) * 4}"
+            for i in range(n)]
+
+
+def gen_move_xml(n: int, seed: int = 1, junk: bool = True, cdata: bool = True) -> bytes:
+    """
+    XML перемещения (601/701) на n SSCC: мусор перед <?xml (как при сохранении из браузера),
+    коды вперемешку в CDATA / обычным текстом / с префиксом пространства имён.
+    """
+    codes = gen_sscc(n, seed)
+    parts = []
+    if junk:
+        parts.append("This XML file does not appear to have any style information associated with it.\n")
+    parts.append('<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<documents xmlns:x="urn:x"><move_order_notification>'
+                 '<doc_num>000123</doc_num><doc_date>28.10.2025</doc_date><order_details>\n')
+    for i, code in enumerate(codes):
+        if cdata and i % 3 == 0:
+            parts.append(f"  <sscc><![CDATA[{code}]]></sscc>\n")
+        elif cdata and i % 3 == 1:
+            parts.append(f"  <x:sscc><![CDATA[{code}]]></x:sscc>\n")
+        else:
+            parts.append(f"  <sscc> {code} </sscc>\n")
+    parts.append("</order_details></move_order_notification></documents>\n")
+    return "".join(parts).encode("utf-8")
+
+
+def gen_milk_json(n: int, seed: int = 1) -> str:
+    """Молочный JSON производителя на n продуктов"""
+    rnd = random.Random(seed)
+    uits = gen_ki(n, seed)
+    products = [{
+        "uit": uits[i].replace("<GS>", "\x1d"),
+        "tnved_code": rnd.choice(("0401201100", "0402101100")),
+        "production_date": "2025-01-01",
+        "certificate_document_data": [{"certificate_number": f"РОСС RU Д-RU.PA01.B.{i % 3:05d}/24",
+                                       "certificate_date": "2024-06-01"}],
+        "vsd_number": f"{rnd.randrange(10 ** 12)}",
+    } for i in range(n)]
+    return json.dumps({"participant_inn": "7700000000", "producer_inn": "7700000000", "owner_inn": "7700000000",
+                       "production_date": "2025-01-01", "products_list": products}, ensure_ascii=False)
+
+
+# ---------- сценарии ----------
+# имя → (подготовка(n, seed) → аргумент; замеряемая функция(аргумент); размер входа в байтах(аргумент))
+def _move_text(n, seed):
+    return gen_move_xml(n, seed).decode("utf-8")
+
+
+_temp_files: list[str] = []      # временные файлы сценария — удаляются после замера (run)
+
+
+def _temp_file(suffix: str, data: bytes = b"") -> str:
+    fd, path = tempfile.mkstemp(prefix="bench-", suffix=suffix)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    _temp_files.append(path)
+    return path
+
+
+def _move_file(n, seed):
+    return _temp_file(".xml", gen_move_xml(n, seed))
+
+
+def _move_file_cached(n, seed):
+    """Файл + отдельный кэш во временной базе, уже прогретый этим файлом (замеряется попадание)"""
+    from move_cache import MoveCache
+    path = _move_file(n, seed)
+    db = _temp_file(".sqlite3")
+    _temp_files.extend((db + "-wal", db + "-shm"))
+    cache = MoveCache(path=db)
+    cache.scan_path(path)
+    return path, cache
+
+
+def _milk_file(n, seed):
+    """Молочный JSON на диске: потоковый разбор читает файл, а не копию документа в памяти"""
+    return _temp_file(".json", gen_milk_json(n, seed).encode("utf-8"))
+
+
+def _two_lists(n, seed):
+    a = gen_sscc(n, seed)
+    b = a[: n - n // 100] + gen_sscc(n // 100, seed + 1)      # 1% различий
+    random.Random(seed).shuffle(b)
+    return {"601.xml": a, "701.xml": b}
+
+
+def _milk_and_codes(n, seed):
+    from milk_xml import parse_json
+    return parse_json(gen_milk_json(1, seed)), "\n".join(gen_ki(n, seed))
+
+
+def _run_extract_text(text):
+    from move_xml import extract_sscc_codes_from_text
+    return extract_sscc_codes_from_text(text)
+
+
+def _run_file_comparer(path):
+    import file_comparer
+    return file_comparer.extract_sscc_codes(path, cached=False)     # сам разбор, без кэша move_cache
+
+
+def _run_move_cache_hit(args):
+    path, cache = args
+    return cache.scan_path(path)
+
+
+def _run_parse_move_info(text):
+    from move_xml import parse_move_info
+    return parse_move_info(text)
+
+
+def _run_compare_arrays(named):
+    from code_diff import diff_codes
+    return diff_codes(named).to_dict()          # app.compare_arrays без flow_id
+
+
+def _run_parse_json(text):
+    from milk_xml import parse_json
+    return parse_json(text)
+
+
+def _run_parse_json_stream(path):
+    from milk_xml import parse_json_stream
+    with open(path, encoding="utf-8-sig") as f:
+        return parse_json_stream(f)
+
+
+def _run_generate_xml(args):
+    from milk_xml import generate_xml
+    data, codes = args
+    return sum(len(chunk) for chunk in generate_xml(data, codes, stream=True))
+
+
+def _run_download_csv(args):
+    """Тело /download_csv: проверка КИ и сборка CSV (без Flask — app не импортируем)"""
+    from code_check import normalize_codes
+    _, codes = args
+    checked = normalize_codes(codes, "ki")
+    if not checked.ok:
+        raise RuntimeError(f"/download_csv: {checked.describe()}")
+    return len("\n".join(checked.codes).encode("utf-8"))
+
+
+def _size_text(x):
+    return len(x.encode("utf-8")) if isinstance(x, str) else len(x)
+
+
+CASES = {
+    "extract_sscc_codes_from_text": (_move_text, _run_extract_text, _size_text),
+    "file_comparer.extract_sscc_codes": (_move_file, _run_file_comparer, os.path.getsize),
+    "move_cache.scan_path_cached_hit": (_move_file_cached, _run_move_cache_hit, lambda a: os.path.getsize(a[0])),
+    "parse_move_info": (_move_text, _run_parse_move_info, _size_text),
+    "compare_arrays": (_two_lists, _run_compare_arrays, lambda d: sum(19 * len(v) for v in d.values())),
+    "parse_json": (gen_milk_json, _run_parse_json, _size_text),
+    "parse_json_stream": (_milk_file, _run_parse_json_stream, os.path.getsize),
+    "generate_xml": (_milk_and_codes, _run_generate_xml, lambda a: _size_text(a[1])),
+    "download_csv": (_milk_and_codes, _run_download_csv, lambda a: _size_text(a[1])),
+}
+
+
+# ---------- замер ----------
+def measure(fn, arg, repeat: int = REPEAT) -> dict:
+    """Время (несколько прогонов, без tracemalloc) и пик памяти (один прогон под tracemalloc)"""
+    times = []
+    while len(times) < repeat:
+        gc.collect()
+        started = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - started)
+        if sum(times) >= MIN_SECONDS:
+            break
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "runs": len(times),
+        "best_s": round(min(times), 6),
+        "median_s": round(statistics.median(times), 6),
+        "peak_mb": round(peak / 2 ** 20, 2),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run(cases: list[str], sizes: list[int], repeat: int = REPEAT, seed: int = 1) -> dict:
+    report = {
+        "meta": {
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+        },
+        "results": [],
+    }
+    for name in cases:
+        setup, fn, size_of = CASES[name]
+        for n in sizes:
+            arg = setup(n, seed)
+            try:
+                row = {"case": name, "n": n, "input_bytes": size_of(arg), **measure(fn, arg, repeat)}
+            except Exception as e:
+                row = {"case": name, "n": n, "error": str(e)}
+            finally:
+                while _temp_files:
+                    path = _temp_files.pop()
+                    if os.path.exists(path):
+                        os.remove(path)
+            report["results"].append(row)
+            if "error" in row:
+                print(f"🔴 {name:34} n={n:>9,}  {row['error']}", flush=True)
+            else:
+                print(f"🟢 {name:34} n={n:>9,}  {row['best_s']:>9.4f} s  {row['peak_mb']:>8.1f} MB", flush=True)
+            del arg
+    return report
+
+
+def compare(old_path: str, new_path: str) -> int:
+    """Сравнить два отчёта: отношение лучших времён и пиков памяти; 1 — есть регрессии"""
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r["case"], r["n"]): r for r in json.load(f)["results"] if "error" not in r}
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)["results"]
+
+    regressions = 0
+    for row in new:
+        before = old.get((row["case"], row["n"]))
+        if before is None or "error" in row:
+            continue
+        t = row["best_s"] / before["best_s"] if before["best_s"] else 1.0
+        m = row["peak_mb"] / before["peak_mb"] if before["peak_mb"] else 1.0
+        slow = t >= REGRESSION or m >= REGRESSION
+        regressions += slow
+        mark = "🔴" if slow else ("🟢" if t <= 1 / REGRESSION else "⚪")
+        print(f"{mark} {row['case']:34} n={row['n']:>9,}  время ×{t:5.2f}  память ×{m:5.2f}")
+    print(f"Регрессий (≥ ×{REGRESSION}): {regressions}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки разбора XML/JSON, сравнения кодов и генерации XML")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"через запятую из: {', '.join(CASES)}")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="размеры входа через запятую")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="прогонов на замер (максимум)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="куда записать JSON (по умолчанию bench_<дата>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="сравнить два отчёта и выйти")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(unknown)}")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    import app_logging
+    app_logging.configure(level="WARNING")    # логи «найдено N кодов» на каждом прогоне не нужны
+    report = run(cases, sizes, args.repeat, args.seed)
+    output = args.output or f"bench_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"→ {output}")
+    return 1 if any("error" in r for r in report["results"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
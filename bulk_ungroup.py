@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+
+import requests_service_async as aio
+import token_cache
+from code_check import require_valid
+from config import get_config
+from move_xml import scan_move_bytes
+from transfer_flow import vendor_base_url, get_creds_for
+
+
+# =========================================================
+# ========= Массовая разгруппировка SSCC (unGroup) =========
+# =========================================================
+#
+# Коды — из текстового файла (по одному на строку) или из XML перемещения (<sscc>).
+# Запросы идут параллельно (не больше concurrency одновременно) и не чаще rate в секунду.
+# Каждый успешно разгруппированный код дописывается в checkpoint-файл — повторный запуск
+# с тем же файлом пропускает уже сделанное. Токен за длинный прогон протухает: на 401
+# авторизуемся заново (один раз на все корутины, упавшие со старым токеном) и повторяем код.
+
+DEFAULT_CONCURRENCY = 10
+MAX_CONCURRENCY = 100      # больше одновременных запросов с одной формы не даём
+DEFAULT_RATE = 20.0        # запросов в секунду (0 — без ограничения)
+
+
+def load_group_codes(source, filename: str = "") -> list[str]:
+    """Путь или поток → список SSCC без дублей (порядок сохраняется); кривые коды → CodeError"""
+    if isinstance(source, str):
+        filename = filename or source
+        with open(source, "rb") as f:
+            raw = f.read()
+    else:
+        raw = source.read()
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+
+    head = raw[:4096].lstrip()
+    if filename.lower().endswith(".xml") or head.startswith(b"<") or b"<sscc" in head.lower():
+        codes = scan_move_bytes(raw)["codes"]
+    else:
+        codes = raw.decode("utf-8-sig", errors="ignore").splitlines()
+    return require_valid(codes, "sscc").codes
+
+
+def checkpoint_path_for(codes: list[str], folder: str) -> str:
+    """Checkpoint по содержимому списка: тот же файл кодов → тот же checkpoint"""
+    digest = hashlib.sha1("\n".join(codes).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(folder, f"ungroup-{digest}.done")
+
+
+def read_checkpoint(path: str | None) -> set[str]:
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+class RateLimiter:
+    """Не чаще rate стартов в секунду (равномерно), общий для всех корутин"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def run_ungroup(base_url: str, token: str, codes: list[str], concurrency: int = DEFAULT_CONCURRENCY,
+                      rate: float = DEFAULT_RATE, checkpoint: str | None = None, progress: dict | None = None,
+                      reauth=None) -> dict:
+    """
+    Разгруппировать codes. progress — словарь, который обновляется по ходу
+    (его можно читать из другого потока): total, done, failed, skipped, reauths, errors, finished.
+    reauth — корутинная функция () → новый токен (token_refresher); без неё 401 — просто ошибка кода.
+    """
+    progress = progress if progress is not None else {}
+    already = read_checkpoint(checkpoint)
+    todo = [c for c in codes if c not in already]
+    progress.update({
+        "total": len(codes), "skipped": len(codes) - len(todo),
+        "done": 0, "failed": 0, "reauths": 0, "errors": [], "finished": False, "started": time.time()
+    })
+
+    current = {"token": token}
+    reauth_lock = asyncio.Lock()
+    limiter = RateLimiter(rate)
+    sem = asyncio.Semaphore(concurrency)
+    out = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+
+    async def post(code, tok):
+        url = f"{base_url}/api/unGroup?access-token={tok}"
+        resp = await aio.get_client().post(url, json=aio.build_ungroup_payload(code))
+        token_cache.on_response(url, resp.status_code)      # 401 → токен выкинут из общего кэша
+        return resp
+
+    async def fresh_token(stale):
+        async with reauth_lock:
+            if current["token"] == stale:                   # остальные упавшие ждут эту же авторизацию
+                current["token"] = await reauth()
+                progress["reauths"] += 1
+            return current["token"]
+
+    async def one(code):
+        async with sem:
+            await limiter.wait()
+            tok = current["token"]
+            try:
+                resp = await post(code, tok)
+                if resp.status_code == 401 and reauth is not None:
+                    resp = await post(code, await fresh_token(tok))
+                ok, reason = resp.is_success, f"HTTP {resp.status_code}"
+            except Exception as e:
+                ok, reason = False, str(e)
+        if ok:
+            progress["done"] += 1
+            if out:
+                out.write(code + "\n")
+                out.flush()
+        else:
+            progress["failed"] += 1
+            if len(progress["errors"]) < 100:
+                progress["errors"].append({"code": code, "error": reason})
+
+    try:
+        await asyncio.gather(*(one(c) for c in todo))
+    finally:
+        if out:
+            out.close()
+        progress["finished"] = True
+        progress["seconds"] = round(time.time() - progress["started"], 2)
+    return progress
+
+
+async def authorize_async(vendor: str, md: str) -> tuple[str, str]:
+    """(base_url, token) для вендора/МД — через общий кэш токенов"""
+    cfg = get_config()
+    base_url = vendor_base_url(cfg, vendor)
+    login, password = get_creds_for(cfg, vendor, md)
+    auth = await aio.send_auth_request(base_url, login, password, vendor=vendor, md=cfg.md_of(md))
+    token = ((auth or {}).get("token") or {}).get("id")
+    if not token:
+        raise ValueError(f"Не удалось авторизоваться: {vendor}:{md}")
+    return base_url, token
+
+
+def authorize(vendor: str, md: str) -> tuple[str, str]:
+    return aio.run_sync(authorize_async(vendor, md))
+
+
+def token_refresher(vendor: str, md: str):
+    """reauth для run_ungroup: новый токен для вендора/МД (протухший уже выкинут из кэша по 401)"""
+    async def reauth() -> str:
+        return (await authorize_async(vendor, md))[1]
+    return reauth
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Массовая разгруппировка SSCC (/api/unGroup)")
+    parser.add_argument("codes", help="текстовый файл (код на строку) или XML перемещения")
+    parser.add_argument("--vendor", default="SOTEX")
+    parser.add_argument("--md", required=True, help="МД (или объект), под которым авторизуемся")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="запросов в секунду, 0 — без ограничения")
+    parser.add_argument("--checkpoint", help="файл прогресса (по умолчанию <codes>.done)")
+    args = parser.parse_args(argv)
+
+    codes = load_group_codes(args.codes)
+    checkpoint = args.checkpoint or args.codes + ".done"
+    base_url, token = authorize(args.vendor, args.md)
+
+    progress = {}
+
+    async def report():
+        while not progress.get("finished"):
+            await asyncio.sleep(1)
+            if progress:
+                print(f'\r{progress["done"] + progress["skipped"]}/{progress["total"]} '
+                      f'(ошибок {progress["failed"]})', end="", flush=True)
+
+    async def go():
+        reporter = asyncio.ensure_future(report())
+        await run_ungroup(base_url, token, codes, args.concurrency, args.rate, checkpoint, progress,
+                          reauth=token_refresher(args.vendor, args.md))
+        await reporter
+
+    aio.run_sync(go())
+    print(f'\nГотово: {progress["done"]} разгруппировано, {progress["skipped"]} пропущено (уже было), '
+          f'{progress["failed"]} ошибок за {progress["seconds"]} с')
+    for e in progress["errors"][:10]:
+        print(f'  ❌ {e["code"]}: {e["error"]}')
+    return 0 if not progress["failed"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
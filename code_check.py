@@ -0,0 +1,247 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+
+# =========================================================
+# ====== Нормализация и проверка кодов (КИ / SSCC) ========
+# =========================================================
+#
+# Один проход по списку: чистим строку, убираем дубли, проверяем структуру.
+#   SSCC — 18 цифр (допускается AI "00" впереди), контрольная цифра GS1 mod-10.
+#   КИ   — строка GS1: AI 01 (GTIN-14 с контрольной цифрой) + 21 (серийный номер),
+#          дальше 91/92/93/... через разделитель GS. В тексте GS бывает как "<GS>",
+#          как символ \x1d или в человекочитаемом виде "(01)...(21)...".
+#
+#   checked = normalize_codes(text, "ki")
+#   if not checked.ok: ... checked.errors → [CodeIssue(line, code, error), ...]
+#   checked.codes  — коды без дублей (GS → \x1d), checked.ki() — часть до первого GS (для XML)
+
+GS = "\x1d"
+KINDS = ("ki", "sscc")
+SYMBOLOGY_PREFIXES = ("]C1", "]d2", "]Q3", "]e0")
+# только настоящие переводы строк: str.splitlines() режет ещё и по \x1d (GS внутри КИ)
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+# обычная форма КИ (01 + GTIN + 21 + серийный [+ 91/92/93]) — одной регуляркой; всё прочее — циклом по AI
+_KI_TYPICAL = re.compile(r"01(\d{14})21([^\x1d]{1,20})(?:\x1d91([^\x1d]{1,90}))?"
+                         r"(?:\x1d92([^\x1d]{1,90}))?(?:\x1d93([^\x1d]{1,90}))?")
+
+# AI с фиксированной длиной данных
+FIXED_AI = {
+    "00": 18, "01": 14, "02": 14, "11": 6, "12": 6, "13": 6, "15": 6, "16": 6, "17": 6, "20": 2,
+    "410": 13, "411": 13, "412": 13, "413": 13, "414": 13, "415": 13, "416": 13, "417": 13,
+}
+# AI переменной длины (до GS или конца строки) → максимальная длина данных
+VARIABLE_AI = {
+    "10": 20, "21": 20, "22": 20, "30": 8, "37": 8,
+    "90": 30, "91": 90, "92": 90, "93": 90, "94": 90, "95": 90, "96": 90, "97": 90, "98": 90, "99": 90,
+    "240": 30, "241": 30, "250": 30, "251": 30, "400": 30, "8005": 6,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class CodeIssue:
+    """Проблема в строке списка: номер строки (с 1), код как был, описание"""
+    line: int
+    code: str
+    error: str
+
+    def __str__(self):
+        return f"строка {self.line}: {self.code[:60]} — {self.error}"
+
+
+@dataclass(slots=True)
+class CodeList:
+    """Результат normalize_codes"""
+    kind: str
+    codes: list[str] = field(default_factory=list)        # нормализованные, без дублей, в исходном порядке
+    lines: list[int] = field(default_factory=list)        # номер строки для каждого из codes
+    errors: list[CodeIssue] = field(default_factory=list)
+    duplicates: list[CodeIssue] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def ki(self) -> list[str]:
+        """Часть КИ до первого GS (01 + GTIN + 21 + серийный) — то, что идёт в <ki>"""
+        return [c.split(GS, 1)[0] for c in self.codes]
+
+    def describe(self, limit: int = 10) -> str:
+        """Короткое описание для flash/исключения: сколько чего и первые limit ошибок"""
+        head = f"кодов {len(self.codes)}, ошибок {len(self.errors)}, дублей {len(self.duplicates)}"
+        if not self.errors:
+            return head
+        shown = "; ".join(str(e) for e in self.errors[:limit])
+        more = f" (и ещё {len(self.errors) - limit})" if len(self.errors) > limit else ""
+        return f"{head}: {shown}{more}"
+
+
+class CodeError(ValueError):
+    """Список кодов не прошёл проверку (в .checked — полный CodeList)"""
+    def __init__(self, checked: CodeList):
+        super().__init__(checked.describe())
+        self.checked = checked
+
+
+# ---------- GS1 ----------
+def check_digit(digits: str) -> int:
+    """Контрольная цифра GS1 mod-10 для строки цифр без неё (GTIN, SSCC, GLN). Только цифры."""
+    b = digits.encode("ascii")
+    odd = sum(b[-1::-2]) - 48 * ((len(b) + 1) // 2)    # крайняя правая и через одну влево — вес 3
+    even = sum(b[-2::-2]) - 48 * (len(b) // 2)
+    return (10 - (odd * 3 + even) % 10) % 10
+
+
+@lru_cache(maxsize=4096)
+def _gtin_ok(gtin: str) -> bool:
+    """GTIN в партии обычно один на тысячи КИ — контрольную цифру считаем один раз"""
+    return gtin.isdigit() and check_digit(gtin[:13]) == int(gtin[13])
+
+
+def sscc_error(code: str) -> str | None:
+    """None — SSCC корректен, иначе описание проблемы"""
+    if len(code) != 18 or not code.isdigit():
+        return "SSCC должен состоять из 18 цифр"
+    if check_digit(code[:17]) != int(code[17]):
+        return f"неверная контрольная цифра SSCC (ожидалась {check_digit(code[:17])})"
+    return None
+
+
+def _ai_at(code: str, pos: int) -> str | None:
+    for n in (2, 3, 4):
+        ai = code[pos:pos + n]
+        if ai in FIXED_AI or ai in VARIABLE_AI:
+            return ai
+        if n == 4 and ai[:2] in ("31", "32", "33", "34", "35", "36") and ai.isdigit():
+            return ai                                   # вес/размеры: 31nn..36nn, 6 цифр
+    return None
+
+
+def parse_ki(code: str) -> dict:
+    """
+    Строка GS1 (GS = \\x1d) → {AI: значение}. Бросает ValueError с описанием.
+    Проверяет обязательные 01 (с контрольной цифрой GTIN) и 21.
+    """
+    m = _KI_TYPICAL.fullmatch(code)
+    if m:
+        if not _gtin_ok(m.group(1)):
+            raise ValueError(f"неверная контрольная цифра GTIN {m.group(1)}")
+        return {ai: v for ai, v in zip(("01", "21", "91", "92", "93"), m.groups()) if v is not None}
+
+    out = {}
+    pos, n = 0, len(code)
+    while pos < n:
+        if code[pos] == GS:
+            pos += 1
+            continue
+        ai = _ai_at(code, pos)
+        if ai is None:
+            raise ValueError(f"неизвестный AI на позиции {pos + 1}: {code[pos:pos + 4]!r}")
+        pos += len(ai)
+        size = FIXED_AI.get(ai, 6 if len(ai) == 4 and ai not in VARIABLE_AI else None)   # 31nn..36nn — 6 цифр
+        if size is not None:
+            value = code[pos:pos + size]
+            if len(value) != size or GS in value:
+                raise ValueError(f"AI {ai}: нужно {size} символов")
+            pos += size
+        else:
+            end = code.find(GS, pos)
+            end = n if end < 0 else end
+            value = code[pos:end]
+            if not value or len(value) > VARIABLE_AI[ai]:
+                raise ValueError(f"AI {ai}: длина {len(value)}, допустимо 1..{VARIABLE_AI[ai]}")
+            pos = end
+        if ai in out:
+            raise ValueError(f"AI {ai} встречается дважды")
+        out[ai] = value
+
+    gtin = out.get("01")
+    if gtin is None:
+        raise ValueError("нет GTIN (AI 01)")
+    if not _gtin_ok(gtin):
+        raise ValueError(f"неверная контрольная цифра GTIN {gtin}")
+    if "21" not in out:
+        raise ValueError("нет серийного номера (AI 21)")
+    return out
+
+
+def _human_to_raw(code: str) -> str:
+    """'(01)0460...(21)abc(93)xyz' → '010460...21abc\\x1d93xyz' (GS только после полей переменной длины)"""
+    parts = [p.split(")", 1) for p in code.split("(")[1:]]
+    raw = []
+    for i, part in enumerate(parts):
+        if len(part) != 2:
+            return code
+        ai, value = part
+        raw.append(ai + value)
+        if i < len(parts) - 1 and ai not in FIXED_AI:
+            raw.append(GS)
+    return "".join(raw)
+
+
+def normalize_line(line: str, kind: str = "ki") -> str:
+    """Одна строка как её вставили → нормализованный код ("" — пустая строка)"""
+    code = line.strip()
+    if not code:
+        return ""
+    if kind == "sscc":
+        code = code.replace(" ", "")
+        return code[2:] if len(code) == 20 and code.startswith("00") else code
+    if code.startswith(SYMBOLOGY_PREFIXES):
+        code = code[3:]
+    if "<GS>" in code or "<gs>" in code:
+        code = code.replace("<GS>", GS).replace("<gs>", GS)
+    if code.startswith("("):
+        code = _human_to_raw(code)
+    return code.strip(GS)
+
+
+# ---------- основной проход ----------
+def normalize_codes(source, kind: str = "ki", dedupe: bool = True) -> CodeList:
+    """
+    source — текст (код на строку) или итерируемое строк (например, коды из XML).
+    Пустые строки пропускаются, но нумерация строк сохраняется.
+    Дубли (по нормализованному коду) в codes не попадают, а записываются в duplicates.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind: одно из {KINDS}")
+    lines = _LINE_BREAK.split(source) if isinstance(source, str) else source
+    out = CodeList(kind)
+    seen: dict[str, int] = {}
+
+    for n, line in enumerate(lines, 1):
+        code = normalize_line(line, kind)
+        if not code:
+            continue
+        first = seen.get(code)
+        if first is not None:
+            out.duplicates.append(CodeIssue(n, code, f"дубль строки {first}"))
+            if dedupe:
+                continue
+        else:
+            seen[code] = n
+
+        if kind == "sscc":
+            error = sscc_error(code)
+        else:
+            try:
+                parse_ki(code)
+                error = None
+            except ValueError as e:
+                error = str(e)
+        if error:
+            out.errors.append(CodeIssue(n, line.strip(), error))
+            continue
+        out.codes.append(code)
+        out.lines.append(n)
+    return out
+
+
+def require_valid(source, kind: str = "ki", dedupe: bool = True) -> CodeList:
+    """normalize_codes, но с CodeError, если есть ошибки"""
+    checked = source if isinstance(source, CodeList) else normalize_codes(source, kind, dedupe)
+    if not checked.ok:
+        raise CodeError(checked)
+    return checked
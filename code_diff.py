@@ -0,0 +1,239 @@
+import heapq
+import os
+import tempfile
+from array import array
+from dataclasses import dataclass, field
+
+from move_xml import iter_move_tags
+
+
+# =========================================================
+# ====== Сравнение N списков кодов (601 / 701 / склад) =====
+# =========================================================
+#
+# Каждый источник превращается в отсортированный поток уникальных кодов:
+#   — 18-значные SSCC хранятся упакованными int64 в array("q") (8 байт вместо ~70 у str);
+#   — если кодов больше run_size, отсортированные куски сбрасываются во временные файлы
+#     и потом сливаются (внешняя сортировка) — в памяти не больше одного куска.
+# Потоки сливаются heapq.merge за один проход; для каждого кода получаем маску
+# присутствия (бит i — есть в источнике i). Наружу — счётчики по маскам и первые
+# несколько кодов каждой маски; полный список различий можно слить в sink
+# (FlowStore.put_diff) и читать постранично.
+#
+#   result = DiffResult(["601.xml", "701.xml", "склад.csv"])
+#   for _ in result.collect(iter_diff([sorted_unique(c) for c in lists])): pass
+#   result.equal, result.patterns, result.to_dict()
+
+RUN_SIZE = 2_000_000      # кодов в одном куске в памяти (дальше — на диск)
+READ_BLOCK = 64 * 1024    # сколько int64 читаем из куска за раз при слиянии
+SAMPLE = 20               # сколько первых кодов каждой маски держим в сводке
+
+
+def pack(code: str) -> int | None:
+    """18-значный числовой код → int (None — код не SSCC, храним строкой)"""
+    if len(code) == 18 and code.isascii() and code.isdigit():
+        return int(code)
+    return None
+
+
+def unpack(value: int) -> str:
+    return f"{value:018d}"
+
+
+# ---------- сортировка одного источника ----------
+def _dedupe(sorted_codes):
+    prev = None
+    for code in sorted_codes:
+        if code != prev:
+            yield code
+            prev = code
+
+
+def _read_packed(path: str):
+    with open(path, "rb") as f:
+        while True:
+            block = array("q")
+            try:
+                block.fromfile(f, READ_BLOCK)
+            except EOFError:          # последний неполный блок всё равно дочитан в block
+                pass
+            if not block:
+                return
+            yield from map(unpack, block)
+
+
+def _read_lines(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+def _spill(packed: array, other: list[str], tmpdir: str | None) -> list[str]:
+    """Отсортировать кусок и сбросить на диск: int64 отдельно, прочие строки отдельно"""
+    paths = []
+    fd, path = tempfile.mkstemp(prefix="diff-", suffix=".q", dir=tmpdir)
+    with os.fdopen(fd, "wb") as f:
+        array("q", sorted(set(packed))).tofile(f)
+    paths.append(path)
+    if other:
+        fd, path = tempfile.mkstemp(prefix="diff-", suffix=".txt", dir=tmpdir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.writelines(code + "\n" for code in sorted(set(other)))
+        paths.append(path)
+    return paths
+
+
+def sorted_unique(codes, run_size: int = RUN_SIZE, tmpdir: str | None = None):
+    """
+    Итерируемое кодов (список, генератор из XML, строки файла) → отсортированные уникальные коды.
+    Больше run_size кодов — внешняя сортировка через временные файлы (удаляются по завершении).
+    """
+    packed, other = array("q"), []
+    runs: list[str] = []
+    try:
+        for code in codes:
+            code = code.strip()
+            if not code:
+                continue
+            value = pack(code)
+            if value is None:
+                other.append(code)
+            else:
+                packed.append(value)
+            if len(packed) + len(other) >= run_size:
+                runs += _spill(packed, other, tmpdir)
+                packed, other = array("q"), []
+
+        if not runs:
+            # 18-значные строки сортируются так же, как их числа — сливаем без распаковки всего сразу
+            yield from _dedupe(heapq.merge(map(unpack, sorted(packed)), sorted(other)))
+            return
+        if packed or other:
+            runs += _spill(packed, other, tmpdir)
+        del packed, other
+        streams = [_read_packed(p) if p.endswith(".q") else _read_lines(p) for p in runs]
+        yield from _dedupe(heapq.merge(*streams))
+    finally:
+        for path in runs:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# ---------- слияние N источников ----------
+def _tagged(stream, bit: int):
+    for code in stream:
+        yield code, bit
+
+
+def iter_diff(streams):
+    """
+    streams — отсортированные уникальные коды каждого источника (sorted_unique).
+    Отдаёт (код, маска) для каждого кода из объединения, по возрастанию кода.
+    """
+    current, mask = None, 0
+    for code, bit in heapq.merge(*(_tagged(s, 1 << i) for i, s in enumerate(streams))):
+        if code != current:
+            if current is not None:
+                yield current, mask
+            current, mask = code, 0
+        mask |= bit
+    if current is not None:
+        yield current, mask
+
+
+@dataclass(slots=True)
+class DiffResult:
+    """Сводка сравнения: сколько кодов в каждом источнике, сколько общих, сколько в каждой маске"""
+    names: list[str]
+    totals: list[int] = field(default_factory=list)
+    common: int = 0
+    patterns: dict[int, int] = field(default_factory=dict)       # маска → количество (кроме «есть везде»)
+    samples: dict[int, list[str]] = field(default_factory=dict)  # маска → первые SAMPLE кодов
+    sample: int = SAMPLE
+
+    def __post_init__(self):
+        if not self.totals:
+            self.totals = [0] * len(self.names)
+
+    @property
+    def full(self) -> int:
+        return (1 << len(self.names)) - 1
+
+    @property
+    def equal(self) -> bool:
+        return not self.patterns
+
+    @property
+    def different(self) -> int:
+        return sum(self.patterns.values())
+
+    def collect(self, pairs):
+        """Пропускает (код, маска) из iter_diff через счётчики и отдаёт только различия (маска, код)"""
+        full, totals = self.full, self.totals
+        for code, mask in pairs:
+            for i in range(len(totals)):
+                if mask >> i & 1:
+                    totals[i] += 1
+            if mask == full:
+                self.common += 1
+                continue
+            self.patterns[mask] = self.patterns.get(mask, 0) + 1
+            sample = self.samples.setdefault(mask, [])
+            if len(sample) < self.sample:
+                sample.append(code)
+            yield mask, code
+
+    def label(self, mask: int) -> str:
+        present = [n for i, n in enumerate(self.names) if mask >> i & 1]
+        missing = [n for i, n in enumerate(self.names) if not mask >> i & 1]
+        if len(present) == 1:
+            return f"Только в {present[0]}"
+        return f"Есть в {', '.join(present)}; нет в {', '.join(missing)}"
+
+    def to_dict(self) -> dict:
+        """Для JSON/FlowStore: без полных списков, только счётчики и образцы"""
+        return {
+            "names": self.names,
+            "totals": self.totals,
+            "common": self.common,
+            "equal": self.equal,
+            "different": self.different,
+            "patterns": [
+                {"mask": m, "label": self.label(m), "count": n, "sample": self.samples.get(m, [])}
+                for m, n in sorted(self.patterns.items(), key=lambda kv: (-kv[1], kv[0]))
+            ]
+        }
+
+
+def diff_codes(named, sink=None, run_size: int = RUN_SIZE) -> DiffResult:
+    """
+    {имя: итерируемое кодов} (или список пар (имя, коды)) → DiffResult.
+    sink — функция, которой отдаётся генератор различий (маска, код), например
+    lambda rows: store.put_diff(flow_id, rows); без sink различия только считаются.
+    """
+    pairs = list(named.items() if isinstance(named, dict) else named)
+    result = DiffResult([name for name, _ in pairs])
+    rows = result.collect(iter_diff([sorted_unique(codes, run_size) for _, codes in pairs]))
+    if sink is None:
+        for _ in rows:
+            pass
+    else:
+        sink(rows)
+    return result
+
+
+def diff_files(paths: list[str], sink=None, run_size: int = RUN_SIZE) -> DiffResult:
+    """N XML-файлов (или текстовых списков, код на строку) → DiffResult, потоково"""
+    def codes_of(path):
+        with open(path, "rb") as f:
+            if path.lower().endswith(".xml"):
+                for name, value in iter_move_tags(f):
+                    if name == "sscc":
+                        yield value
+            else:
+                for line in f:
+                    yield line.decode("utf-8-sig", errors="ignore")
+
+    return diff_codes([(os.path.basename(p), codes_of(p)) for p in paths], sink, run_size)
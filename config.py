@@ -1,11 +1,35 @@
 import json
 import os
+import threading
+import time
+from dataclasses import dataclass
 from typing import Any
 
+@dataclass(frozen=True, slots=True)
+class Account:
+    """Логин/пароль МД у вендора (varables/accounts.json)"""
+    vendor: str
+    md: str
+    login: str
+    password: str
+    desc: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class VendorLinks:
+    """Базовые ссылки вендора (varables/links.json)"""
+    vendor: str
+    dev: str
+    test: str | None = None
+
+
 class ConfigEntity:
     """Вложенная сущность с автодополнением и поддержкой [] и ."""
+    __slots__ = ("_name", "_fields", "_children")
+
     def __init__(self, name: str):
         self._name = name
+        self._fields = {}    # обычные поля
         self._children = {}  # для ID или вложенных объектов
 
     def add_data(self, data: Any):
@@ -16,19 +40,34 @@ class ConfigEntity:
                     if k not in self._children:
                         self._children[k] = ConfigEntity(k)
                     self._children[k].add_data(v)
-                    setattr(self, k, self._children[k])
                 else:
                     # обычное поле
-                    setattr(self, k, v)
+                    self._fields[k] = v
         else:
-            setattr(self, "value", data)
+            self._fields["value"] = data
+
+    def __getattr__(self, name):
+        # сюда попадаем только для имён, которых нет в __slots__
+        try:
+            return self._fields[name]
+        except KeyError:
+            pass
+        try:
+            return self._children[name]
+        except KeyError:
+            raise AttributeError(f"Нет поля '{name}' в '{self._name}'") from None
 
     def __getitem__(self, key):
-        return getattr(self, key)
+        if key in self._children:
+            return self._children[key]
+        try:
+            return self._fields[key]
+        except KeyError:
+            raise KeyError(key) from None
 
     def __dir__(self):
         # IDE будет видеть все обычные атрибуты + children
-        return list(self.__dict__.keys()) + list(self._children.keys())
+        return list(self._fields.keys()) + list(self._children.keys())
 
 class Config:
     """Главный объект конфигурации с автозагрузкой всех JSON-файлов"""
@@ -44,6 +83,9 @@ class Config:
         if not os.path.exists(config_folder):
             raise FileNotFoundError(f"Папка с конфигами не найдена: {config_folder}")
 
+        self.folder = config_folder
+        self.signature = folder_signature(config_folder)
+
         # Загружаем все JSON-файлы
         for filename in os.listdir(config_folder):
             if filename.endswith(".json"):
@@ -52,12 +94,61 @@ class Config:
                     data = json.load(f)
                     self._merge_data(data)
 
+        self._build_index()
+
     def _merge_data(self, data: dict):
         for name, value in data.items():
             if name not in self._entities:
                 self._entities[name] = ConfigEntity(name)
             self._entities[name].add_data(value)
 
+    def _build_index(self):
+        """
+        Плоские индексы для горячего пути (всё — одна hash-выборка):
+          links        — ВЕНДОР → VendorLinks (links.json)
+          base_urls    — ВЕНДОР → dev-ссылка (или VENDOR_BASE_URL из окружения)
+          object_to_md — объект → МД (секция OBJECT_TO_MD, objects.json)
+          accounts     — (ВЕНДОР, МД) и (ВЕНДОР, объект) → Account (accounts.json)
+        """
+        self.links = {}
+        self.base_urls = {}
+        self.accounts = {}
+        objects = self._entities.get("OBJECT_TO_MD")
+        self.object_to_md = {str(k): str(v) for k, v in objects._fields.items()} if objects else {}
+
+        for vendor, entity in self._entities.items():
+            vendor = vendor.upper()
+            dev = entity._fields.get("dev")
+            if isinstance(dev, str):
+                self.links[vendor] = VendorLinks(vendor, dev, entity._fields.get("test"))
+                self.base_urls[vendor] = dev
+            for md, node in entity._children.items():
+                login = node._fields.get("login")
+                if login is not None:
+                    self.accounts[(vendor, md)] = Account(
+                        vendor, md, login, node._fields.get("password"), node._fields.get("desc", "")
+                    )
+
+        # VENDOR_BASE_URL — все вендоры на один адрес (локальная заглушка mock_vendor.py)
+        override = os.environ.get("VENDOR_BASE_URL")
+        if override:
+            self.base_urls = {vendor: override.rstrip("/") for vendor in self.base_urls}
+
+        # объект → тот же Account, что и у его МД
+        for object_id, md in self.object_to_md.items():
+            for (vendor, acc_md), account in list(self.accounts.items()):
+                if acc_md == md:
+                    self.accounts.setdefault((vendor, object_id), account)
+
+    def md_of(self, object_id) -> str:
+        """Номер объекта (или сам МД) → МД"""
+        object_id = str(object_id).strip()
+        return self.object_to_md.get(object_id, object_id)
+
+    def account(self, vendor: str, object_id) -> Account | None:
+        """Учётка по (вендор, МД или объект)"""
+        return self.accounts.get((vendor.strip().upper(), str(object_id).strip()))
+
     def __getattr__(self, name):
         if name in self._entities:
             return self._entities[name]
@@ -68,6 +159,44 @@ class Config:
         return list(self._entities.keys())
 
 
+def folder_signature(config_folder: str) -> tuple:
+    """Отпечаток папки конфигов: (имя, mtime, размер) каждого JSON — меняется при любой правке"""
+    items = []
+    for filename in sorted(os.listdir(config_folder)):
+        if filename.endswith(".json"):
+            st = os.stat(os.path.join(config_folder, filename))
+            items.append((filename, st.st_mtime_ns, st.st_size))
+    return tuple(items)
+
+
+# ---------- Синглтон с горячей перезагрузкой ----------
+RELOAD_CHECK_INTERVAL = 2.0   # сек.: не чаще этого смотрим на mtime файлов
+
+_config: Config | None = None
+_checked_at = 0.0
+_config_lock = threading.Lock()
+
+
+def get_config() -> Config:
+    """
+    Общий Config процесса. Папку проверяем не чаще RELOAD_CHECK_INTERVAL;
+    если какой-то JSON изменился — собираем новый Config целиком и подменяем ссылку
+    (читатели всегда видят либо старый, либо новый объект, но не полусобранный).
+    """
+    global _config, _checked_at
+    now = time.monotonic()
+    cfg = _config
+    if cfg is not None and now - _checked_at < RELOAD_CHECK_INTERVAL:
+        return cfg
+
+    with _config_lock:
+        if _config is not None and now - _checked_at < RELOAD_CHECK_INTERVAL:
+            return _config
+        if _config is None or folder_signature(_config.folder) != _config.signature:
+            _config = Config(_config.folder if _config is not None else None)
+        _checked_at = now
+        return _config
+
 
 if __name__ == "__main__":
     # Просто создаём объект — папка выбирается сама
@@ -0,0 +1 @@
+# Модули лежат плоско в корне репозитория: conftest здесь кладёт корень в sys.path для tests/.
@@ -0,0 +1,172 @@
+import datetime
+import re
+import threading
+from dataclasses import dataclass, field
+
+
+# =========================================================
+# ====== Даты: быстрая нормализация → YYYY-MM-DD ===========
+# =========================================================
+#
+# Общая для XML перемещения (doc_date) и молочного JSON (production_date, certificate_date).
+# Вместо strptime в try/except по списку форматов — разбор руками двух частых форм:
+#   2025-10-28 (и с временем: 2025-10-28T10:00:00.000Z, 2025-10-28 10:00:00+03:00)
+#   28.10.2025 (и с временем через пробел; 1.2.2025 — тоже), 28.10.25 (год — 20YY)
+# с проверкой, что такая дата существует. Для каждого источника запоминается форма,
+# которая сработала последней, — её пробуем первой (в одном файле даты обычно одного вида).
+# Напоследок — как раньше — ищем YYYY-MM-DD где угодно в строке.
+#
+#   normalize_date("28.10.2025", "doc_date")            → "2025-10-28"
+#   report = check_dates(values, "certificate_date")     → report.bad — что не распознали,
+#                                                           report.suspicious — год вне YEARS_BACK/YEARS_AHEAD
+
+_DAYS = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+_ISO_ANYWHERE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+_DMY_SHORT = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})(?:\s|$)")
+_DMY_YY = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{2})(?:\s|$)")
+_TIME_SEPARATORS = ("T", " ", "t")
+YEARS_BACK = 30           # дата старше стольких лет — подозрительная (скорее опечатка в годе)
+YEARS_AHEAD = 1           # и позже стольких лет вперёд — тоже
+MAX_SEEN = 10_000         # сколько разных строк DateReport помнит разобранными
+
+
+def _valid(y: int, m: int, d: int) -> bool:
+    if not 1 <= m <= 12 or d < 1:
+        return False
+    if m == 2 and d == 29:
+        return y % 4 == 0 and (y % 100 != 0 or y % 400 == 0)
+    return d <= _DAYS[m - 1]
+
+
+def _iso(raw: str) -> str | None:
+    """YYYY-MM-DD[<T| >время]"""
+    if len(raw) < 10 or raw[4] != "-" or raw[7] != "-" or (len(raw) > 10 and raw[10] not in _TIME_SEPARATORS):
+        return None
+    y, m, d = raw[:4], raw[5:7], raw[8:10]
+    if not (y.isdigit() and m.isdigit() and d.isdigit()) or not _valid(int(y), int(m), int(d)):
+        return None
+    return raw[:10]
+
+
+def _dmy(raw: str) -> str | None:
+    """DD.MM.YYYY[ время]"""
+    if len(raw) < 10 or raw[2] != "." or raw[5] != "." or (len(raw) > 10 and raw[10] != " "):
+        return None
+    d, m, y = raw[:2], raw[3:5], raw[6:10]
+    if not (y.isdigit() and m.isdigit() and d.isdigit()) or not _valid(int(y), int(m), int(d)):
+        return None
+    return f"{y}-{m}-{d}"
+
+
+def _dmy_short(raw: str) -> str | None:
+    """D.M.YYYY (день/месяц без ведущего нуля)"""
+    m = _DMY_SHORT.match(raw)
+    if not m:
+        return None
+    d, mo, y = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    return f"{y:04d}-{mo:02d}-{d:02d}" if _valid(y, mo, d) else None
+
+
+def _dmy_yy(raw: str) -> str | None:
+    """DD.MM.YY (двузначный год — 20YY)"""
+    m = _DMY_YY.match(raw)
+    if not m:
+        return None
+    d, mo, y = int(m.group(1)), int(m.group(2)), 2000 + int(m.group(3))
+    return f"{y:04d}-{mo:02d}-{d:02d}" if _valid(y, mo, d) else None
+
+
+def _iso_anywhere(raw: str) -> str | None:
+    """Запасной путь: YYYY-MM-DD в любом месте строки"""
+    m = _ISO_ANYWHERE.search(raw)
+    if m and _valid(int(m.group(1)), int(m.group(2)), int(m.group(3))):
+        return m.group(0)
+    return None
+
+
+SHAPES = {"iso": _iso, "dmy": _dmy, "dmy_short": _dmy_short, "dmy_yy": _dmy_yy}
+
+_preferred: dict[str, str] = {}      # источник → форма, сработавшая последней
+_lock = threading.Lock()
+
+
+def normalize_date(raw, source: str = "") -> str | None:
+    """Дата как пришла → YYYY-MM-DD (None — пусто или не распознали)"""
+    if not raw or not isinstance(raw, str):
+        return None
+    raw = raw.strip()
+    first = _preferred.get(source, "iso")
+    value = SHAPES[first](raw)
+    if value is not None:
+        return value
+    for name, parse in SHAPES.items():
+        if name == first:
+            continue
+        value = parse(raw)
+        if value is not None:
+            with _lock:
+                _preferred[source] = name
+            return value
+    return _iso_anywhere(raw)
+
+
+def is_suspicious(value: str, today: datetime.date | None = None) -> bool:
+    """YYYY-MM-DD с годом дальше YEARS_BACK лет назад или YEARS_AHEAD лет вперёд"""
+    year = (today or datetime.date.today()).year
+    return not year - YEARS_BACK <= int(value[:4]) <= year + YEARS_AHEAD
+
+
+def preferred_shapes() -> dict[str, str]:
+    """Какую форму сейчас первой пробует каждый источник (для отладки)"""
+    with _lock:
+        return dict(_preferred)
+
+
+@dataclass(slots=True)
+class DateReport:
+    """
+    Проверка дат одного поля по одной: сколько распознано, какие значения — нет, какие
+    распознаны, но подозрительные (is_suspicious). Одинаковые строки разбираются один раз —
+    в больших выгрузках даты повторяются тысячами.
+    """
+    source: str
+    ok: int = 0
+    empty: int = 0
+    bad: dict[str, int] = field(default_factory=dict)            # сырое значение → сколько раз встретилось
+    suspicious: dict[str, int] = field(default_factory=dict)     # то же для подозрительных
+    _seen: dict[str, str | None] = field(default_factory=dict, repr=False)
+
+    def add(self, raw) -> str | None:
+        """Учесть одно значение; вернуть YYYY-MM-DD (None — пусто или не распознали)"""
+        if not raw:
+            self.empty += 1
+            return None
+        if not isinstance(raw, str):
+            raw = str(raw)
+        value = self._seen.get(raw, "")
+        if value == "":
+            value = normalize_date(raw, self.source)
+            if len(self._seen) < MAX_SEEN:
+                self._seen[raw] = value
+        if value is None:
+            self.bad[raw] = self.bad.get(raw, 0) + 1
+            return None
+        self.ok += 1
+        if is_suspicious(value):
+            self.suspicious[raw] = self.suspicious.get(raw, 0) + 1
+        return value
+
+    @property
+    def bad_count(self) -> int:
+        return sum(self.bad.values())
+
+    def describe(self, limit: int = 5) -> str:
+        shown = ", ".join(f"{v!r}" + (f" ×{n}" if n > 1 else "") for v, n in list(self.bad.items())[:limit])
+        more = f" (и ещё {len(self.bad) - limit})" if len(self.bad) > limit else ""
+        return f"{self.source}: не распознано {self.bad_count} — {shown}{more}"
+
+
+def check_dates(values, source: str = "") -> tuple[list[str | None], DateReport]:
+    """Пачка дат → (нормализованные, отчёт)"""
+    report = DateReport(source)
+    return [report.add(raw) for raw in values], report
@@ -1,4 +1,13 @@
-import xml.etree.ElementTree as ET
+import io
+import json
+
+from app_logging import get_logger, Summary
+from code_diff import diff_files, diff_codes
+from move_cache import default_cache
+from move_xml import scan_move_xml
+
+log = get_logger("file_comparer")
+
 
 def compare_string_arrays(arr1: list[str], arr2: list[str]):
     """
@@ -8,22 +17,25 @@ def compare_string_arrays(arr1: list[str], arr2: list[str]):
     Если нет — {"equal": False, "only_in_first": [...], "only_in_second": [...]}.
     """
 
-    # Преобразуем в множества, чтобы легко найти различия
-    set1, set2 = set(arr1), set(arr2)
+    # Один проход слиянием отсортированных списков (code_diff): маска 1 — только в первом, 2 — только во втором
+    only = {1: [], 2: []}
+
+    def sink(rows):
+        for mask, code in rows:
+            only[mask].append(code)
 
-    # Разности
-    only_in_first = sorted(list(set1 - set2))
-    only_in_second = sorted(list(set2 - set1))
+    result = diff_codes({"first": arr1, "second": arr2}, sink)
+    only_in_first, only_in_second = only[1], only[2]
 
-    if not only_in_first and not only_in_second:
-        print("✅ Массивы совпадают полностью.")
+    if result.equal:
+        log.info("✅ Массивы совпадают полностью (%d).", result.common)
         return {"equal": True}
     else:
-        print("❌ Массивы различаются.")
+        log.info("❌ Массивы различаются.")
         if only_in_first:
-            print("➡️ Есть только в первом массиве:", only_in_first)
+            log.info("➡️ Есть только в первом массиве: %s", Summary(only_in_first))
         if only_in_second:
-            print("⬅️ Есть только во втором массиве:", only_in_second)
+            log.info("⬅️ Есть только во втором массиве: %s", Summary(only_in_second))
 
         return {
             "equal": False,
@@ -32,11 +44,7 @@ def compare_string_arrays(arr1: list[str], arr2: list[str]):
         }
 
 
-import re
-import xml.etree.ElementTree as ET
-
-
-def extract_sscc_codes(xml_source: str) -> list[str]:
+def extract_sscc_codes(xml_source: str, cached: bool = True) -> list[str]:
     """
     Извлекает все <sscc>...</sscc> из XML-файла или XML-строки.
 
@@ -44,41 +52,55 @@ def extract_sscc_codes(xml_source: str) -> list[str]:
       - путь к файлу (.xml)
       - XML в виде строки (в том числе с HTML-мусором в начале)
 
+    Файл читается потоково (move_xml.scan_move_xml), дерево целиком не строится;
+    разбор файла кэшируется по sha256 (move_cache) — повторный запуск на том же файле не разбирает его.
+
     :param xml_source: путь к файлу или XML-строка
+    :param cached: False — разбирать файл, не заглядывая в кэш (бенчмарки)
     :return: список кодов (list[str])
     """
     try:
         # Определяем, это путь к файлу или XML-текст
         if xml_source.strip().endswith(".xml") or "\n" not in xml_source:
-            with open(xml_source, "r", encoding="utf-8") as f:
-                xml_content = f.read()
+            if cached:
+                codes = default_cache().scan_path(xml_source)["codes"]
+            else:
+                with open(xml_source, "rb") as f:
+                    codes = scan_move_xml(f)["codes"]
         else:
-            xml_content = xml_source
-
-        # Очищаем возможные "мусорные" префиксы вроде "This XML file does not appear..."
-        xml_content = re.sub(r"^[^<]+<", "<", xml_content.strip(), flags=re.DOTALL)
+            codes = scan_move_xml(io.BytesIO(xml_source.encode("utf-8")))["codes"]
 
-        # Парсим XML
-        root = ET.fromstring(xml_content)
-
-        # Ищем все теги <sscc> на любом уровне
-        codes = [el.text.strip() for el in root.iter() if el.tag.endswith("sscc") and el.text]
-
-        print(f"✅ Найдено {len(codes)} код(ов) SSCC")
+        log.info("✅ Найдено %d код(ов) SSCC", len(codes))
         return codes
 
-    except ET.ParseError as e:
-        print(f"❌ Ошибка парсинга XML: {e}")
-        return []
     except FileNotFoundError:
-        print(f"❌ Файл не найден: {xml_source}")
+        log.error("❌ Файл не найден: %s", xml_source)
         return []
     except Exception as e:
-        print(f"⚠️ Ошибка при обработке XML: {e}")
+        log.warning("⚠️ Ошибка при обработке XML: %s", e)
         return []
 
 
+def compare_files(paths: list[str], sample: int = 20) -> dict:
+    """
+    Сравнение N файлов (XML с <sscc> или текст, код на строку) потоково:
+    память не зависит от размера файлов. Возвращает сводку code_diff (счётчики + первые коды).
+    """
+    result = diff_files(paths)
+    log.info("%s: общих %d, различий %d", ", ".join(result.names), result.common, result.different)
+    summary = result.to_dict()
+    for p in summary["patterns"]:
+        p["sample"] = p["sample"][:sample]
+    return summary
+
+
 if __name__ =="__main__":
+    import sys
+    if len(sys.argv) > 2:
+        # python file_comparer.py 601.xml 701.xml склад.xml
+        print(json.dumps(compare_files(sys.argv[1:]), ensure_ascii=False, indent=2))
+        raise SystemExit(0)
+
     codes = extract_sscc_codes("601.xml")
     # print(codes)
     codes2 = extract_sscc_codes("701.xml")
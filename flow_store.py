@@ -0,0 +1,295 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from code_diff import pack, unpack
+
+
+# =========================================================
+# ====== Серверное хранилище состояния цепочки (SQLite) ====
+# =========================================================
+#
+# В Flask-сессии остаётся только flow_id. Всё тяжёлое лежит здесь:
+#   flows       — маленькое состояние (имена XML, doc_num/doc_date, flow_ctx без кодов, ...)
+#   flow_blobs  — сжатые списки кодов и JSON-ответы шагов (читаются только теми шагами, кому нужны)
+#   flow_logs   — журнал выполнения, одна строка на запись (add_log не переписывает весь блоб)
+#   flow_diff   — различия кодов между XML (маска присутствия + код), читаются постранично;
+#                 SSCC лежат INTEGER-ами (code_diff.pack), прочие коды — текстом
+
+DEFAULT_PATH = os.path.join(".", ".flow_store", "flows.sqlite3")
+MAX_AGE = 7 * 24 * 3600   # сек.: старее — удаляем в cleanup()
+CLEANUP_INTERVAL = 3600   # сек.: maybe_cleanup() (старт, загрузка XML, пакет) чистит не чаще
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS flows (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flow_blobs (
+    flow_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (flow_id, name)
+);
+CREATE TABLE IF NOT EXISTS flow_logs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    flow_id TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS flow_logs_flow ON flow_logs (flow_id, seq);
+CREATE TABLE IF NOT EXISTS flow_diff (
+    flow_id TEXT NOT NULL,
+    mask INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    code NOT NULL,
+    PRIMARY KEY (flow_id, mask, seq)
+) WITHOUT ROWID;
+"""
+DIFF_BATCH = 10_000   # строк различий на один executemany
+
+
+class FlowStore:
+    """Состояние цепочек по flow_id. Потокобезопасно: своё соединение на поток."""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local()
+        self._cleanup_lock = threading.Lock()
+        self._cleaned_at: float | None = None
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- сами цепочки ----------
+    def create(self, **state) -> str:
+        flow_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO flows (id, state, updated_at) VALUES (?, ?, ?)",
+            (flow_id, json.dumps(state, ensure_ascii=False), time.time())
+        )
+        return flow_id
+
+    def exists(self, flow_id: str | None) -> bool:
+        if not flow_id:
+            return False
+        return self._conn().execute("SELECT 1 FROM flows WHERE id = ?", (flow_id,)).fetchone() is not None
+
+    def get(self, flow_id: str | None) -> dict:
+        if not flow_id:
+            return {}
+        row = self._conn().execute("SELECT state FROM flows WHERE id = ?", (flow_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def update(self, flow_id: str, **fields):
+        """Слить fields в состояние (None — удалить ключ)"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT state FROM flows WHERE id = ?", (flow_id,)).fetchone()
+            state = json.loads(row[0]) if row else {}
+            for k, v in fields.items():
+                if v is None:
+                    state.pop(k, None)
+                else:
+                    state[k] = v
+            conn.execute(
+                "INSERT OR REPLACE INTO flows (id, state, updated_at) VALUES (?, ?, ?)",
+                (flow_id, json.dumps(state, ensure_ascii=False), time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, flow_id: str | None):
+        if not flow_id:
+            return
+        conn = self._conn()
+        conn.execute("DELETE FROM flows WHERE id = ?", (flow_id,))
+        conn.execute("DELETE FROM flow_blobs WHERE flow_id = ?", (flow_id,))
+        conn.execute("DELETE FROM flow_logs WHERE flow_id = ?", (flow_id,))
+        conn.execute("DELETE FROM flow_diff WHERE flow_id = ?", (flow_id,))
+
+    def cleanup(self, max_age: float = MAX_AGE) -> int:
+        """Удалить цепочки, которые не трогали дольше max_age, и строки без цепочки; сколько цепочек удалено"""
+        conn = self._conn()
+        old = [r[0] for r in conn.execute(
+            "SELECT id FROM flows WHERE updated_at < ?", (time.time() - max_age,)
+        )]
+        for flow_id in old:
+            self.delete(flow_id)
+        for table in ("flow_blobs", "flow_logs", "flow_diff"):
+            conn.execute(f"DELETE FROM {table} WHERE flow_id NOT IN (SELECT id FROM flows)")
+        return len(old)
+
+    def maybe_cleanup(self, max_age: float = MAX_AGE, interval: float = CLEANUP_INTERVAL) -> int:
+        """cleanup(), если с прошлой прошло больше interval — можно звать на каждой загрузке"""
+        now = time.monotonic()
+        with self._cleanup_lock:
+            if self._cleaned_at is not None and now - self._cleaned_at < interval:
+                return 0
+            self._cleaned_at = now
+        return self.cleanup(max_age)
+
+    # ---------- блобы: коды и JSON ----------
+    def _put_blob(self, flow_id: str, name: str, size: int, raw: bytes):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO flow_blobs (flow_id, name, size, data) VALUES (?, ?, ?, ?)",
+            (flow_id, name, size, zlib.compress(raw, 1))
+        )
+
+    def _get_blob(self, flow_id: str, name: str) -> bytes | None:
+        row = self._conn().execute(
+            "SELECT data FROM flow_blobs WHERE flow_id = ? AND name = ?", (flow_id, name)
+        ).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def put_codes(self, flow_id: str, name: str, codes: list[str]):
+        """Список кодов один раз, сжатым текстом (по строке на код)"""
+        self._put_blob(flow_id, f"codes:{name}", len(codes), "\n".join(codes).encode("utf-8"))
+
+    def get_codes(self, flow_id: str, name: str) -> list[str]:
+        raw = self._get_blob(flow_id, f"codes:{name}")
+        return raw.decode("utf-8").split("\n") if raw else []
+
+    def count_codes(self, flow_id: str, name: str) -> int:
+        row = self._conn().execute(
+            "SELECT size FROM flow_blobs WHERE flow_id = ? AND name = ?", (flow_id, f"codes:{name}")
+        ).fetchone()
+        return row[0] if row else 0
+
+    def put_json(self, flow_id: str, name: str, value):
+        raw = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        self._put_blob(flow_id, f"json:{name}", len(raw), raw)
+
+    def get_json(self, flow_id: str, name: str, default=None):
+        raw = self._get_blob(flow_id, f"json:{name}")
+        return json.loads(raw) if raw else default
+
+    def drop(self, flow_id: str, name: str):
+        self._conn().execute(
+            "DELETE FROM flow_blobs WHERE flow_id = ? AND (name = ? OR name = ?)",
+            (flow_id, f"json:{name}", f"codes:{name}")
+        )
+
+    # ---------- различия кодов ----------
+    def put_diff(self, flow_id: str, rows) -> int:
+        """
+        rows — (маска, код) по возрастанию кода (DiffResult.collect). Пишется пачками в одной
+        транзакции, внутри маски seq идёт по порядку — по нему и листаем. Возвращает число строк.
+        """
+        conn = self._conn()
+        seqs: dict[int, int] = {}
+        batch, total = [], 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM flow_diff WHERE flow_id = ?", (flow_id,))
+            for mask, code in rows:
+                seq = seqs[mask] = seqs.get(mask, 0) + 1
+                value = pack(code)
+                batch.append((flow_id, mask, seq, code if value is None else value))
+                if len(batch) >= DIFF_BATCH:
+                    conn.executemany("INSERT INTO flow_diff (flow_id, mask, seq, code) VALUES (?, ?, ?, ?)", batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany("INSERT INTO flow_diff (flow_id, mask, seq, code) VALUES (?, ?, ?, ?)", batch)
+                total += len(batch)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return total
+
+    def diff_page(self, flow_id: str | None, mask: int, after: int = 0, limit: int = 100,
+                  q: str = "") -> tuple[list[str], int | None]:
+        """
+        Коды маски mask после курсора after → (коды, следующий курсор или None).
+        q — подстрока кода (фильтр на стороне SQLite, курсор тот же).
+        """
+        if not flow_id:
+            return [], None
+        sql = "SELECT seq, code FROM flow_diff WHERE flow_id = ? AND mask = ? AND seq > ?"
+        args = [flow_id, mask, after]
+        if q:
+            sql += " AND instr(CASE WHEN typeof(code) = 'integer' THEN printf('%018d', code) ELSE code END, ?) > 0"
+            args.append(q)
+        rows = self._conn().execute(sql + " ORDER BY seq LIMIT ?", (*args, limit + 1)).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        codes = [unpack(c) if isinstance(c, int) else c for _, c in rows]
+        return codes, (rows[-1][0] if more else None)
+
+    # ---------- ответы шагов ----------
+    def set_response(self, flow_id: str, step: str, response: dict):
+        self.put_json(flow_id, f"resp:{step}", response)
+
+    def get_response(self, flow_id: str, step: str) -> dict:
+        return self.get_json(flow_id, f"resp:{step}", {})
+
+    def clear_responses(self, flow_id: str):
+        self._conn().execute(
+            "DELETE FROM flow_blobs WHERE flow_id = ? AND name LIKE 'json:resp:%'", (flow_id,)
+        )
+
+    # ---------- журнал ----------
+    def add_log(self, flow_id: str, entry: dict):
+        self._conn().execute(
+            "INSERT INTO flow_logs (flow_id, entry) VALUES (?, ?)",
+            (flow_id, json.dumps(entry, ensure_ascii=False))
+        )
+
+    def get_logs(self, flow_id: str | None) -> list[dict]:
+        if not flow_id:
+            return []
+        return [json.loads(r[0]) for r in self._conn().execute(
+            "SELECT entry FROM flow_logs WHERE flow_id = ? ORDER BY seq", (flow_id,)
+        )]
+
+    def logs_page(self, flow_id: str | None, after: int = 0, limit: int = 100, step: str = "",
+                  status: str = "", q: str = "") -> tuple[list[dict], int | None]:
+        """
+        Записи журнала после курсора after (seq) → (записи с полем seq, курсор следующей страницы или None).
+        Фильтры: step/status — точное совпадение, q — подстрока в записи.
+        """
+        if not flow_id:
+            return [], None
+        rows = self._conn().execute(
+            "SELECT seq, entry FROM flow_logs WHERE flow_id = ? AND seq > ? AND instr(entry, ?) > 0 ORDER BY seq",
+            (flow_id, after, q)
+        )
+        out = []
+        for seq, raw in rows:
+            entry = json.loads(raw)
+            if (step and entry.get("step") != step) or (status and entry.get("status") != status):
+                continue
+            if len(out) == limit:
+                return out, out[-1]["seq"]
+            entry["seq"] = seq
+            out.append(entry)
+        return out, None
+
+    def last_log(self, flow_id: str | None) -> dict | None:
+        if not flow_id:
+            return None
+        row = self._conn().execute(
+            "SELECT seq, entry FROM flow_logs WHERE flow_id = ? ORDER BY seq DESC LIMIT 1", (flow_id,)
+        ).fetchone()
+        return {**json.loads(row[1]), "seq": row[0]} if row else None
+
+    def clear_logs(self, flow_id: str):
+        self._conn().execute("DELETE FROM flow_logs WHERE flow_id = ?", (flow_id,))
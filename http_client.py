@@ -0,0 +1,125 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import RequestHistory, Retry
+
+from config import get_config
+
+
+# =========================================================
+# ====== Общий HTTP-клиент: пул соединений на вендора =====
+# =========================================================
+
+# значения по умолчанию — если в varables/http.json нет секции HTTP или поля
+DEFAULTS = {
+    "connect_timeout": 5,       # сек. на установку соединения
+    "read_timeout": 120,        # сек. на ожидание ответа
+    "retries": 3,               # повторы (connect-ошибки — всегда, read/status — только идемпотентные методы)
+    "backoff_factor": 0.5,      # пауза между повторами: 0.5, 1, 2, ...
+    "pool_connections": 4,      # сколько хостов держит адаптер
+    "pool_maxsize": 16          # keep-alive соединений на хост
+}
+RETRY_STATUSES = (502, 503, 504)
+
+_sessions: dict[str, requests.Session] = {}
+_lock = threading.Lock()
+_settings: dict | None = None
+
+
+def load_section(name: str, defaults: dict) -> dict:
+    """defaults, перекрытые секцией name из varables/*.json (если она есть)"""
+    merged = dict(defaults)
+    try:
+        section = getattr(get_config(), name)
+        for key in defaults:
+            if hasattr(section, key):
+                merged[key] = getattr(section, key)
+    except (AttributeError, FileNotFoundError):
+        pass
+    return merged
+
+
+def settings() -> dict:
+    """Настройки клиента: DEFAULTS, перекрытые секцией HTTP из varables/http.json"""
+    global _settings
+    if _settings is None:
+        _settings = load_section("HTTP", DEFAULTS)
+    return _settings
+
+
+def base_of(url: str) -> str:
+    """'http://host/api/auth?x=1' → 'http://host'"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def retry_policy() -> Retry:
+    """
+    Политика повторов — одна на оба клиента: пул requests (get_session) и httpx
+    в requests_service_async (там её применяет свой транспорт).
+    """
+    s = settings()
+    return Retry(
+        total=s["retries"],
+        connect=s["retries"],
+        read=s["retries"],
+        status=s["retries"],
+        backoff_factor=s["backoff_factor"],
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,   # без POST: его повторяем только при connect-ошибке
+        raise_on_status=False
+    )
+
+
+def backoff(policy: Retry, failures: int) -> float:
+    """Пауза перед повтором после failures неудач подряд — по формуле urllib3 (как у пула requests)"""
+    history = (RequestHistory(None, None, None, None, None),) * failures
+    return policy.new(history=history).get_backoff_time()
+
+
+def _build_session() -> requests.Session:
+    s = settings()
+    adapter = HTTPAdapter(
+        pool_connections=s["pool_connections"],
+        pool_maxsize=s["pool_maxsize"],
+        max_retries=retry_policy()
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+def get_session(base_url: str) -> requests.Session:
+    """Один пуловый requests.Session на базовый URL вендора (varables/links.json)"""
+    base = base_of(base_url)
+    session = _sessions.get(base)
+    if session is None:
+        with _lock:
+            session = _sessions.get(base)
+            if session is None:
+                session = _sessions[base] = _build_session()
+    return session
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """Как requests.request, но через тёплый пул и с таймаутами по умолчанию"""
+    if "timeout" not in kwargs:
+        s = settings()
+        kwargs["timeout"] = (s["connect_timeout"], s["read_timeout"])
+    return get_session(url).request(method, url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def close_all():
+    """Закрыть все пулы (например, при остановке скрипта)"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
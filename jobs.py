@@ -0,0 +1,120 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+import http_client
+from app_logging import redact
+from flow_store import FlowStore
+from transfer_flow import FlowError, run_chain, log
+
+
+# =========================================================
+# ======== Фоновые задачи: цепочка вне Flask-запроса =======
+# =========================================================
+#
+# run_flow кладёт цепочку в очередь и сразу отвечает; шаги крутит пул потоков.
+# Статус задачи лежит в состоянии цепочки (FlowStore, ключ "job"):
+#   {"status": "queued|running|done|failed", "step": ..., "error": ..., "updated": ...}
+# Упавшую (или прерванную рестартом) задачу можно продолжить — run_chain начнёт с шага после last_step.
+# Лимит по вендору соблюдается до пула: цепочка, которой не хватило слота, ждёт в очереди вендора,
+# а не занимает поток пула — цепочки других вендоров идут мимо неё.
+
+DEFAULTS = {
+    "workers": 4,        # сколько цепочек идёт одновременно
+    "vendor_limit": 0    # сколько цепочек одного вендора одновременно (0 — без ограничения)
+}
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobEngine:
+    def __init__(self, store: FlowStore, workers: int | None = None, vendor_limits: dict | None = None):
+        """vendor_limits — {ВЕНДОР: N} или {"*": N} для всех; по умолчанию JOBS.vendor_limit"""
+        self.store = store
+        s = http_client.load_section("JOBS", DEFAULTS)
+        workers = workers or s["workers"]
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="flow-job")
+        self._active: set[str] = set()
+        self._lock = threading.Lock()
+        self._vendor_limits = dict(vendor_limits) if vendor_limits is not None else (
+            {"*": s["vendor_limit"]} if s["vendor_limit"] else {}
+        )
+        self._running: dict[str, int] = {}                        # вендор → сколько его цепочек в пуле
+        self._pending: dict[str, deque[tuple[str, Future]]] = {}  # вендор → ждут свободного слота
+
+    def _vendor_limit(self, flow_id: str) -> tuple[str, int]:
+        """Вендор цепочки и его лимит (0 — без ограничения)"""
+        vendor = ((self.store.get(flow_id).get("flow_ctx") or {}).get("vendor") or "").upper()
+        return vendor, self._vendor_limits.get(vendor) or self._vendor_limits.get("*") or 0
+
+    def _set_status(self, flow_id: str, status: str, **extra):
+        job = {"status": status, "updated": datetime.now().strftime("%H:%M:%S")}
+        job.update(extra)
+        self.store.update(flow_id, job=job)
+
+    def submit(self, flow_id: str) -> Future | None:
+        """Поставить цепочку в очередь. Возвращает Future (результат — итоговый статус) или None, если она уже выполняется."""
+        with self._lock:
+            if flow_id in self._active:
+                return None
+            self._active.add(flow_id)
+        self._set_status(flow_id, "queued")
+        vendor, limit = self._vendor_limit(flow_id)
+        future = Future()
+        with self._lock:
+            if limit and self._running.get(vendor, 0) >= limit:
+                self._pending.setdefault(vendor, deque()).append((flow_id, future))
+                return future
+            self._running[vendor] = self._running.get(vendor, 0) + 1
+        self._dispatch(flow_id, vendor, future)
+        return future
+
+    def _dispatch(self, flow_id: str, vendor: str, future: Future):
+        try:
+            self._pool.submit(self._run, flow_id, vendor, future)
+        except RuntimeError:                 # пул уже остановлен — цепочка останется queued → interrupted
+            self._finish(flow_id, vendor, future, None)
+
+    def _finish(self, flow_id: str, vendor: str, future: Future, status: str | None):
+        """Освободить слот вендора: следующую ждущую цепочку — в пул, иначе слот свободен"""
+        with self._lock:
+            self._active.discard(flow_id)
+            queue = self._pending.get(vendor)
+            following = queue.popleft() if queue else None
+            if following is None:
+                self._running[vendor] -= 1
+        future.set_result(status)
+        if following is not None:
+            self._dispatch(following[0], vendor, following[1])
+
+    def _run(self, flow_id: str, vendor: str, future: Future):
+        status = "failed"
+        try:
+            self._set_status(flow_id, "running")
+            run_chain(self.store, flow_id)
+            self._set_status(flow_id, "done")
+            status = "done"
+        except FlowError as e:
+            log(self.store, flow_id, e.step, "Ошибка", "🔴", str(e))
+            self._set_status(flow_id, "failed", step=e.step, error=str(e))
+        except Exception as e:
+            step = self.store.get(flow_id).get("current_step") or "—"
+            log(self.store, flow_id, step, "Ошибка HTTP", "🔴", redact(e))
+            self._set_status(flow_id, "failed", step=step, error=redact(e))
+        finally:
+            self._finish(flow_id, vendor, future, status)
+
+    def is_active(self, flow_id: str) -> bool:
+        with self._lock:
+            return flow_id in self._active
+
+    def status(self, flow_id: str) -> dict:
+        """Статус задачи; queued/running без живого потока (после рестарта) → interrupted"""
+        job = dict(self.store.get(flow_id).get("job") or {})
+        if job.get("status") in ACTIVE_STATUSES and not self.is_active(flow_id):
+            job["status"] = "interrupted"
+        return job
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
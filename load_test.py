@@ -0,0 +1,192 @@
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bench import gen_move_xml
+from mock_vendor import MockVendor
+
+
+# =========================================================
+# ===== Нагрузочный прогон цепочки перемещения (офлайн) ====
+# =========================================================
+#
+# Поднимает заглушку вендора (mock_vendor.py) или берёт готовую (--target), направляет
+# на неё все вендоры (VENDOR_BASE_URL) и гоняет N цепочек через само Flask-приложение:
+# /upload_xmls → /run_flow → опрос /flow_status → /flow_logs. Каждая цепочка — своя
+# сессия (свой test_client), одновременно — --concurrency.
+# Итог: пропускная способность (цепочек/с, кодов/с), p50/p99 времени цепочки и каждого
+# шага (duration_ms из журнала), счётчики заглушки (запросы, соединения, ошибки).
+#
+#   python load_test.py --chains 50 --concurrency 10 --codes 20000 --latency 30
+#   python load_test.py --target http://127.0.0.1:8800 --chains 20 -o load.json
+
+POLL_INTERVAL = 0.05     # сек. между опросами /flow_status
+CHAIN_TIMEOUT = 600      # сек. на одну цепочку
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    """p-й перцентиль (ближайший ранг); None — значений нет"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def _summary(values: list[float], errors: int = 0) -> dict:
+    return {
+        "count": len(values),
+        "errors": errors,
+        "p50": percentile(values, 50),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+        "mean": round(statistics.fmean(values), 1) if values else None,
+    }
+
+
+def run_chain(flask_app, index: int, codes: int, vendor: str, md1: str, md2: str) -> dict:
+    """Одна цепочка от загрузки XML до конца; возвращает статус, время и длительности шагов"""
+    client = flask_app.test_client()
+    doc = gen_move_xml(codes, seed=index + 1)
+    row = {"chain": index, "status": None, "seconds": None, "steps": {}, "step_errors": {}, "error": None}
+
+    resp = client.post("/upload_xmls", content_type="multipart/form-data", data={
+        "xml1": (io.BytesIO(doc), f"601_{index}.xml"),
+        "xml2": (io.BytesIO(doc), f"701_{index}.xml"),
+    })
+    if resp.status_code != 302:
+        row["error"] = f"/upload_xmls → {resp.status_code}"
+        return row
+
+    started = time.perf_counter()
+    resp = client.post("/run_flow", data={"vendor": vendor, "md1": md1, "md2": md2})
+    if resp.status_code != 302:
+        row["error"] = f"/run_flow → {resp.status_code}"
+        return row
+    while True:
+        job = client.get("/flow_status").get_json()["job"]
+        if job.get("status") not in ("queued", "running"):
+            break
+        if time.perf_counter() - started > CHAIN_TIMEOUT:
+            job = {"status": "timeout"}
+            break
+        time.sleep(POLL_INTERVAL)
+    row["seconds"] = round(time.perf_counter() - started, 3)
+    row["status"] = job.get("status")
+    row["error"] = job.get("error")
+
+    logs = client.get("/flow_logs?limit=1000").get_json()["logs"]
+    for entry in logs:
+        if entry.get("duration_ms") is not None:
+            row["steps"].setdefault(entry["step"], []).append(entry["duration_ms"])
+            if entry.get("status") == "🔴":      # шаг с ошибкой (цепочка на нём останавливается)
+                row["step_errors"][entry["step"]] = row["step_errors"].get(entry["step"], 0) + 1
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон цепочки перемещения на заглушке вендора")
+    parser.add_argument("--chains", type=int, default=20, help="сколько цепочек прогнать")
+    parser.add_argument("--concurrency", type=int, default=5, help="сколько цепочек запускать одновременно")
+    parser.add_argument("--job-workers", type=int, default=0, help="потоков JobEngine (0 — из JOBS)")
+    parser.add_argument("--codes", type=int, default=10_000, help="SSCC в каждой цепочке")
+    parser.add_argument("--vendor", default="SOTEX")
+    parser.add_argument("--md1", default="27")
+    parser.add_argument("--md2", default="45")
+    parser.add_argument("--target", help="адрес уже запущенной заглушки (иначе поднимаем свою)")
+    parser.add_argument("--latency", type=float, default=20, help="задержка своей заглушки, мс")
+    parser.add_argument("--jitter", type=float, default=10, help="± к задержке, мс")
+    parser.add_argument("--per-code-us", type=float, default=0, help="мкс на код в incom/outcom")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ошибок заглушки 0..1")
+    parser.add_argument("--max-codes", type=int, default=0, help="лимит кодов в запросе у заглушки")
+    parser.add_argument("-o", "--output", help="записать отчёт JSON")
+    args = parser.parse_args(argv)
+
+    mock = None
+    if args.target:
+        target = args.target
+    else:
+        mock = MockVendor(latency_ms=args.latency, jitter_ms=args.jitter, per_code_us=args.per_code_us,
+                          error_rate=args.error_rate, max_codes=args.max_codes).start()
+        target = mock.url
+    os.environ["VENDOR_BASE_URL"] = target          # до импорта app: Config соберётся уже с ним
+
+    import app_logging
+    app_logging.configure(level="WARNING")
+    import app
+    app.DEBUG_MODE = False                          # без подтверждений: run_flow → фоновая задача
+    # Flask-Session 0.5 с SESSION_USE_SIGNER кладёт в cookie bytes — свежий Werkzeug на этом падает;
+    # тестовому клиенту подпись не нужна
+    app.app.config["SESSION_USE_SIGNER"] = False
+    app.Session(app.app)
+    if args.job_workers:
+        app.JOBS = app.JobEngine(app.FLOWS, workers=args.job_workers)
+
+    print(f"→ {target}: цепочек {args.chains}, одновременно {args.concurrency}, кодов в цепочке {args.codes}")
+    started = time.perf_counter()
+    done = 0
+    done_lock = threading.Lock()
+
+    def one(i):
+        nonlocal done
+        row = run_chain(app.app, i, args.codes, args.vendor, args.md1, args.md2)
+        with done_lock:
+            done += 1
+            mark = "🟢" if row["status"] == "done" else "🔴"
+            print(f"{mark} #{i:<4} {row['status'] or '—':8} {row['seconds'] or 0:8.2f} s  "
+                  f"[{done}/{args.chains}] {row['error'] or ''}", flush=True)
+        return row
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        rows = list(pool.map(one, range(args.chains)))
+    wall = time.perf_counter() - started
+
+    ok = [r for r in rows if r["status"] == "done"]
+    steps: dict[str, list[float]] = {}
+    step_errors: dict[str, int] = {}
+    for r in rows:
+        for step, values in r["steps"].items():
+            steps.setdefault(step, []).extend(values)
+        for step, n in r["step_errors"].items():
+            step_errors[step] = step_errors.get(step, 0) + n
+
+    report = {
+        "meta": {"started": datetime.now().isoformat(timespec="seconds"), "target": target, **vars(args)},
+        "wall_s": round(wall, 3),
+        "chains": {"total": len(rows), "done": len(ok), "failed": len(rows) - len(ok)},
+        "throughput": {"chains_per_s": round(len(ok) / wall, 3), "codes_per_s": round(len(ok) * args.codes / wall)},
+        "chain_s": _summary([r["seconds"] for r in ok]),
+        "steps_ms": {step: _summary(values, step_errors.get(step, 0)) for step, values in steps.items()},
+        "mock": mock.stats() if mock else None,
+        "errors": [{"chain": r["chain"], "error": r["error"]} for r in rows if r["error"]][:50],
+    }
+
+    print(f"\nИтого: {len(ok)}/{len(rows)} за {wall:.2f} s — {report['throughput']['chains_per_s']} цепочек/с, "
+          f"{report['throughput']['codes_per_s']} кодов/с; цепочка p50 {report['chain_s']['p50']} s, "
+          f"p99 {report['chain_s']['p99']} s")
+    for step, s in report["steps_ms"].items():
+        print(f"  {step:8} n={s['count']:<5} ошибок {s['errors']:<4} p50 {s['p50']:>7} мс  p99 {s['p99']:>7} мс  "
+              f"max {s['max']:>7} мс")
+    if mock:
+        st = report["mock"]
+        print(f"  заглушка: соединений {st['connections']}, одновременно до {st['max_in_flight']}, "
+              f"запросов {sum(e['requests'] for e in st['endpoints'].values())}, "
+              f"ошибок {sum(e['errors'] for e in st['endpoints'].values())}")
+        mock.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"→ {args.output}")
+    return 0 if len(ok) == len(rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+import threading
+import time
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+
+# =========================================================
+# ====== Метрики шагов цепочки (формат Prometheus) ========
+# =========================================================
+#
+# Свой маленький реестр без зависимостей: счётчики и гистограммы с метками,
+# всё в памяти процесса. /metrics в app.py отдаёт render() как text/plain.
+#
+#   STEP_DURATION.observe(0.42, vendor="SOTEX", step="incom1", endpoint="/api/incom")
+#   STEP_REQUESTS.inc(vendor="SOTEX", step="incom1", endpoint="/api/incom", status="200")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+STEP_LABELS = ("vendor", "step", "endpoint")
+
+_registry: list = []
+
+
+def _fmt(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def get(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labels), 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_str(self.labels, key)} {_fmt(value)}")
+        return lines
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (кумулятивные bucket, sum, count)"""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DURATION_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple, list] = {}     # метки → [счётчики по корзинам..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, **labels) -> int:
+        row = self._values.get(tuple(str(labels.get(n, "")) for n in self.labels))
+        return row[-1] if row else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, row in items:
+            acc = 0
+            for bound, n in zip(self.buckets + (float("inf"),), row):
+                acc += n
+                le = 'le="' + _fmt(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, le)} {acc}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {_fmt(round(row[-2], 6))}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {row[-1]}")
+        return lines
+
+
+def render() -> str:
+    """Все метрики процесса в текстовом формате Prometheus"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def endpoint_of(url: str) -> str:
+    """'https://host/api/incom?access-token=...' → '/api/incom' (токен в метки не попадает)"""
+    return urlsplit(url).path or "/"
+
+
+# ---------- метрики цепочки перемещения ----------
+STEP_REQUESTS = Counter("transfer_step_requests_total",
+                        "Шаги цепочки по статусу ответа (cached — токен из кэша)", STEP_LABELS + ("status",))
+STEP_DURATION = Histogram("transfer_step_duration_seconds",
+                          "Длительность шага цепочки, с", STEP_LABELS, DURATION_BUCKETS)
+STEP_REQUEST_BYTES = Histogram("transfer_step_request_bytes",
+                               "Размер тела запроса шага, байт", STEP_LABELS, BYTES_BUCKETS)
+STEP_RESPONSE_BYTES = Histogram("transfer_step_response_bytes",
+                                "Размер тела ответа шага, байт", STEP_LABELS, BYTES_BUCKETS)
+STEP_CODES = Counter("transfer_step_codes_total",
+                     "Сколько кодов отправлено шагами цепочки", STEP_LABELS)
+
+
+class StepTimer:
+    """
+    with StepTimer(vendor, step, url) as t:
+        ... запрос ...
+        t.done(status, request_bytes, response_bytes, codes)
+    После выхода t.ms — длительность в миллисекундах (для журнала).
+    """
+    __slots__ = ("labels", "started", "ms", "_result")
+
+    def __init__(self, vendor: str, step: str, url: str):
+        self.labels = {"vendor": vendor or "", "step": step, "endpoint": endpoint_of(url)}
+        self.started = 0.0
+        self.ms = None
+        self._result = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def done(self, status, request_bytes: int = 0, response_bytes: int = 0, codes: int = 0):
+        self._result = (status, request_bytes, response_bytes, codes)
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        self.ms = round(seconds * 1000)
+        status, req_bytes, resp_bytes, codes = self._result or ("error", 0, 0, 0)
+        STEP_DURATION.observe(seconds, **self.labels)
+        STEP_REQUESTS.inc(status=status, **self.labels)
+        if req_bytes:
+            STEP_REQUEST_BYTES.observe(req_bytes, **self.labels)
+        if resp_bytes:
+            STEP_RESPONSE_BYTES.observe(resp_bytes, **self.labels)
+        if codes:
+            STEP_CODES.inc(codes, **self.labels)
+        return False
+
+
+def cached_step(vendor: str, step: str, url: str):
+    """Шаг, закрытый кэшем (авторизация без сети) — только счётчик"""
+    STEP_REQUESTS.inc(vendor=vendor or "", step=step, endpoint=endpoint_of(url), status="cached")
@@ -0,0 +1,209 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import http_client
+from milk_worker import convert_one
+
+
+# =========================================================
+# ===== Пакетная конвертация молочных JSON → XML (ZIP) =====
+# =========================================================
+#
+# На входе — папка или ZIP-архив с JSON производителя и списками кодов к ним:
+#   партия1.json + партия1.txt (или .csv) — код на строку, можно с <GS>
+# Если списка кодов рядом нет, берутся uit из products_list самого JSON.
+#
+# Каждая пара разбирается один раз и превращается в XML в отдельном процессе
+# (ProcessPoolExecutor, spawn — Flask-потоки в дочерние процессы не копируются;
+# сама конвертация — в milk_worker, модуле без побочных эффектов при импорте).
+# Готовые XML пишутся во временную папку, а наружу отдаётся ZIP, собираемый
+# на лету: первые байты уходят, как только готов первый файл. В конце архива —
+# report.json со сводкой по каждому файлу.
+
+DEFAULTS = {
+    "workers": 0,        # процессов конвертации; 0 — по числу CPU
+}
+CODE_SUFFIXES = (".txt", ".csv")
+COPY_CHUNK = 256 * 1024
+
+
+def settings() -> dict:
+    return http_client.load_section("MILK_BATCH", DEFAULTS)
+
+
+# ---------- что конвертируем ----------
+def find_jobs(folder: str) -> list[dict]:
+    """Пары (JSON, список кодов) в папке (рекурсивно): [{"name", "json", "codes"}]"""
+    jobs = []
+    for root, _, files in os.walk(folder):
+        names = set(files)
+        for fn in sorted(files):
+            stem, ext = os.path.splitext(fn)
+            if ext.lower() != ".json":
+                continue
+            codes = next((os.path.join(root, stem + s) for s in CODE_SUFFIXES if stem + s in names), None)
+            rel = os.path.relpath(os.path.join(root, stem), folder)
+            jobs.append({"name": rel.replace(os.sep, "/"), "json": os.path.join(root, fn), "codes": codes})
+    return jobs
+
+
+def unpack_archive(source, folder: str):
+    """ZIP (путь или поток) → folder; пути внутри архива не выпускаем за пределы folder"""
+    base = os.path.realpath(folder)
+    with zipfile.ZipFile(source) as zf:
+        for member in zf.infolist():
+            target = os.path.realpath(os.path.join(folder, member.filename))
+            if not target.startswith(base + os.sep):
+                raise ValueError(f"Недопустимый путь в архиве: {member.filename}")
+        zf.extractall(folder)
+
+
+def convert_all(jobs: list[dict], out_dir: str, workers: int | None = None):
+    """Параллельно по процессам; отдаёт строки отчёта по мере готовности"""
+    workers = workers or settings()["workers"] or os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs) or 1))
+    if workers == 1:
+        for job in jobs:
+            yield convert_one(job, out_dir)
+        return
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        with _plain_main():
+            futures = [pool.submit(convert_one, job, out_dir) for job in jobs]   # процессы стартуют здесь
+        for fut in as_completed(futures):
+            yield fut.result()
+    except BaseException:
+        # клиент закрыл ZIP (GeneratorExit) или упал воркер: оставшиеся файлы не конвертируем и не ждём
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+
+_MAIN_LOCK = threading.Lock()
+
+
+@contextlib.contextmanager
+def _plain_main():
+    """На время запуска воркеров прячем __main__ (app.py): spawn иначе выполнит его в каждом процессе
+    (FlowStore, JobEngine, кэши). Воркеру нужен только milk_worker — он импортируется по имени."""
+    with _MAIN_LOCK:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+# ---------- потоковый ZIP ----------
+class _Pipe(io.RawIOBase):
+    """Неперематываемый приёмник для ZipFile: всё записанное забираем кусками через take()"""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._buf += b
+        return len(b)
+
+    def take(self) -> bytes:
+        out = bytes(self._buf)
+        self._buf.clear()
+        return out
+
+
+def stream_zip(jobs: list[dict], workdir: str, workers: int | None = None, cleanup: bool = True):
+    """
+    Генератор байтов ZIP: XML по мере готовности + report.json.
+    workdir — где лежат исходники и куда пишутся XML; cleanup=True — удалить его в конце.
+    """
+    out_dir = os.path.join(workdir, "_xml")
+    os.makedirs(out_dir, exist_ok=True)
+    pipe = _Pipe()
+    report = {"files": [], "ok": 0, "failed": 0, "started": time.time()}
+    try:
+        # closing: если клиент оборвал загрузку, пул конвертации гасится сразу, а не при сборке мусора
+        with contextlib.closing(convert_all(jobs, out_dir, workers)) as rows, \
+                zipfile.ZipFile(pipe, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+            for row in rows:
+                report["files"].append(row)
+                if row["error"]:
+                    report["failed"] += 1
+                    continue
+                report["ok"] += 1
+                src_path = os.path.join(out_dir, row["xml"])
+                info = zipfile.ZipInfo(row["xml"], time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(src_path, "rb") as src, zf.open(info, "w", force_zip64=True) as dst:
+                    while True:
+                        chunk = src.read(COPY_CHUNK)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        data = pipe.take()
+                        if data:
+                            yield data
+                os.remove(src_path)
+                yield pipe.take()
+            report["seconds"] = round(time.time() - report.pop("started"), 2)
+            zf.writestr("report.json", json.dumps(report, ensure_ascii=False, indent=2))
+        yield pipe.take()
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def prepare_workdir(source: str) -> tuple[str, list[dict]]:
+    """
+    Папка или ZIP → (временная рабочая папка, задания).
+    Папку читаем на месте; ZIP распаковываем в рабочую папку (она удаляется после stream_zip).
+    """
+    work = tempfile.mkdtemp(prefix="milk-batch-")
+    if os.path.isdir(source):
+        return work, find_jobs(source)
+    unpack_archive(source, os.path.join(work, "src"))
+    return work, find_jobs(os.path.join(work, "src"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная конвертация молочных JSON → XML ввода в оборот (ZIP)")
+    parser.add_argument("source", help="папка или ZIP: <имя>.json + <имя>.txt/.csv с кодами")
+    parser.add_argument("-o", "--output", default="milk_xml.zip", help="куда записать ZIP")
+    parser.add_argument("--workers", type=int, default=0, help="процессов (0 — по настройке/числу CPU)")
+    args = parser.parse_args(argv)
+
+    work, jobs = prepare_workdir(args.source)
+    if not jobs:
+        shutil.rmtree(work, ignore_errors=True)
+        print("Нет JSON-файлов")
+        return 1
+    with open(args.output, "wb") as out:
+        for chunk in stream_zip(jobs, work, args.workers or None):
+            out.write(chunk)
+
+    with zipfile.ZipFile(args.output) as zf:
+        report = json.loads(zf.read("report.json"))
+    for row in report["files"]:
+        mark = "🔴" if row["error"] else "🟢"
+        print(f'{mark} {row["name"]}: {row["error"] or str(row["codes"]) + " кодов"} ({row["seconds"]} с)')
+    print(f'Итого: {report["ok"]} XML, ошибок {report["failed"]} за {report["seconds"]} с → {args.output}')
+    return 0 if not report["failed"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
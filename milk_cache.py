@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import http_client
+from milk_xml import parse_json_stream
+
+
+# =========================================================
+# ====== Загруженные молочные JSON: файлы + кэш разбора ====
+# =========================================================
+#
+# Загрузка кладётся на диск под именем sha256 содержимого (одинаковые файлы — один файл),
+# в сессии остаётся только этот хэш. Разобранный документ живёт в LRU-кэше по тому же хэшу:
+# скачивание XML/предпросмотр не читают и не парсят JSON заново, пока запись не вытеснена.
+# Загрузка пишется на диск кусками (хэш считается по дороге), разбор — потоковый
+# (parse_json_stream): в документе шапка, первые продукты и сводка, а не весь products_list.
+# Файлы, которых не касались дольше max_age, удаляет cleanup() (зовётся при каждой загрузке,
+# но не чаще раза в CLEANUP_INTERVAL).
+#
+# Настройки — секция MILK_CACHE (varables/http.json).
+
+DEFAULTS = {
+    "folder": os.path.join(".", ".flow_store", "milk"),
+    "max_entries": 32,                 # разобранных документов в памяти
+    "max_bytes": 256 * 1024 * 1024,    # их суммарный размер (по размеру разобранного документа в JSON)
+    "max_age": 24 * 3600               # сек.: загрузки старше удаляются с диска
+}
+CLEANUP_INTERVAL = 600
+COPY_CHUNK = 1024 * 1024
+
+
+class ParseCache:
+    """LRU: хэш → разобранный документ; вытесняет по числу записей и по суммарному размеру"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries, self.max_bytes = max_entries, max_bytes
+        self._items: OrderedDict[str, tuple[dict, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, digest: str) -> dict | None:
+        with self._lock:
+            item = self._items.get(digest)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(digest)
+            self.hits += 1
+            return item[0]
+
+    def put(self, digest: str, parsed: dict, size: int):
+        if size > self.max_bytes:
+            return                     # один документ больше всего кэша — не держим
+        with self._lock:
+            old = self._items.pop(digest, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[digest] = (parsed, size)
+            self._bytes += size
+            while self._items and (len(self._items) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+
+    def discard(self, digest: str):
+        with self._lock:
+            old = self._items.pop(digest, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class MilkUploads:
+    """Загрузки по хэшу содержимого: save() → digest, load(digest) → разобранный документ (через кэш)"""
+
+    def __init__(self, folder: str | None = None, max_entries: int | None = None,
+                 max_bytes: int | None = None, max_age: float | None = None):
+        s = http_client.load_section("MILK_CACHE", DEFAULTS)
+        self.folder = os.path.abspath(folder or s["folder"])
+        self.max_age = s["max_age"] if max_age is None else max_age
+        self.cache = ParseCache(max_entries or s["max_entries"], max_bytes or s["max_bytes"])
+        self._last_cleanup = 0.0
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path_of(self, digest: str) -> str:
+        if not digest or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError("некорректный ключ загрузки")
+        return os.path.join(self.folder, digest + ".json")
+
+    def save(self, stream) -> tuple[str, dict]:
+        """
+        Сохранить загрузку (бинарный поток, например FileStorage.stream) кусками, без чтения
+        целиком; такая уже есть — только обновить время. Разобрать один раз → (digest, документ).
+        """
+        tmp = os.path.join(self.folder, f"upload.{os.getpid()}.{threading.get_ident()}.tmp")
+        sha = hashlib.sha256()
+        try:
+            with open(tmp, "wb") as f:
+                while chunk := stream.read(COPY_CHUNK):
+                    sha.update(chunk)
+                    f.write(chunk)
+            digest = sha.hexdigest()
+            path = self.path_of(digest)
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        parsed = self.cache.get(digest)
+        if parsed is None:
+            parsed = self._parse(digest, path)
+        self.cleanup()
+        return digest, parsed
+
+    def _parse(self, digest: str, path: str) -> dict:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            parsed = parse_json_stream(f)
+        self.cache.put(digest, parsed, len(json.dumps(parsed, ensure_ascii=False)))
+        return parsed
+
+    def load(self, digest: str | None) -> dict | None:
+        """Документ по хэшу: из кэша, иначе с диска (и снова в кэш). None — загрузки уже нет."""
+        if not digest:
+            return None
+        parsed = self.cache.get(digest)
+        if parsed is not None:
+            return parsed
+        path = self.path_of(digest)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return self._parse(digest, path)
+
+    def cleanup(self, force: bool = False):
+        """Удалить загрузки старше max_age (и недописанные .tmp)"""
+        now = time.time()
+        if not force and now - self._last_cleanup < CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = now
+        for entry in os.scandir(self.folder):
+            try:
+                if entry.stat().st_mtime < now - self.max_age:
+                    os.remove(entry.path)
+                    if entry.name.endswith(".json"):
+                        self.cache.discard(entry.name[:-5])
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        files = [e for e in os.scandir(self.folder) if e.name.endswith(".json")]
+        return {**self.cache.stats(), "files": len(files), "files_bytes": sum(e.stat().st_size for e in files)}
+
+
+def preview(parsed: dict | None, products: int = 20) -> dict | None:
+    """Что показать на странице: шапка, сводка + первые products продуктов"""
+    if not parsed:
+        return parsed
+    items = parsed.get("products") or []
+    out = {k: v for k, v in parsed.items() if k != "products"}
+    out.setdefault("products_count", len(items))
+    out["products"] = items[:products]
+    return out
@@ -0,0 +1,52 @@
+import os
+import time
+
+from code_check import CodeError, require_valid
+from milk_xml import PRODUCT_KEYS, parse_json_stream, iter_xml
+
+
+# ==========================================================
+# ===== Конвертация одного молочного JSON (для milk_batch) =====
+# ==========================================================
+#
+# Точка входа дочерних процессов ProcessPoolExecutor. Модуль нарочно без
+# побочных эффектов при импорте и без зависимостей от Flask/хранилищ:
+# воркер импортирует только его (и code_check/milk_xml/dates).
+
+
+def convert_one(job: dict, out_dir: str) -> dict:
+    """JSON + коды → out_dir/<name>.xml. Возвращает строку отчёта (ошибки — в поле error, не исключением)."""
+    started = time.perf_counter()
+    row = {"name": job["name"], "xml": None, "codes": 0, "duplicates": 0, "error": None}
+    try:
+        # JSON разбирается потоково; uit собираем, только если своего списка кодов нет
+        uits = {key: [] for key in PRODUCT_KEYS}
+
+        def collect(key, product):
+            if product["uit_code"]:
+                uits[key].append(product["uit_code"])
+
+        with open(job["json"], "r", encoding="utf-8-sig") as f:
+            data = parse_json_stream(f, on_product=None if job["codes"] else collect)
+        if not data:
+            raise ValueError("не удалось разобрать JSON")
+        if job["codes"]:
+            with open(job["codes"], "r", encoding="utf-8-sig") as f:
+                raw_codes = f.read()
+        else:
+            raw_codes = uits["products_list"] or uits["products"]
+        checked = require_valid(raw_codes, "ki")
+        row["codes"], row["duplicates"] = len(checked.codes), len(checked.duplicates)
+
+        row["xml"] = job["name"] + ".xml"
+        path = os.path.join(out_dir, row["xml"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as out:
+            for chunk in iter_xml(data, checked.ki()):
+                out.write(chunk)
+    except CodeError as e:
+        row["xml"], row["error"] = None, f"коды: {e}"
+    except Exception as e:
+        row["xml"], row["error"] = None, str(e)
+    row["seconds"] = round(time.perf_counter() - started, 3)
+    return row
@@ -0,0 +1,309 @@
+import json
+import re
+from io import BytesIO
+
+from code_check import require_valid, CodeList
+from dates import DateReport
+
+
+# =========================================================
+# ====== Молочный JSON → XML ввода в оборот (без Flask) ====
+# =========================================================
+#
+# Разбор JSON производителя и генерация introduce_rf / introduce_contract.
+# Вынесено из app.py, чтобы тем же кодом пользовались пакетная конвертация
+# (milk_batch.py, в отдельных процессах) и вкладка 1.
+
+
+PRODUCT_KEYS = ("products_list", "products")   # где лежат продукты (products_list приоритетнее)
+KEEP_PRODUCTS = 20        # сколько первых продуктов держит потоковый разбор (шаблон XML + предпросмотр)
+MAX_COMBOS = 1000         # сколько разных сочетаний ТН ВЭД/сертификата считаем, дальше — только флаг
+READ_CHUNK = 256 * 1024   # символов за одно чтение в потоковом разборе
+DATE_FIELDS = ("production_date", "certificate_date")
+BAD_DATES = 20            # сколько разных нераспознанных (и подозрительных) дат показываем
+_WS = re.compile(r"[ \t\r\n]*")
+
+
+def _header(data: dict) -> dict:
+    result = {
+        'producer_inn': data.get('producer_inn') or data.get('participant_inn'),
+        'owner_inn': data.get('owner_inn') or data.get('producer_inn'),
+        'production_date': data.get('production_date', ''),
+        'production_type': data.get('production_type', ''),
+        'products': []
+    }
+    if not result['production_type']:
+        result['production_type'] = 'OWN_PRODUCTION' if result['producer_inn'] == result['owner_inn'] else 'CONTRACT_PRODUCTION'
+    return result
+
+
+def _product(p: dict) -> dict:
+    product = {
+        'uit_code': p.get('uit') or p.get('uit_code', ''),
+        'tnved_code': p.get('tnved_code', ''),
+        'production_date': p.get('production_date', ''),
+        'certificate_number': '',
+        'certificate_date': '',
+        'vsd_number': p.get('vsd_number', '')
+    }
+    certs = p.get('certificate_document_data', [])
+    if certs:
+        c = certs[0]
+        product['certificate_number'] = c.get('certificate_number', '')
+        product['certificate_date'] = c.get('certificate_date', '')
+    return product
+
+
+class _ProductStats:
+    """
+    Счётчики по продуктам: сколько всего, сколько с uit, какие сочетания ТН ВЭД/сертификата.
+    Даты продуктов только проверяются (dates.DateReport на поле) — в документе и в XML они
+    остаются как пришли; нераспознанные попадают в bad_dates, подозрительные — в suspicious_dates.
+    """
+
+    def __init__(self, keep: int | None):
+        self.keep = keep
+        self.products: list[dict] = []
+        self.count = self.with_uit = 0
+        self.combos: dict[tuple, int] = {}
+        self.truncated = False
+        self.dates = {name: DateReport(name) for name in DATE_FIELDS}
+
+    def add(self, product: dict):
+        for name in DATE_FIELDS:
+            self.dates[name].add(product[name])
+        self.count += 1
+        if product['uit_code']:
+            self.with_uit += 1
+        if self.keep is None or len(self.products) < self.keep:
+            self.products.append(product)
+        key = (product['tnved_code'], product['certificate_number'], product['certificate_date'])
+        if key in self.combos:
+            self.combos[key] += 1
+        elif len(self.combos) < MAX_COMBOS:
+            self.combos[key] = 1
+        else:
+            self.truncated = True
+
+    def _flagged(self, attr: str) -> list[dict]:
+        rows = [{'field': name, 'value': v, 'count': c}
+                for name, report in self.dates.items() for v, c in getattr(report, attr).items()]
+        return rows[:BAD_DATES]
+
+    def fill(self, result: dict) -> dict:
+        self.dates['production_date'].add(result['production_date'])
+        result['products'] = self.products
+        result['products_count'] = self.count
+        result['products_with_uit'] = self.with_uit
+        result['combos'] = [
+            {'tnved_code': t, 'certificate_number': n, 'certificate_date': d, 'count': c}
+            for (t, n, d), c in sorted(self.combos.items(), key=lambda kv: -kv[1])
+        ]
+        result['combos_truncated'] = self.truncated
+        result['bad_dates'] = self._flagged('bad')
+        result['suspicious_dates'] = self._flagged('suspicious')
+        return result
+
+
+def parse_json(file_content: str) -> dict:
+    """
+    Разбор молочного JSON (из твоего предыдущего кода), целиком в памяти: в products — все продукты.
+    Плюс сводка, как у parse_json_stream: products_count, products_with_uit, combos,
+    bad_dates / suspicious_dates. Даты остаются как в JSON — их только проверяем.
+    """
+    try:
+        data = json.loads(file_content)
+    except Exception:
+        return {}
+
+    stats = _ProductStats(keep=None)
+    for p in data.get('products_list') or data.get('products') or []:
+        stats.add(_product(p))
+    return stats.fill(_header(data))
+
+
+# ---------- потоковый разбор ----------
+class _Reader:
+    """
+    Текстовый поток → JSON-значения по одному (json.JSONDecoder.raw_decode по скользящему буферу).
+    В памяти — непрочитанный хвост буфера и одно текущее значение, а не весь документ.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.buf, self.pos, self.eof = "", 0, False
+        self.decoder = json.JSONDecoder()
+
+    def _more(self, size: int = READ_CHUNK) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(size)
+        if isinstance(chunk, bytes):
+            raise TypeError("нужен текстовый поток (io.TextIOWrapper)")
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos > READ_CHUNK:            # прочитанное уже не нужно
+            self.buf, self.pos = self.buf[self.pos:], 0
+        self.buf += chunk
+        return True
+
+    def peek(self) -> str:
+        """Следующий значащий символ (пробелы пропускаются); "" — конец потока"""
+        while True:
+            pos = self.pos = _WS.match(self.buf, self.pos).end()
+            if pos < len(self.buf):
+                return self.buf[pos]
+            if not self._more():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise ValueError(f"ожидалось {chars!r}, а встретилось {ch or 'конец файла'!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        """Одно JSON-значение целиком; если оно не влезло в буфер — дочитываем (с удвоением)"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # число у края буфера могло оборваться — проверяем, что за ним уже что-то есть
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._more(max(READ_CHUNK, len(self.buf) - self.pos))
+
+    def items(self):
+        """Элементы массива по одному (открывающая [ ещё не прочитана)"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def parse_json_stream(fp, keep: int = KEEP_PRODUCTS, on_product=None) -> dict:
+    """
+    Потоковый разбор молочного JSON: fp — текстовый поток (open(..., encoding="utf-8-sig")).
+    Шапка — как у parse_json; из продуктов в памяти только первые keep (их хватает XML-шаблону
+    и предпросмотру), остальные только считаются (products_count, combos).
+    on_product(key, product) — вызывается для каждого продукта; key — из какого списка
+    (products_list / products), чтобы вызывающий выбрал тот же список, что и разбор.
+    Ошибка разбора → {} (как parse_json).
+    """
+    reader = _Reader(fp)
+    header: dict = {}
+    stats = {key: _ProductStats(keep) for key in PRODUCT_KEYS}
+    try:
+        reader.expect("{")
+        if reader.peek() != "}":
+            while True:
+                key = reader.value()
+                reader.expect(":")
+                if key in PRODUCT_KEYS and reader.peek() == "[":
+                    for p in reader.items():
+                        product = _product(p)
+                        stats[key].add(product)
+                        if on_product is not None:
+                            on_product(key, product)
+                else:
+                    header[key] = reader.value()
+                if reader.expect(",}") == "}":
+                    break
+        else:
+            reader.pos += 1
+    except (ValueError, TypeError, AttributeError):
+        return {}
+
+    # как в parse_json: products_list, если он непустой, иначе products
+    chosen = stats["products_list"] if stats["products_list"].count else stats["products"]
+    return chosen.fill(_header(header))
+
+
+def _xml_header_footer(data: dict) -> tuple[str, str]:
+    """Шапка документа (до <product>) и его хвост"""
+    lines = []
+    if data.get('production_type') == 'CONTRACT_PRODUCTION':
+        lines.append('<introduce_contract version="7">')
+        lines.append(f'    <producer_inn>{data.get("producer_inn","")}</producer_inn>')
+        lines.append(f'    <owner_inn>{data.get("owner_inn","")}</owner_inn>')
+        lines.append(f'    <production_date>{data.get("production_date","")}</production_date>')
+        lines.append(f'    <production_order>{data.get("production_type","")}</production_order>')
+        footer = '</introduce_contract>'
+    else:
+        lines.append('<introduce_rf version="9">')
+        lines.append(f'    <trade_participant_inn>{data.get("producer_inn","")}</trade_participant_inn>')
+        lines.append(f'    <producer_inn>{data.get("producer_inn","")}</producer_inn>')
+        lines.append(f'    <owner_inn>{data.get("owner_inn","")}</owner_inn>')
+        lines.append(f'    <production_date>{data.get("production_date","")}</production_date>')
+        lines.append(f'    <production_order>{data.get("production_type","")}</production_order>')
+        footer = '</introduce_rf>'
+    lines.append('    <products_list>')
+    return "\n".join(lines), '    </products_list>\n' + footer
+
+
+def _product_template(data: dict) -> tuple[str, str]:
+    """
+    Заранее собранный блок <product> для документа: всё, кроме ki, одинаково
+    для всех кодов, поэтому держим только префикс и суффикс вокруг значения ki.
+    """
+    p = (data.get('products') or [{}])[0]
+    prefix = '\n        <product>\n            <ki><![CDATA['
+    tail = [
+        ']]></ki>',
+        f'            <production_date>{data.get("production_date","")}</production_date>',
+        f'            <tnved_code>{p.get("tnved_code","")}</tnved_code>',
+        '            <certificate_type>CONFORMITY_DECLARATION</certificate_type>',
+        f'            <certificate_number>{p.get("certificate_number","")}</certificate_number>',
+        f'            <certificate_date>{p.get("certificate_date","")}</certificate_date>',
+    ]
+    if p.get("vsd_number"):
+        tail.append(f'            <vsd_number>{p["vsd_number"]}</vsd_number>')
+    tail.append('        </product>')
+    return prefix, "\n".join(tail)
+
+
+XML_STREAM_BATCH = 1000  # сколько <product> отдаём одним куском при стриминге
+
+
+def iter_xml(data: dict, ki_values, batch_size: int = XML_STREAM_BATCH):
+    """
+    Потоковая генерация XML: отдаёт документ кусками bytes, не держа его целиком в памяти.
+    ki_values — уже нормализованные значения <ki> (CodeList.ki()).
+    """
+    header, footer = _xml_header_footer(data)
+    prefix, suffix = _product_template(data)
+    yield header.encode('utf-8')
+
+    buf = []
+    for ki in ki_values:
+        buf.append(prefix + ki + suffix)
+        if len(buf) >= batch_size:
+            yield "".join(buf).encode('utf-8')
+            buf = []
+    if buf:
+        yield "".join(buf).encode('utf-8')
+
+    yield ('\n' + footer).encode('utf-8')
+
+
+def generate_xml(data: dict, codes: list[str] | CodeList, stream: bool = False):
+    """
+    Генерация XML для молочного блока (из твоего кода).
+    codes — строки КИ как вставили (или готовый CodeList): дубли убираются,
+    кривые коды → CodeError ещё до первого байта ответа.
+    stream=True — вернуть генератор кусков bytes (для chunked Response), иначе BytesIO.
+    """
+    chunks = iter_xml(data, require_valid(codes, "ki").ki())
+    if stream:
+        return chunks
+    return BytesIO(b"".join(chunks))
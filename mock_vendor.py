@@ -0,0 +1,240 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+# =========================================================
+# ====== Локальная заглушка SOTEX/RAFARMA (для нагрузки) ===
+# =========================================================
+#
+# Те же ручки, что дёргает цепочка перемещения и разгруппировка:
+#   POST /api/auth                      → {"token": {"id": ...}}
+#   POST /api/v1/document/tsd-run       → {"data": {"id": ...}}
+#   POST /api/incom, /api/outcom        → {"success": true, "codes": N}
+#   POST /api/unGroup                   → {"success": true, "groupCode": ...}
+# Ручки с ?access-token= проверяют, что токен выдан этой заглушкой (иначе 401 —
+# так проверяется сброс кэша токенов). Задержка, доля ошибок и лимиты размера
+# настраиваются; счётчики по ручкам — GET /_stats (и MockVendor.stats()).
+#
+#   python mock_vendor.py --port 8800 --latency 50 --jitter 20 --error-rate 0.01
+#   VENDOR_BASE_URL=http://127.0.0.1:8800 python app.py      # все вендоры → заглушка
+
+DEFAULTS = {
+    "latency_ms": 20,          # базовая задержка ответа
+    "jitter_ms": 10,           # ± к задержке (равномерно)
+    "per_code_us": 0,          # доп. задержка на каждый код в incom/outcom (мкс)
+    "error_rate": 0.0,         # доля ответов error_status (0..1)
+    "error_status": 500,
+    "max_codes": 0,            # больше кодов в одном запросе — 413 (0 — без лимита)
+    "max_body_bytes": 0,       # тело больше — 413 (0 — без лимита)
+    "token_ttl": 0,            # сек.; протухший токен → 401 (0 — не протухает)
+}
+TOKEN_ENDPOINTS = ("/api/v1/document/tsd-run", "/api/incom", "/api/outcom", "/api/unGroup")
+ENDPOINTS = ("/api/auth",) + TOKEN_ENDPOINTS
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"      # keep-alive: иначе пул соединений клиента не проверить
+    server: "_Server"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.mock.connected()     # новое TCP-соединение (keep-alive их переиспользует)
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlsplit(self.path).path == "/_stats":
+            self._reply(200, self.server.mock.stats())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        mock = self.server.mock
+        started = time.perf_counter()
+        parts = urlsplit(self.path)
+        path = parts.path
+        size = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(size) if size else b""
+        status = 500
+        mock.enter()
+        try:
+            status, body = mock.handle(path, parse_qs(parts.query).get("access-token", [None])[0], raw)
+            time.sleep(mock.delay(body.pop("_codes", 0)))
+            self._reply(status, body)
+        finally:
+            mock.leave(path, status, size, time.perf_counter() - started)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, mock: "MockVendor"):
+        super().__init__(address, _Handler)
+        self.mock = mock
+
+
+class MockVendor:
+    """Заглушка вендора: MockVendor(latency_ms=50).start() → .url; .stop(); .stats()"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, seed: int | None = None, **settings):
+        unknown = set(settings) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Неизвестные настройки заглушки: {', '.join(sorted(unknown))}")
+        self.settings = {**DEFAULTS, **settings}
+        self.host, self.port = host, port
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens: dict[str, float] = {}         # токен → когда выдан
+        self._stats = {p: {"requests": 0, "errors": 0, "bytes_in": 0, "seconds": 0.0} for p in ENDPOINTS}
+        self._in_flight = self._max_in_flight = self._connections = 0
+        self._server: _Server | None = None
+
+    # ---------- жизненный цикл ----------
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "MockVendor":
+        self._server = _Server((self.host, self.port), self)
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, name="mock-vendor", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def serve_forever(self):
+        self._server = _Server((self.host, self.port), self)
+        self.port = self._server.server_port
+        self._server.serve_forever()
+
+    # ---------- ответы ----------
+    def handle(self, path: str, token: str | None, raw: bytes) -> tuple[int, dict]:
+        s = self.settings
+        if path not in ENDPOINTS:
+            return 404, {"error": f"нет ручки {path}"}
+        if s["max_body_bytes"] and len(raw) > s["max_body_bytes"]:
+            return 413, {"error": f"тело {len(raw)} байт больше {s['max_body_bytes']}"}
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            return 400, {"error": "тело не JSON"}
+        if path in TOKEN_ENDPOINTS and not self._token_ok(token):
+            return 401, {"error": "invalid access-token"}
+        if s["error_rate"] and self._random() < s["error_rate"]:
+            return s["error_status"], {"error": "injected failure"}
+
+        if path == "/api/auth":
+            if not payload.get("login"):
+                return 400, {"error": "нет login"}
+            token = uuid.uuid4().hex
+            with self._lock:
+                self._tokens[token] = time.monotonic()
+            return 200, {"token": {"id": token}}
+        if path == "/api/v1/document/tsd-run":
+            return 200, {"data": {"id": uuid.uuid4().hex[:12], "doc_num": payload.get("doc_num")}}
+        if path == "/api/unGroup":
+            return 200, {"success": True, "groupCode": payload.get("groupCode")}
+
+        codes = payload.get("codes")
+        if not isinstance(codes, list):
+            return 400, {"error": "нет codes"}
+        if s["max_codes"] and len(codes) > s["max_codes"]:
+            return 413, {"error": f"кодов {len(codes)} больше {s['max_codes']}"}
+        return 200, {"success": True, "codes": len(codes), "_codes": len(codes)}
+
+    def _token_ok(self, token: str | None) -> bool:
+        with self._lock:
+            issued = self._tokens.get(token)
+        if issued is None:
+            return False
+        ttl = self.settings["token_ttl"]
+        return not ttl or time.monotonic() - issued < ttl
+
+    def _random(self) -> float:
+        with self._lock:
+            return self._rnd.random()
+
+    def delay(self, codes: int = 0) -> float:
+        s = self.settings
+        with self._lock:
+            jitter = self._rnd.uniform(-s["jitter_ms"], s["jitter_ms"])
+        return max(0.0, s["latency_ms"] + jitter) / 1000 + codes * s["per_code_us"] / 1e6
+
+    # ---------- счётчики ----------
+    def connected(self):
+        with self._lock:
+            self._connections += 1
+
+    def enter(self):
+        with self._lock:
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+    def leave(self, path: str, status: int, size: int, seconds: float):
+        with self._lock:
+            self._in_flight -= 1
+            row = self._stats.get(path)
+            if row is None:
+                return
+            row["requests"] += 1
+            row["errors"] += status >= 400
+            row["bytes_in"] += size
+            row["seconds"] += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "settings": dict(self.settings),
+                "connections": self._connections,
+                "max_in_flight": self._max_in_flight,
+                "tokens": len(self._tokens),
+                "endpoints": {p: {**row, "seconds": round(row["seconds"], 3)} for p, row in self._stats.items()},
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальная заглушка SOTEX/RAFARMA")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=DEFAULTS["latency_ms"], help="задержка, мс")
+    parser.add_argument("--jitter", type=float, default=DEFAULTS["jitter_ms"], help="± к задержке, мс")
+    parser.add_argument("--per-code-us", type=float, default=DEFAULTS["per_code_us"], help="мкс на код в incom/outcom")
+    parser.add_argument("--error-rate", type=float, default=DEFAULTS["error_rate"], help="доля ошибок 0..1")
+    parser.add_argument("--error-status", type=int, default=DEFAULTS["error_status"])
+    parser.add_argument("--max-codes", type=int, default=DEFAULTS["max_codes"], help="лимит кодов в запросе (0 — нет)")
+    parser.add_argument("--max-body", type=int, default=DEFAULTS["max_body_bytes"], help="лимит тела, байт (0 — нет)")
+    parser.add_argument("--token-ttl", type=float, default=DEFAULTS["token_ttl"], help="жизнь токена, сек (0 — вечно)")
+    args = parser.parse_args(argv)
+
+    mock = MockVendor(args.host, args.port, latency_ms=args.latency, jitter_ms=args.jitter,
+                      per_code_us=args.per_code_us, error_rate=args.error_rate, error_status=args.error_status,
+                      max_codes=args.max_codes, max_body_bytes=args.max_body, token_ttl=args.token_ttl)
+    print(f"Заглушка вендора: {mock.url} (счётчики — {mock.url}/_stats)")
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
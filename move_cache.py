@@ -0,0 +1,269 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+
+import http_client
+from code_diff import pack, unpack
+from move_xml import SCAN_VERSION, iter_move_tags
+
+
+# =========================================================
+# ====== Кэш разобранных XML перемещения (по sha256) =======
+# =========================================================
+#
+# Один и тот же 601/701 грузят по нескольку раз (поправили поля формы — загрузили снова).
+# Результат разбора — SSCC, doc_num, doc_date — кладём в SQLite под sha256 содержимого файла;
+# повторная загрузка того же файла — это один проход sha256 по байтам и чтение строки из базы.
+#   SSCC хранятся упакованными int64 (code_diff.pack) и сжатыми zlib: 8 байт на код до сжатия;
+#   если в файле есть не-SSCC значения — весь список текстом (тоже zlib).
+# Размер ограничен (число файлов и суммарный объём), вытесняются давно не нужные (LRU по last_used).
+# Ключ — только sha256 файла, поэтому версия сканера (move_xml.SCAN_VERSION) хранится в
+# PRAGMA user_version: база от другой версии при открытии очищается.
+#
+#   MOVES = MoveCache()
+#   scan = MOVES.scan(file.stream)     # {"codes", "doc_num", "doc_date", "cached"}
+#   MOVES.stats()                      # hits / misses / entries / bytes / evictions
+#
+# Настройки — секция MOVE_CACHE (varables/http.json).
+
+DEFAULTS = {
+    "path": os.path.join(".", ".flow_store", "move_cache.sqlite3"),
+    "max_entries": 500,                 # разобранных файлов
+    "max_bytes": 256 * 1024 * 1024,     # их суммарный объём (сжатые коды)
+    "enabled": True
+}
+HASH_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS move_scans (
+    digest TEXT PRIMARY KEY,
+    doc_num TEXT,
+    doc_date TEXT,
+    count INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS move_scans_used ON move_scans (last_used);
+"""
+
+
+class _Codes:
+    """Коды по мере разбора: пока все — SSCC, копим int64 (8 байт на код), иначе — строки"""
+
+    def __init__(self):
+        self.packed: array | None = array("q")
+        self.text: list[str] | None = None
+
+    def append(self, code: str):
+        if self.packed is not None:
+            value = pack(code)
+            if value is not None:
+                self.packed.append(value)
+                return
+            self.text = [unpack(v) for v in self.packed]
+            self.packed = None
+        self.text.append(code)
+
+    def __len__(self):
+        return len(self.packed) if self.packed is not None else len(self.text)
+
+    def to_list(self) -> list[str]:
+        return _unpack_all(self.packed) if self.packed is not None else list(self.text)
+
+    def dump(self) -> tuple[str, bytes]:
+        if self.packed is not None:
+            return "q", zlib.compress(self.packed.tobytes(), 1)
+        return "t", zlib.compress("\n".join(self.text).encode("utf-8"), 1)
+
+
+def _unpack_all(packed: array) -> list[str]:
+    """int64 → коды; если ни один не начинается с 0, str() втрое быстрее форматирования с нулями"""
+    if packed and min(packed) >= 10 ** 17:
+        return list(map(str, packed))
+    return [unpack(v) for v in packed]
+
+
+def _load_codes(kind: str, data: bytes) -> list[str]:
+    raw = zlib.decompress(data)
+    if kind == "q":
+        packed = array("q")
+        packed.frombytes(raw)
+        return _unpack_all(packed)
+    return raw.decode("utf-8").split("\n") if raw else []
+
+
+class _HashingReader:
+    """Обёртка потока: считает sha256 всего прочитанного (для неперематываемых потоков)"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha = hashlib.sha256()
+
+    def read(self, size: int = -1):
+        chunk = self.stream.read(size)
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        self.sha.update(chunk)
+        return chunk
+
+
+def file_digest(stream) -> str:
+    """sha256 потока с текущей позиции до конца"""
+    sha = hashlib.sha256()
+    while chunk := stream.read(HASH_CHUNK):
+        sha.update(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+    return sha.hexdigest()
+
+
+class MoveCache:
+    """Разобранные XML перемещения по sha256 содержимого. Потокобезопасно: своё соединение на поток."""
+
+    def __init__(self, path: str | None = None, max_entries: int | None = None, max_bytes: int | None = None):
+        s = http_client.load_section("MOVE_CACHE", DEFAULTS)
+        self.enabled = bool(s["enabled"])
+        self.path = os.path.abspath(path or s["path"])
+        self.max_entries = max_entries or s["max_entries"]
+        self.max_bytes = max_bytes or s["max_bytes"]
+        self.hits = self.misses = self.evictions = 0
+        self._counters = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCAN_VERSION:
+            conn.execute("DELETE FROM move_scans")       # разобрано другой версией сканера
+            conn.execute(f"PRAGMA user_version = {int(SCAN_VERSION)}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str):
+        with self._counters:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # ---------- чтение / запись ----------
+    def get(self, digest: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT doc_num, doc_date, kind, data FROM move_scans WHERE digest = ?", (digest,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn().execute("UPDATE move_scans SET last_used = ? WHERE digest = ?", (time.time(), digest))
+        doc_num, doc_date, kind, data = row
+        return {"codes": _load_codes(kind, data), "doc_num": doc_num, "doc_date": doc_date}
+
+    def put(self, digest: str, codes: _Codes, doc_num: str | None, doc_date: str | None):
+        kind, data = codes.dump()
+        if len(data) > self.max_bytes:
+            return
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO move_scans (digest, doc_num, doc_date, count, kind, size, data, last_used)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (digest, doc_num, doc_date, len(codes), kind, len(data), data, time.time())
+        )
+        self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Пока больше лимитов — удаляем самые давно использованные"""
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM move_scans").fetchone()
+        if entries <= self.max_entries and total <= self.max_bytes:
+            return
+        for digest, size in conn.execute("SELECT digest, size FROM move_scans ORDER BY last_used").fetchall():
+            if entries <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM move_scans WHERE digest = ?", (digest,))
+            entries, total = entries - 1, total - size
+            self._count("evictions")
+
+    # ---------- разбор через кэш ----------
+    def scan(self, stream) -> dict:
+        """
+        Как move_xml.scan_move_xml, плюс "cached": True, если файл уже разбирали.
+        Перематываемый поток: sha256 → кэш → (при промахе) разбор с начала.
+        Неперематываемый: sha256 считается по ходу разбора, результат кладётся в кэш.
+        """
+        if not self.enabled:
+            return {**self._parse(stream)[0], "cached": False}
+
+        seekable = hasattr(stream, "seek") and (not hasattr(stream, "seekable") or stream.seekable())
+        if seekable:
+            start = stream.tell()
+            digest = file_digest(stream)
+            found = self.get(digest)
+            if found is not None:
+                self._count("hits")
+                return {**found, "cached": True}
+            stream.seek(start)
+            out, codes = self._parse(stream)
+        else:
+            reader = _HashingReader(stream)
+            out, codes = self._parse(reader)
+            digest = reader.sha.hexdigest()
+        self._count("misses")
+        self.put(digest, codes, out["doc_num"], out["doc_date"])
+        return {**out, "cached": False}
+
+    def scan_path(self, path: str) -> dict:
+        with open(path, "rb") as f:
+            return self.scan(f)
+
+    @staticmethod
+    def _parse(stream) -> tuple[dict, _Codes]:
+        codes = _Codes()
+        out = {"doc_num": None, "doc_date": None}
+        for name, value in iter_move_tags(stream):
+            if name == "sscc":
+                codes.append(value)
+            elif out[name] is None:
+                out[name] = value
+        return {"codes": codes.to_list(), **out}, codes
+
+    # ---------- обслуживание ----------
+    def stats(self) -> dict:
+        entries, total, codes = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(count), 0) FROM move_scans"
+        ).fetchone()
+        with self._counters:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        lookups = hits + misses
+        return {
+            "enabled": self.enabled,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 3) if lookups else None,
+            "evictions": evictions,
+            "entries": entries,
+            "bytes": total,
+            "codes": codes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        self._conn().execute("DELETE FROM move_scans")
+
+
+_default: MoveCache | None = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> MoveCache:
+    """Общий кэш процесса (app, file_comparer, batch_transfer)"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = MoveCache()
+        return _default
@@ -0,0 +1,176 @@
+import html
+import re
+
+from dates import normalize_date
+
+
+# =========================================================
+# ===== Потоковый разбор XML перемещения (SSCC/doc_*) =====
+# =========================================================
+#
+# iter_move_tags / scan_move_xml / scan_move_bytes — однопроходный сканер по байтам
+# (им пользуются загрузка XML, сравнение файлов, пакетные режимы): без XML-парсера,
+# поэтому мусор перед <?xml и битая разметка вокруг нужных тегов ему не мешают.
+
+# ---------- Однопроходный сканер (bytes, предкомпилированные регулярки) ----------
+#
+# Одна регулярка на все три поля: <sscc>, <doc_num>, <doc_date> (с префиксом пространства
+# имён или без, с атрибутами и пробелами внутри тега — кроме самозакрытого <sscc/>,
+# значение в CDATA или текстом). findall по bytes — без декодирования документа
+# и без объектов-совпадений; в str превращаются только найденные значения.
+# Поток читается блоками по SCAN_CHUNK; блок режется после последнего целого закрывающего
+# тега — элемент на стыке блоков не теряется (поля-листья внутри себя тегов не содержат).
+
+SCAN_CHUNK = 256 * 1024
+SCAN_VERSION = 1          # менять при любой правке, от которой меняется результат разбора (сбрасывает move_cache)
+ENCODING_HEAD = 512       # в скольких первых байтах ищем <?xml ... encoding="..."?>
+_OPEN = rb"<\s*(?:[\w.-]+:)?(%s)(?:\s[^>]*)?(?<!/)>"       # <sscc>, < x:sscc id="1">, но не <sscc/>
+_BODY = rb"\s*(?:<!\[CDATA\[([^\]]*)\]\]>|([^<]*))\s*</"
+_TAG_RE = re.compile(_OPEN % rb"sscc|doc_num|doc_date" + _BODY, re.IGNORECASE)
+_DOC_RE = re.compile(_OPEN % rb"doc_num|doc_date" + _BODY, re.IGNORECASE)
+# те же регулярки для str (XML уже текстом — не кодируем его обратно в bytes)
+_TAG_RE_STR = re.compile(_TAG_RE.pattern.decode("ascii"), re.IGNORECASE)
+_DOC_RE_STR = re.compile(_DOC_RE.pattern.decode("ascii"), re.IGNORECASE)
+_ENCODING_RE = re.compile(rb"""<\?xml[^>]*?encoding\s*=\s*["']([\w.:-]+)["']""", re.IGNORECASE)
+
+
+def _encoding_of(head: bytes) -> str:
+    """Кодировка из <?xml ... encoding="..."?> (по умолчанию utf-8)"""
+    m = _ENCODING_RE.search(head[:ENCODING_HEAD])
+    return m.group(1).decode("ascii").lower() if m else "utf-8"
+
+
+def _value(raw, encoding: str) -> str:
+    value = raw.strip()
+    if not isinstance(value, str):
+        value = value.decode(encoding, errors="replace")
+    return html.unescape(value) if "&" in value else value
+
+
+def _scan_block(block, out: dict, encoding: str, codes: bool = True):
+    """
+    Все совпадения в блоке → out (codes дописываются, doc_* — только первое вхождение).
+    codes=False — только doc_num/doc_date: идём по совпадениям и останавливаемся, как нашли оба.
+    """
+    text_mode = isinstance(block, str)
+    if not codes:
+        for m in (_DOC_RE_STR if text_mode else _DOC_RE).finditer(block):
+            raw = m.group(2) or m.group(3)
+            key = m.group(1).lower()
+            key = key if text_mode else key.decode("ascii")
+            if raw and not raw.isspace() and out[key] is None:
+                out[key] = _value(raw, encoding)
+                if out["doc_num"] is not None and out["doc_date"] is not None:
+                    return
+        return
+    append = out["codes"].append
+    sscc = "sscc" if text_mode else b"sscc"
+    for name, cdata, text in (_TAG_RE_STR if text_mode else _TAG_RE).findall(block):
+        raw = cdata or text
+        if not raw or raw.isspace():
+            continue
+        name = name.lower()
+        if name == sscc:
+            append(raw.strip() if text_mode else _value(raw, encoding))
+        else:
+            key = name if text_mode else name.decode("ascii")
+            if out[key] is None:
+                out[key] = _value(raw, encoding)
+
+
+def _empty() -> dict:
+    return {"codes": [], "doc_num": None, "doc_date": None}
+
+
+def scan_move_bytes(data, codes: bool = True) -> dict:
+    """
+    XML целиком в памяти (bytes/bytearray/memoryview или str) → {"codes", "doc_num", "doc_date"}
+    за один проход. codes=False — только doc_num/doc_date (коды не собираются).
+    """
+    out = _empty()
+    encoding = "utf-8" if isinstance(data, str) else _encoding_of(bytes(data[:ENCODING_HEAD]))
+    _scan_block(data, out, encoding, codes)
+    return out
+
+
+def iter_move_tags(stream, chunk_size: int = SCAN_CHUNK):
+    """
+    Пары (поле, значение) по блокам bytes — память не растёт с размером файла:
+      ("sscc", код)        — для каждого <sscc> (CDATA и обычный текст одинаково)
+      ("doc_num", номер)   — только первое вхождение
+      ("doc_date", дата)   — только первое вхождение, как есть (без нормализации)
+    """
+    carry = b""
+    encoding = None
+    seen = set()
+    while True:
+        chunk = stream.read(chunk_size)
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+            encoding = "utf-8"            # текст уже раскодирован: объявленная в <?xml кодировка не важна
+        buf = carry + chunk if carry else chunk
+        if encoding is None:
+            if chunk and len(buf) < ENCODING_HEAD:      # объявление <?xml могло ещё не дочитаться
+                carry = buf
+                continue
+            encoding = _encoding_of(buf)
+        if chunk:
+            # режем после последнего целого закрывающего тега; хвост — в следующий блок
+            end = buf.rfind(b"</")
+            close = buf.find(b">", end) if end >= 0 else -1
+            if close < 0 and end >= 0:
+                end = buf.rfind(b"</", 0, end)
+                close = buf.find(b">", end) if end >= 0 else -1
+            if close < 0:
+                carry = buf
+                continue
+            block, carry = buf[:close + 1], buf[close + 1:]
+        else:
+            block, carry = buf, b""
+        out = _empty()
+        _scan_block(block, out, encoding)
+        for name in ("doc_num", "doc_date"):
+            if out[name] is not None and name not in seen:
+                seen.add(name)
+                yield name, out[name]
+        for code in out["codes"]:
+            yield "sscc", code
+        if not chunk:
+            return
+
+
+def scan_move_xml(stream) -> dict:
+    """
+    Собирает результат сканера в словарь за один проход по потоку:
+      {"codes": [...], "doc_num": str|None, "doc_date": str|None}
+    doc_num/doc_date — первое вхождение, как есть (без нормализации).
+    """
+    out = _empty()
+    for name, value in iter_move_tags(stream):
+        if name == "sscc":
+            out["codes"].append(value)
+        elif out[name] is None:
+            out[name] = value
+    return out
+
+
+def extract_sscc_codes_from_text(xml_text) -> list[str]:
+    """Все <sscc>...</sscc> из XML-текста (CDATA и обычный текст, в порядке документа)"""
+    return scan_move_bytes(xml_text)["codes"]
+
+
+def normalize_doc_date(raw: str | None) -> str | None:
+    """Дата документа → YYYY-MM-DD (или None, если не распознали); разбор — dates.normalize_date"""
+    return normalize_date(raw, "doc_date")
+
+
+def parse_move_info(xml_text: str) -> dict:
+    """Достаём doc_num и doc_date (YYYY-MM-DD) из <move_order_notification> (или просто doc_num/doc_date в документе)"""
+    out = {}
+    found = scan_move_bytes(xml_text, codes=False)
+    if found.get("doc_num"):
+        out["doc_num"] = found["doc_num"]
+    iso = normalize_doc_date(found.get("doc_date"))
+    if iso:
+        out["doc_date"] = iso
+    return out
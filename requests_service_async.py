@@ -0,0 +1,324 @@
+import asyncio
+import json
+import threading
+import weakref
+
+import httpx
+
+import http_client  # настройки таймаутов/пула (секция HTTP)
+import token_cache
+from batching import ChunkPlan, should_chunk
+from token_cache import TOKENS
+from app_logging import get_logger, redact, safe_url, Summary
+
+log = get_logger("requests")
+
+
+# =========================================================
+# ====== Асинхронный requests_service (httpx.AsyncClient) ==
+# =========================================================
+#
+# Те же запросы, что и в requests_service, но корутинами на одном общем AsyncClient.
+# Сотни unGroup/incom можно запускать разом через gather_limited(...) под семафором.
+# Синхронный requests_service — тонкая обёртка: run_sync(...) на фоновом event loop.
+
+
+# ===============================
+# 🧱 Тела запросов (общие для sync и async)
+# ===============================
+def build_auth_payload(login, password):
+    return {"login": login, "password": password}
+
+
+def build_accept_payload(object_id, doc_id, doc_date):
+    return {
+        "data": {
+            "action_id": 701,
+            "doc_date_mdlp": doc_date,
+            "doc_num_mdlp": doc_id
+        },
+        "doc_date": doc_date,
+        "doc_id": doc_id,
+        "doc_num": doc_id,
+        "facility_id": object_id,
+        "object_id": object_id,
+        "product_group_id": 12,
+        "type_id": 35
+    }
+
+
+def build_incom_payload(document_id, object_id, codes: list):
+    return {
+        "codes": codes,
+        "document_id": document_id,
+        "hasStaffed": True,
+        "object_uid": object_id
+    }
+
+
+def build_outcom_payload(invoice, invoice_date, object_id, codes: list):
+    return {
+        "codes": codes,
+        "hasStaffed": False,
+        "invoice": invoice,
+        "invoiceDate": invoice_date,
+        "object_uid": object_id
+    }
+
+
+def build_ungroup_payload(group_code):
+    return {
+        "groupCode": group_code,
+        "note": "Другое - разгруппировано"
+    }
+
+
+# ===============================
+# 🌐 Общий клиент (один на event loop)
+# ===============================
+# Ключ — сам loop (слабая ссылка): у нового loop с тем же id() свой клиент, а не чужой с мёртвого.
+# Вместе с клиентом на loop заводится асинхронный генератор-страж: asyncio.run (и любой, кто зовёт
+# loop.shutdown_asyncgens() перед закрытием) закрывает его, а он — клиента и запись в _clients.
+# Страж ссылается на свой loop, поэтому записи закрытых без shutdown_asyncgens loop-ов чистим сами.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+
+
+class _RetryTransport(httpx.AsyncBaseTransport):
+    """
+    Повторы по той же политике, что у пула requests (http_client.retry_policy): connect-ошибки —
+    для любого метода, ошибки чтения и RETRY_STATUSES — только идемпотентные; паузы — http_client.backoff.
+    """
+
+    def __init__(self, **kwargs):
+        self.policy = http_client.retry_policy()
+        self.inner = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        idempotent = request.method.upper() in self.policy.allowed_methods
+        failures = 0
+        while True:
+            last = failures >= self.policy.total
+            try:
+                response = await self.inner.handle_async_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if last:
+                    raise
+            except (httpx.ReadError, httpx.ReadTimeout, httpx.RemoteProtocolError):
+                if last or not idempotent:
+                    raise
+            else:
+                if last or not self.policy.is_retry(request.method, response.status_code):
+                    return response
+                await response.aclose()
+            failures += 1
+            await asyncio.sleep(http_client.backoff(self.policy, failures))
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+async def _close_on_shutdown(client: httpx.AsyncClient):
+    try:
+        yield
+    finally:
+        _clients.pop(asyncio.get_running_loop(), None)
+        await client.aclose()
+
+
+def get_client() -> httpx.AsyncClient:
+    """AsyncClient текущего event loop: keep-alive пул, таймауты и повторы — как у http_client"""
+    loop = asyncio.get_running_loop()
+    client, _ = _clients.get(loop, (None, None))
+    if client is None or client.is_closed:
+        for dead in [lp for lp in _clients if lp.is_closed()]:
+            del _clients[dead]
+        s = http_client.settings()
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(s["read_timeout"], connect=s["connect_timeout"]),
+            limits=httpx.Limits(max_connections=s["pool_maxsize"] * s["pool_connections"],
+                                max_keepalive_connections=s["pool_maxsize"]),
+            transport=_RetryTransport(),
+            headers={"Content-Type": "application/json"}
+        )
+        guard = _close_on_shutdown(client)
+        try:
+            guard.asend(None).send(None)             # сразу до yield: теперь loop знает про генератор
+        except StopIteration:
+            pass
+        _clients[loop] = (client, guard)
+    return client
+
+
+async def close_client():
+    _, guard = _clients.get(asyncio.get_running_loop(), (None, None))
+    if guard is not None:
+        await guard.aclose()
+
+
+async def gather_limited(coros, limit: int = 20) -> list:
+    """Запустить корутины разом, но не больше limit одновременно (порядок результатов сохраняется)"""
+    sem = asyncio.Semaphore(limit)
+
+    async def one(coro):
+        async with sem:
+            return await coro
+
+    return await asyncio.gather(*(one(c) for c in coros))
+
+
+# ===============================
+# 🔑 Авторизация
+# ===============================
+async def send_auth_request(base_url, login, password, vendor=None, md=None):
+    """
+    Авторизация. Токен кэшируется (token_cache.TOKENS) по ключу (vendor, md),
+    а если они не переданы — по (base_url, login); повторный вызов не ходит в сеть.
+    """
+    key = (vendor.upper() if vendor else base_url, str(md) if md is not None else login)
+    token = TOKENS.get(key)
+    if token:
+        log.info("✅ Токен взят из кэша: %s", key)
+        return {"token": {"id": token}}
+
+    url = f"{base_url}/api/auth"
+    try:
+        response = await get_client().post(url, content=json.dumps(build_auth_payload(login, password)))
+        if response.status_code == 200:
+            log.info("✅ Авторизация успешна: %s", key)
+            data = response.json()
+            token = ((data.get("token") or {}).get("id")) if isinstance(data, dict) else None
+            if token:
+                TOKENS.put(key, token)
+            return data
+        else:
+            log.error("❌ Ошибка авторизации: %s %s", response.status_code, Summary(response.text))
+            return None
+    except Exception as e:
+        log.warning("⚠️ Ошибка при отправке запроса авторизации: %s", e)
+        return None
+
+
+# ===============================
+# 🔹 1. Заявка на приёмку
+# ===============================
+async def send_accept_request(base_url, token, object_id, doc_id, doc_date):
+    url = f"{base_url}/api/v1/document/tsd-run?access-token={token}"
+    return await _post_request(url, build_accept_payload(object_id, doc_id, doc_date))
+
+
+# ===============================
+# 🔹 2. Имитация сканирования — приёмка
+# ===============================
+async def send_incom_request(base_url, token, document_id, object_id, codes: list, chunk_size=None):
+    url = f"{base_url}/api/incom?access-token={token}"
+    return await _post_codes(url, build_incom_payload(document_id, object_id, codes), chunk_size)
+
+
+# ===============================
+# 🔹 3. Имитация сканирования — перемещение
+# ===============================
+async def send_outcom_request(base_url, token, invoice, invoice_date, object_id, codes: list, chunk_size=None):
+    url = f"{base_url}/api/outcom?access-token={token}"
+    return await _post_codes(url, build_outcom_payload(invoice, invoice_date, object_id, codes), chunk_size)
+
+
+# ===============================
+# 🔹 4. Разгруппировка
+# ===============================
+async def send_ungroup_request(base_url, token, group_code):
+    url = f"{base_url}/api/unGroup?access-token={token}"
+    return await _post_request(url, build_ungroup_payload(group_code))
+
+
+# ===============================
+# ⚙️ Вспомогательные функции
+# ===============================
+async def _post_json(url, payload) -> httpx.Response:
+    response = await get_client().post(url, json=payload)
+    token_cache.on_response(url, response.status_code)
+    return response
+
+
+async def _post_codes(url, payload, chunk_size=None):
+    """
+    Запрос со списком кодов: если кодов больше chunk_size (по умолчанию — BATCH.chunk_size
+    из varables/http.json, 0 — не делить), шлём чанками параллельно (BATCH.workers одновременно),
+    упавшие чанки переотправляем до BATCH.retries раз (план — batching.ChunkPlan, общий с sync).
+    Возвращает сводку по чанкам или None, если какие-то чанки так и не ушли.
+    """
+    if not should_chunk(payload["codes"], chunk_size):
+        return await _post_request(url, payload)
+
+    plan = ChunkPlan(payload["codes"], chunk_size)
+    log.info("➡️ Отправляем %d кодов чанками по %d на: %s", len(payload["codes"]), plan.chunk_size, safe_url(url))
+
+    async def send_chunk(chunk):
+        try:
+            response = await _post_json(url, {**payload, "codes": chunk})
+        except Exception as e:
+            return {"ok": False, "status": None, "json": None, "text": str(e)}
+        try:
+            data = response.json()
+        except ValueError:           # 2xx без JSON — чанк всё равно принят, повторять нельзя
+            data = None
+        return {"ok": response.is_success, "status": response.status_code, "json": data,
+                "text": str(response.status_code)}
+
+    for batch in plan.rounds():
+        done = await gather_limited([send_chunk(plan.chunks[i]) for i in batch], plan.workers)
+        for i, result in zip(batch, done):
+            plan.record(i, result)
+
+    if plan.failed:
+        log.error("❌ чанков %d, ошибок %d: %s", len(plan.chunks), len(plan.failed), plan.first_error["text"])
+        return None
+    log.info("✅ чанков %d, ошибок 0 (попыток %d)", len(plan.chunks), plan.attempts)
+    return plan.summary()
+
+
+async def _post_request(url, payload):
+    """Отправка POST-запроса с логом (тело/ответ — сводкой и только на DEBUG; URL — без токена)"""
+    shown = safe_url(url)
+    log.info("➡️ POST %s", shown)
+    log.debug("📦 Тело запроса: %s", Summary(payload))
+
+    try:
+        response = await _post_json(url, payload)
+        if response.status_code == 200:
+            data = response.json()
+            log.info("✅ %s → %s (%d байт)", shown, response.status_code, len(response.content))
+            log.debug("Ответ: %s", Summary(data))
+            return data
+        else:
+            log.error("❌ %s → %s: %s", shown, response.status_code, Summary(response.text))
+            return None
+    except Exception as e:
+        log.warning("⚠️ Ошибка при выполнении запроса %s: %s", shown, redact(e))
+        return None
+
+
+# ===============================
+# 🔁 Мост для синхронного API
+# ===============================
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Один фоновый event loop на процесс — общий AsyncClient живёт в нём между вызовами"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="requests-service-loop", daemon=True).start()
+        return _loop
+
+
+def submit(coro):
+    """Запустить корутину на фоновом loop и не ждать (concurrent.futures.Future)"""
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop())
+
+
+def run_sync(coro):
+    """Выполнить корутину из синхронного кода (в т.ч. из потоков Flask) и вернуть результат"""
+    return submit(coro).result()
@@ -0,0 +1,72 @@
+import asyncio
+import io
+import json
+import logging
+
+import httpx
+import pytest
+
+import app_logging
+import requests_service_async as aio
+from app_logging import JsonLinesFormatter, Summary, redact, safe_url
+
+TOKEN = "s3cr3t-token"
+
+
+@pytest.fixture()
+def jsonl():
+    """JSON-lines вывод дерева milk_prod.* в память"""
+    buf = io.StringIO()
+    handler = logging.StreamHandler(buf)
+    handler.setFormatter(JsonLinesFormatter())
+    root = logging.getLogger(app_logging.ROOT)
+    level = root.level
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+    yield buf
+    root.removeHandler(handler)
+    root.setLevel(level)
+
+
+def test_safe_url_drops_query_and_fragment():
+    assert safe_url(f"https://host:8443/api/incom?access-token={TOKEN}&x=1#f") == "https://host:8443/api/incom"
+    assert safe_url("http://host") == "http://host"
+
+
+def test_redact_hides_token_in_free_text():
+    text = f"Max retries exceeded with url: /api/outcom?access-token={TOKEN}&page=2 (Caused by ...)"
+    assert TOKEN not in redact(text)
+    assert "access-token=***&page=2" in redact(text)
+    assert redact(ValueError(f"'?Access-Token={TOKEN}'")) == "'?Access-Token=***'"
+
+
+def test_summary_is_lazy_and_short():
+    class Boom:
+        def __str__(self):
+            raise AssertionError("форматировать не должны были")
+
+    logging.getLogger(f"{app_logging.ROOT}.test").debug("%s", Summary([Boom()]))    # DEBUG выключен
+    summary = json.loads(str(Summary(list(range(100)), max_items=3)))
+    assert summary == [0, 1, 2, "... ещё 97 (всего 100)"]
+
+
+@pytest.mark.parametrize("status, body", [(200, {"ok": True}), (500, {"error": "x"})])
+def test_post_request_logs_no_token(jsonl, monkeypatch, status, body):
+    async def post_json(url, payload):
+        return httpx.Response(status, json=body)
+
+    monkeypatch.setattr(aio, "_post_json", post_json)
+    asyncio.run(aio.send_ungroup_request("http://vendor", TOKEN, "046000000000000001"))
+    lines = [json.loads(line) for line in jsonl.getvalue().splitlines()]
+    assert lines and all(TOKEN not in json.dumps(line) for line in lines)
+    assert any("http://vendor/api/unGroup" in line["msg"] for line in lines)
+
+
+def test_post_request_error_logs_no_token(jsonl, monkeypatch):
+    async def post_json(url, payload):
+        raise httpx.ConnectError(f"connect failed for {url}")
+
+    monkeypatch.setattr(aio, "_post_json", post_json)
+    assert asyncio.run(aio.send_accept_request("http://vendor", TOKEN, 27, "N1", "2025-10-28")) is None
+    assert TOKEN not in jsonl.getvalue()
+    assert "access-token=***" in jsonl.getvalue()
@@ -0,0 +1,142 @@
+import asyncio
+
+import httpx
+import pytest
+
+import http_client
+import requests_service_async as aio
+from batching import ChunkPlan, send_codes_in_chunks
+from mock_vendor import MockVendor
+
+
+def _run(plan: ChunkPlan, reply) -> list[list[int]]:
+    """Прогнать план с поддельной отправкой: reply(chunk, попытка) → (ok, status)"""
+    rounds = []
+    for batch in plan.rounds():
+        rounds.append(batch)
+        for i in batch:
+            ok, status = reply(plan.chunks[i], len(rounds))
+            plan.record(i, {"ok": ok, "status": status, "json": {"n": len(plan.chunks[i])} if ok else None,
+                            "text": str(status)})
+    return rounds
+
+
+# ---------- план ----------
+def test_plan_retries_only_failed_chunks():
+    def reply(chunk, attempt):
+        ok = attempt > 1 or chunk[0] != 3           # второй чанк падает один раз
+        return ok, 200 if ok else 503
+
+    plan = ChunkPlan(list(range(10)), chunk_size=3, workers=2, retries=2)
+    rounds = _run(plan, reply)
+    assert rounds == [[0, 1, 2, 3], [1]]
+    assert plan.failed == [] and plan.first_error is None
+    assert plan.summary()["attempts"] == 2
+    assert plan.summary()["results"] == [{"n": 3}, {"n": 3}, {"n": 3}, {"n": 1}]
+
+
+def test_plan_gives_up_after_retries():
+    plan = ChunkPlan(list(range(4)), chunk_size=2, retries=1)
+    rounds = _run(plan, lambda chunk, attempt: (chunk[0] == 0, 200 if chunk[0] == 0 else 502))
+    assert rounds == [[0, 1], [1]]
+    assert plan.failed == [1]
+    assert plan.first_error["status"] == 502
+    assert plan.summary()["ok_chunks"] == 1
+
+
+def test_plan_splits_on_413_without_spending_retries():
+    plan = ChunkPlan(list(range(10)), chunk_size=10, retries=0)
+    rounds = _run(plan, lambda chunk, attempt: (len(chunk) <= 3, 200 if len(chunk) <= 3 else 413))
+    assert len(rounds) == 3                                    # 10 → 5+5 → 2+3+2+3
+    assert plan.failed == []
+    assert sorted(c for chunk in plan.chunks for c in chunk) == list(range(10))
+    assert plan.summary()["codes"] == 10
+
+
+def test_plan_single_code_413_is_a_failure():
+    plan = ChunkPlan(["x"], chunk_size=5, retries=1)
+    rounds = _run(plan, lambda chunk, attempt: (False, 413))
+    assert rounds == [[0], [0]]
+    assert plan.failed == [0]
+
+
+# ---------- отправка через заглушку ----------
+@pytest.fixture()
+def vendor():
+    mock = MockVendor(latency_ms=0, jitter_ms=0, max_codes=3).start()
+    yield mock
+    mock.stop()
+
+
+def _token(mock: MockVendor) -> str:
+    return http_client.post(f"{mock.url}/api/auth", json={"login": "u", "password": "p"}).json()["token"]["id"]
+
+
+def _incom_requests(mock: MockVendor) -> int:
+    return mock.stats()["endpoints"]["/api/incom"]["requests"]
+
+
+def test_sync_sender_splits_on_413(vendor):
+    url = f"{vendor.url}/api/incom?access-token={_token(vendor)}"
+    result = send_codes_in_chunks(url, {"codes": [f"{i:018d}" for i in range(20)]}, chunk_size=8, retries=0)
+    assert result["ok"], result["text"]
+    assert sum(r["codes"] for r in result["json"]["results"]) == 20
+
+
+def test_sync_sender_reports_first_error(vendor):
+    url = f"{vendor.url}/api/incom?access-token=bad"
+    result = send_codes_in_chunks(url, {"codes": list("abcd")}, chunk_size=2, retries=1)
+    assert not result["ok"]
+    assert result["status"] == 401
+    assert result["json"]["attempts"] == 2
+    assert _incom_requests(vendor) == 4
+
+
+def test_async_sender_splits_on_413(vendor):
+    codes = [f"{i:018d}" for i in range(20)]
+    summary = asyncio.run(aio.send_incom_request(vendor.url, _token(vendor), "doc", 27, codes, chunk_size=8))
+    assert summary is not None
+    assert sum(r["codes"] for r in summary["results"]) == 20
+
+
+def test_async_sender_does_not_resend_2xx_without_json(monkeypatch):
+    sent = []
+
+    async def post_json(url, payload):
+        sent.append(payload["codes"])
+        return httpx.Response(200, text="OK")
+
+    monkeypatch.setattr(aio, "_post_json", post_json)
+    summary = asyncio.run(aio._post_codes("http://vendor/api/outcom", {"codes": list("abcde")}, chunk_size=2))
+    assert sent == [["a", "b"], ["c", "d"], ["e"]]                # ни один чанк не ушёл дважды
+    assert summary["failed_chunks"] == [] and summary["results"] == [None, None, None]
+
+
+# ---------- повторы httpx — по политике http_client ----------
+def _retry_client(statuses: list[int], calls: list[str]) -> httpx.AsyncClient:
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1])
+
+    transport = aio._RetryTransport()
+    transport.inner = httpx.MockTransport(handler)
+    return httpx.AsyncClient(transport=transport)
+
+
+def test_retry_transport_follows_http_client_policy(monkeypatch):
+    monkeypatch.setattr(http_client, "backoff", lambda policy, failures: 0)
+
+    async def go(method):
+        calls = []
+        async with _retry_client([503, 503, 200], calls) as client:
+            response = await client.request(method, "http://vendor/x")
+        return response.status_code, calls
+
+    assert asyncio.run(go("GET")) == (200, ["GET", "GET", "GET"])
+    assert asyncio.run(go("POST")) == (503, ["POST"])           # POST по статусу не повторяем
+
+
+def test_backoff_matches_urllib3():
+    policy = http_client.retry_policy()
+    factor = policy.backoff_factor
+    assert [http_client.backoff(policy, n) for n in (1, 2, 3)] == [0, factor * 2, factor * 4]
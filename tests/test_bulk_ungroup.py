@@ -0,0 +1,118 @@
+import asyncio
+import io
+
+import pytest
+
+import bulk_ungroup
+import http_client
+from code_check import CodeError, check_digit
+from mock_vendor import MockVendor
+
+
+def _sscc(i: int) -> str:
+    body = f"{46 * 10 ** 15 + i:017d}"
+    return body + str(check_digit(body))
+
+
+CODES = [_sscc(i) for i in range(12)]
+
+
+@pytest.fixture()
+def vendor():
+    mock = MockVendor(latency_ms=0, jitter_ms=0, seed=7).start()
+    yield mock
+    mock.stop()
+
+
+def _auth(mock: MockVendor) -> str:
+    return http_client.post(f"{mock.url}/api/auth", json={"login": "u", "password": "p"}).json()["token"]["id"]
+
+
+def _revoke(mock: MockVendor):
+    with mock._lock:
+        mock._tokens.clear()
+
+
+def _ungroup_requests(mock: MockVendor) -> int:
+    return mock.stats()["endpoints"]["/api/unGroup"]["requests"]
+
+
+def _run(mock: MockVendor, token: str, codes=CODES, concurrency: int = 1, checkpoint=None, reauth=None) -> dict:
+    return asyncio.run(bulk_ungroup.run_ungroup(mock.url, token, codes, concurrency, rate=0,
+                                                checkpoint=checkpoint, reauth=reauth))
+
+
+def _reauth(mock: MockVendor):
+    async def reauth():
+        return _auth(mock)
+    return reauth
+
+
+# ---------- протухший токен ----------
+def test_expired_token_reauthorizes_and_retries_the_code(vendor):
+    token = _auth(vendor)
+    _revoke(vendor)
+    progress = _run(vendor, token, reauth=_reauth(vendor))
+    assert (progress["done"], progress["failed"], progress["reauths"]) == (len(CODES), 0, 1)
+    assert _ungroup_requests(vendor) == len(CODES) + 1          # повторён только код, получивший 401
+
+
+def test_concurrent_401s_share_one_reauth(vendor):
+    token = _auth(vendor)
+    _revoke(vendor)
+    progress = _run(vendor, token, concurrency=6, reauth=_reauth(vendor))
+    assert progress["done"] == len(CODES)
+    assert progress["reauths"] == 1
+
+
+def test_without_reauth_401_is_a_code_error(vendor):
+    token = _auth(vendor)
+    _revoke(vendor)
+    progress = _run(vendor, token)
+    assert progress["failed"] == len(CODES)
+    assert progress["errors"][0]["error"] == "HTTP 401"
+
+
+def test_failed_reauth_fails_the_code_not_the_run(vendor):
+    async def reauth():
+        raise ValueError("Не удалось авторизоваться")
+
+    progress = _run(vendor, "dead", reauth=reauth)
+    assert progress["finished"] and progress["failed"] == len(CODES)
+    assert "авторизоваться" in progress["errors"][0]["error"]
+
+
+# ---------- checkpoint ----------
+def test_checkpoint_resume_sends_only_the_rest(vendor, tmp_path):
+    checkpoint = str(tmp_path / "run.done")
+    token = _auth(vendor)
+    vendor.settings["error_rate"] = 0.5
+    first = _run(vendor, token, checkpoint=checkpoint)
+    assert 0 < first["failed"] < len(CODES)
+    assert bulk_ungroup.read_checkpoint(checkpoint) == set(CODES) - {e["code"] for e in first["errors"]}
+
+    vendor.settings["error_rate"] = 0.0
+    before = _ungroup_requests(vendor)
+    second = _run(vendor, token, checkpoint=checkpoint)
+    assert second["skipped"] == first["done"]
+    assert second["done"] == first["failed"] and second["failed"] == 0
+    assert _ungroup_requests(vendor) - before == first["failed"]
+    assert bulk_ungroup.read_checkpoint(checkpoint) == set(CODES)
+
+
+def test_checkpoint_path_depends_on_codes_only(tmp_path):
+    folder = str(tmp_path)
+    assert bulk_ungroup.checkpoint_path_for(CODES, folder) == bulk_ungroup.checkpoint_path_for(list(CODES), folder)
+    assert bulk_ungroup.checkpoint_path_for(CODES, folder) != bulk_ungroup.checkpoint_path_for(CODES[1:], folder)
+    assert bulk_ungroup.read_checkpoint(None) == set()
+    assert bulk_ungroup.read_checkpoint(str(tmp_path / "missing.done")) == set()
+
+
+# ---------- загрузка кодов ----------
+def test_load_group_codes_text_and_xml():
+    text = "﻿" + "\r\n".join(CODES[:3] + [CODES[0], ""])
+    assert bulk_ungroup.load_group_codes(io.BytesIO(text.encode("utf-8")), "codes.txt") == CODES[:3]
+    xml = "<r>" + "".join(f"<sscc>{c}</sscc>" for c in CODES[:3]) + "</r>"
+    assert bulk_ungroup.load_group_codes(io.BytesIO(xml.encode("utf-8")), "move.bin") == CODES[:3]
+    with pytest.raises(CodeError):
+        bulk_ungroup.load_group_codes(io.BytesIO(b"123\n"), "codes.txt")
@@ -0,0 +1,152 @@
+import random
+
+import pytest
+
+from code_check import (
+    GS, CodeError, check_digit, normalize_codes, normalize_line, parse_ki, require_valid, sscc_error,
+)
+
+
+def _reference_check_digit(digits: str) -> int:
+    """GS1 mod-10 «по учебнику»: веса 3/1 справа налево"""
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return (10 - total % 10) % 10
+
+
+def _gtin(body13: str = "0460000000000") -> str:
+    return body13 + str(check_digit(body13))
+
+
+def _sscc(body17: str = "46000000000000001") -> str:
+    return body17 + str(check_digit(body17))
+
+
+GTIN = _gtin()
+KI = f"01{GTIN}21abcDEF1{GS}93ab/Z"
+
+
+# ---------- контрольная цифра ----------
+def test_check_digit_known_values():
+    assert check_digit("400638133393") == 1           # GTIN-13 4006381333931
+    assert check_digit("10614141123456789") == 7      # SSCC 106141411234567897 (пример GS1)
+    assert check_digit("0") == 0
+
+
+@pytest.mark.parametrize("length", [1, 2, 7, 12, 13, 17, 30])
+def test_check_digit_matches_reference(length):
+    rnd = random.Random(length)
+    for _ in range(200):
+        digits = "".join(rnd.choice("0123456789") for _ in range(length))
+        assert check_digit(digits) == _reference_check_digit(digits)
+
+
+@pytest.mark.parametrize("code, error", [
+    (_sscc(), None),
+    (_sscc("00000000000000000"), None),
+    (_sscc()[:-1], "18 цифр"),
+    (_sscc() + "0", "18 цифр"),
+    (_sscc()[:-1] + "x", "18 цифр"),
+    (_sscc()[:-1] + str((int(_sscc()[-1]) + 1) % 10), "контрольная цифра"),
+])
+def test_sscc_error(code, error):
+    result = sscc_error(code)
+    if error is None:
+        assert result is None
+    else:
+        assert error in result
+
+
+# ---------- разбор GS1 ----------
+def test_parse_ki_typical():
+    assert parse_ki(KI) == {"01": GTIN, "21": "abcDEF1", "93": "ab/Z"}
+
+
+def test_parse_ki_without_tail_and_with_91_92():
+    assert parse_ki(f"01{GTIN}21x") == {"01": GTIN, "21": "x"}
+    assert parse_ki(f"01{GTIN}21x{GS}91EE10{GS}92key") == {"01": GTIN, "21": "x", "91": "EE10", "92": "key"}
+
+
+def test_parse_ki_general_path_fixed_and_variable_ai():
+    # 17 (срок годности, 6 цифр) и 10 (партия) — мимо типовой регулярки, циклом по AI
+    parsed = parse_ki(f"01{GTIN}17251231{GS}10LOT7{GS}21ser")
+    assert parsed == {"01": GTIN, "17": "251231", "10": "LOT7", "21": "ser"}
+
+
+def test_parse_ki_serial_at_max_length():
+    assert parse_ki(f"01{GTIN}21{'s' * 20}")["21"] == "s" * 20
+    with pytest.raises(ValueError, match="AI 21"):
+        parse_ki(f"01{GTIN}21{'s' * 21}")
+
+
+@pytest.mark.parametrize("code, message", [
+    (f"01{GTIN[:-1]}{(int(GTIN[-1]) + 1) % 10}21x", "контрольная цифра GTIN"),
+    (f"01{GTIN}", "нет серийного номера"),
+    ("21abc", "нет GTIN"),
+    (f"01{GTIN}21x{GS}{GS}21y", "дважды"),
+    (f"01{GTIN}21x{GS}ZZ9", "неизвестный AI"),
+    (f"01{GTIN[:10]}", "нужно 14 символов"),
+    (f"01{GTIN}21", "AI 21: длина 0"),
+])
+def test_parse_ki_errors(code, message):
+    with pytest.raises(ValueError, match=message):
+        parse_ki(code)
+
+
+# ---------- нормализация строки ----------
+@pytest.mark.parametrize("line", [
+    KI,
+    f"  {KI}  ",
+    KI.replace(GS, "<GS>"),
+    KI.replace(GS, "<gs>"),
+    "]d2" + KI,
+    f"(01){GTIN}(21)abcDEF1(93)ab/Z",
+    KI + GS,
+])
+def test_normalize_line_ki_forms(line):
+    assert normalize_line(line, "ki") == KI
+
+
+def test_normalize_line_sscc():
+    code = _sscc()
+    assert normalize_line(f" 00{code} ", "sscc") == code
+    assert normalize_line(code[:9] + " " + code[9:], "sscc") == code
+    assert normalize_line("   ", "sscc") == ""
+
+
+# ---------- список целиком ----------
+def test_normalize_codes_keeps_raw_gs_inside_ki():
+    second = KI.replace("abcDEF1", "abcDEF2")
+    checked = normalize_codes(f"{KI}\r\n{second}\n")
+    assert checked.ok, checked.describe()
+    assert checked.codes == [KI, second]
+    assert checked.ki() == [KI.split(GS)[0], second.split(GS)[0]]
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"])
+def test_normalize_codes_line_numbers_and_duplicates(newline):
+    a, b = _sscc("46000000000000001"), _sscc("46000000000000002")
+    text = newline.join([a, "", "00" + a, b, "bad"])
+    checked = normalize_codes(text, "sscc")
+    assert checked.codes == [a, b]
+    assert checked.lines == [1, 4]
+    assert [(d.line, d.code) for d in checked.duplicates] == [(3, a)]
+    assert [(e.line, e.code) for e in checked.errors] == [(5, "bad")]
+
+
+def test_normalize_codes_without_dedupe_keeps_repeats():
+    code = _sscc()
+    checked = normalize_codes([code, code], "sscc", dedupe=False)
+    assert checked.codes == [code, code]
+    assert len(checked.duplicates) == 1
+
+
+def test_normalize_codes_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        normalize_codes("x", "gtin")
+
+
+def test_require_valid_raises_with_full_list():
+    with pytest.raises(CodeError) as exc:
+        require_valid(f"{_sscc()}\n123", "sscc")
+    assert exc.value.checked.codes == [_sscc()]
+    assert exc.value.checked.errors[0].line == 2
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from code_diff import DiffResult, diff_codes, diff_files, iter_diff, pack, sorted_unique, unpack
+
+
+def _codes(n: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    return [f"{rnd.randrange(10 ** 18):018d}" for _ in range(n)]
+
+
+# ---------- упаковка ----------
+@pytest.mark.parametrize("code", ["000000000000000000", "000000000000000001", "999999999999999999"])
+def test_pack_roundtrip_keeps_leading_zeros(code):
+    assert unpack(pack(code)) == code
+
+
+@pytest.mark.parametrize("code", ["12345678901234567", "1234567890123456789", "12345678901234567x", "١٢٣٤٥٦٧٨٩٠١٢٣٤٥٦٧٨"])
+def test_pack_rejects_non_sscc(code):
+    assert pack(code) is None
+
+
+# ---------- сортировка одного источника ----------
+MIXED = _codes(50, 1) + ["abc", " zz ", "", "  ", "0104600000000008215x"] + _codes(50, 1)[:10] + ["abc"]
+
+
+@pytest.mark.parametrize("run_size", [1, 2, 3, 7, 1000])
+def test_sorted_unique_in_memory_and_external_agree(run_size, tmp_path):
+    expected = sorted({c.strip() for c in MIXED if c.strip()})
+    assert list(sorted_unique(MIXED, run_size=run_size, tmpdir=str(tmp_path))) == expected
+    assert list(tmp_path.iterdir()) == []                # куски внешней сортировки удалены
+
+
+def test_sorted_unique_removes_runs_when_abandoned(tmp_path):
+    stream = sorted_unique(_codes(100, 2), run_size=10, tmpdir=str(tmp_path))
+    next(stream)
+    assert list(tmp_path.iterdir())
+    stream.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sorted_unique_empty():
+    assert list(sorted_unique([])) == []
+    assert list(sorted_unique(["", " "], run_size=1)) == []
+
+
+# ---------- слияние ----------
+def test_iter_diff_masks():
+    streams = [iter(["a", "b", "d"]), iter(["b", "c", "d"]), iter(["d"])]
+    assert list(iter_diff(streams)) == [("a", 0b001), ("b", 0b011), ("c", 0b010), ("d", 0b111)]
+
+
+def test_iter_diff_empty_sources():
+    assert list(iter_diff([iter([]), iter([])])) == []
+    assert list(iter_diff([iter(["x"]), iter([])])) == [("x", 0b01)]
+
+
+@pytest.mark.parametrize("run_size", [3, 10 ** 6])
+def test_diff_codes_counts_and_sink(run_size):
+    common = _codes(40, 3)
+    only_a, only_b, ab = _codes(5, 4), _codes(7, 5), _codes(3, 6)
+    named = {"a": common + only_a + ab + common[:5], "b": ab + only_b + common, "c": list(reversed(common))}
+    rows = []
+    result = diff_codes(named, rows.extend, run_size=run_size)
+
+    assert not result.equal
+    assert result.totals == [48, 50, 40]
+    assert result.common == 40
+    assert result.patterns == {0b001: 5, 0b010: 7, 0b011: 3}
+    assert result.different == 15
+    assert sorted(code for mask, code in rows if mask == 0b001) == sorted(only_a)
+    assert [code for _, code in rows] == sorted(code for _, code in rows)
+
+
+def test_diff_codes_equal_lists_in_any_order():
+    codes = _codes(30, 7)
+    result = diff_codes([("601", codes), ("701", list(reversed(codes)) + codes[:3])])
+    assert result.equal
+    assert result.to_dict()["patterns"] == []
+    assert result.common == 30
+
+
+def test_diff_result_sample_and_labels():
+    result = DiffResult(["601", "701", "склад"], sample=2)
+    rows = list(result.collect(iter([("1", 0b001), ("2", 0b001), ("3", 0b001), ("4", 0b110)])))
+    assert rows == [(0b001, "1"), (0b001, "2"), (0b001, "3"), (0b110, "4")]
+    summary = result.to_dict()
+    assert [p["mask"] for p in summary["patterns"]] == [0b001, 0b110]        # сначала самые частые
+    assert summary["patterns"][0]["sample"] == ["1", "2"]
+    assert result.label(0b001) == "Только в 601"
+    assert result.label(0b110) == "Есть в 701, склад; нет в 601"
+
+
+def test_diff_files_xml_and_text(tmp_path):
+    a, b = _codes(3, 8), _codes(2, 9)
+    xml = tmp_path / "601.xml"
+    xml.write_text("junk\n<?xml version='1.0'?><d>" + "".join(f"<sscc>{c}</sscc>" for c in a + b) + "</d>",
+                   encoding="utf-8")
+    txt = tmp_path / "склад.txt"
+    txt.write_text("﻿" + "\r\n".join(a) + "\r\n\r\n", encoding="utf-8")
+    result = diff_files([str(xml), str(txt)], run_size=2)
+    assert result.names == ["601.xml", "склад.txt"]
+    assert result.totals == [5, 3]
+    assert result.patterns == {0b01: 2}
+    assert sorted(result.samples[0b01]) == sorted(b)
@@ -0,0 +1,54 @@
+import json
+import os
+
+import pytest
+
+import config
+from config import Account, Config
+
+
+def _write(folder, name: str, data: dict):
+    with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+@pytest.fixture()
+def folder(tmp_path, monkeypatch):
+    monkeypatch.delenv("VENDOR_BASE_URL", raising=False)
+    _write(tmp_path, "links.json", {"sotex": {"dev": "https://sotex.example", "test": "https://t.example"}})
+    _write(tmp_path, "accounts.json", {"SOTEX": {"27": {"login": "u27", "password": "p", "desc": "МД 27"}}})
+    _write(tmp_path, "objects.json", {"OBJECT_TO_MD": {"601": "27"}})
+    return str(tmp_path)
+
+
+def test_indexes_accounts_by_md_and_object(folder):
+    cfg = Config(folder)
+    account = Account("SOTEX", "27", "u27", "p", "МД 27")
+    assert cfg.account("sotex", 27) == account
+    assert cfg.account(" SOTEX ", "601") is cfg.account("SOTEX", "27")   # объект → учётка его МД
+    assert cfg.account("SOTEX", "45") is None
+    assert cfg.md_of(" 601 ") == "27" and cfg.md_of("45") == "45"
+    assert cfg.base_urls == {"SOTEX": "https://sotex.example"}
+    assert cfg.links["SOTEX"].test == "https://t.example"
+    assert cfg.sotex.dev == "https://sotex.example"                # старый доступ через атрибуты
+    with pytest.raises(AttributeError):
+        cfg.missing
+
+
+def test_vendor_base_url_override(folder, monkeypatch):
+    monkeypatch.setenv("VENDOR_BASE_URL", "http://127.0.0.1:9000/")
+    assert Config(folder).base_urls == {"SOTEX": "http://127.0.0.1:9000"}
+
+
+def test_get_config_reloads_changed_folder(folder, monkeypatch):
+    monkeypatch.setattr(config, "_config", Config(folder))
+    monkeypatch.setattr(config, "RELOAD_CHECK_INTERVAL", 0)
+    first = config.get_config()
+    assert config.get_config() is first                            # ничего не менялось — тот же объект
+
+    _write(folder, "accounts.json", {"SOTEX": {"27": {"login": "new", "password": "p2"}}})
+    os.utime(os.path.join(folder, "accounts.json"), ns=(0, 1))      # mtime точно другой
+    second = config.get_config()
+    assert second is not first
+    assert second.account("SOTEX", "601").login == "new"
+    assert first.account("SOTEX", "601").login == "u27"            # старый объект не тронут
@@ -0,0 +1,70 @@
+import datetime
+
+import pytest
+
+import dates
+from dates import DateReport, check_dates, is_suspicious, normalize_date
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("2025-10-28", "2025-10-28"),
+    ("2025-10-28T10:00:00.000Z", "2025-10-28"),
+    ("2025-10-28 10:00:00+03:00", "2025-10-28"),
+    (" 2024-02-29 ", "2024-02-29"),
+    ("28.10.2025", "2025-10-28"),
+    ("28.10.2025 10:00", "2025-10-28"),
+    ("1.2.2025", "2025-02-01"),
+    ("28.10.25", "2025-10-28"),
+    ("01.02.00", "2000-02-01"),
+    ("5.1.25 10:00", "2025-01-05"),
+    ("от 2025-10-28 г.", "2025-10-28"),          # запасной путь: ISO где угодно в строке
+])
+def test_normalize_date_forms(raw, expected):
+    assert normalize_date(raw, "test") == expected
+
+
+@pytest.mark.parametrize("raw", [
+    None, "", "   ", 20251028, "2025-13-01", "2025-02-30", "2023-02-29", "1900-02-29",
+    "31.04.2025", "29.02.23", "28-10-2025", "28.10.202", "2025/10/28", "завтра",
+])
+def test_normalize_date_rejects(raw):
+    assert normalize_date(raw, "test") is None
+
+
+def test_preferred_shape_is_remembered_per_source():
+    normalize_date("28.10.25", "short_source")
+    normalize_date("28.10.2025", "long_source")
+    shapes = dates.preferred_shapes()
+    assert shapes["short_source"] == "dmy_yy"
+    assert shapes["long_source"] == "dmy"
+    # запомненная форма не мешает другим: ISO по-прежнему разбирается
+    assert normalize_date("2025-10-28", "short_source") == "2025-10-28"
+
+
+def test_is_suspicious_window():
+    today = datetime.date(2025, 6, 1)
+    assert not is_suspicious("2025-06-01", today)
+    assert not is_suspicious(f"{2025 - dates.YEARS_BACK}-01-01", today)
+    assert not is_suspicious(f"{2025 + dates.YEARS_AHEAD}-12-31", today)
+    assert is_suspicious(f"{2025 - dates.YEARS_BACK - 1}-12-31", today)
+    assert is_suspicious(f"{2025 + dates.YEARS_AHEAD + 1}-01-01", today)
+
+
+def test_check_dates_report():
+    year = datetime.date.today().year
+    values = ["28.10.2025", "", None, "bad", "bad", "01.01.1901", f"{year}-01-01", "28.10.2025"]
+    out, report = check_dates(values, "doc_date")
+    assert out == ["2025-10-28", None, None, None, None, "1901-01-01", f"{year}-01-01", "2025-10-28"]
+    assert (report.ok, report.empty, report.bad_count) == (4, 2, 2)
+    assert report.bad == {"bad": 2}
+    assert report.suspicious == {"01.01.1901": 1}
+    assert "'bad' ×2" in report.describe()
+
+
+def test_report_counts_repeats_past_cache_limit(monkeypatch):
+    monkeypatch.setattr(dates, "MAX_SEEN", 1)
+    report = DateReport("x")
+    for raw in ["a", "b", "b", "2025-01-01"]:
+        report.add(raw)
+    assert report.bad == {"a": 1, "b": 2}
+    assert report.ok == 1
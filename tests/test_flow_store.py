@@ -0,0 +1,124 @@
+import time
+
+import pytest
+
+import flow_store
+from flow_store import FlowStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return FlowStore(str(tmp_path / "flows.sqlite3"))
+
+
+def _pages(fetch, limit: int) -> list[list]:
+    """Листать курсором, пока fetch(after, limit) не вернёт None"""
+    pages, after = [], 0
+    while True:
+        rows, after = fetch(after, limit)
+        pages.append(rows)
+        if after is None:
+            return pages
+
+
+# ---------- различия кодов ----------
+def test_put_diff_pages_each_mask_in_order(store, monkeypatch):
+    monkeypatch.setattr(flow_store, "DIFF_BATCH", 4)                 # несколько executemany
+    flow_id = store.create()
+    only_a = [f"{46 * 10 ** 16 + i:018d}" for i in range(7)]
+    only_b = ["000000000000000123", "0104600000000008215abc", "0104600000000008215abd"]
+    rows = sorted([(1, c) for c in only_a] + [(2, c) for c in only_b], key=lambda r: r[1])
+    assert store.put_diff(flow_id, rows) == len(rows)
+
+    pages = _pages(lambda after, limit: store.diff_page(flow_id, 1, after, limit), 3)
+    assert [len(p) for p in pages] == [3, 3, 1]
+    assert sum(pages, []) == only_a                                 # 18 цифр — обратно строкой с нулями
+    assert store.diff_page(flow_id, 2, 0, 10) == (sorted(only_b), None)
+    assert store.diff_page(flow_id, 4, 0, 10) == ([], None)
+
+
+def test_diff_page_filter_keeps_cursor(store):
+    flow_id = store.create()
+    codes = [f"{46 * 10 ** 16 + i:018d}" for i in range(30)]
+    store.put_diff(flow_id, [(1, c) for c in codes])
+    pages = _pages(lambda after, limit: store.diff_page(flow_id, 1, after, limit, q="2"), 2)
+    assert sum(pages, []) == [c for c in codes if "2" in c[-2:]]        # 2, 12, 20..29
+    assert store.diff_page(flow_id, 1, 0, 5, q="000000") == (codes[:5], 5)
+    assert store.diff_page(None, 1) == ([], None)
+
+
+def test_put_diff_replaces_previous_diff(store):
+    flow_id = store.create()
+    store.put_diff(flow_id, [(1, "a"), (1, "b")])
+    store.put_diff(flow_id, [(1, "c")])
+    assert store.diff_page(flow_id, 1) == (["c"], None)
+
+
+def test_put_diff_failure_rolls_back(store):
+    flow_id = store.create()
+    store.put_diff(flow_id, [(1, "a")])
+
+    def rows():
+        yield 1, "b"
+        raise RuntimeError("обрыв")
+
+    with pytest.raises(RuntimeError):
+        store.put_diff(flow_id, rows())
+    assert store.diff_page(flow_id, 1) == (["a"], None)
+
+
+# ---------- журнал ----------
+def _log(store: FlowStore, flow_id: str):
+    for i in range(10):
+        store.add_log(flow_id, {"step": "incom1" if i % 2 else "auth1", "status": "❌" if i % 5 == 0 else "✅",
+                                "message": f"запись {i}"})
+
+
+def test_logs_page_pages_and_filters(store):
+    flow_id, other = store.create(), store.create()
+    _log(store, flow_id)
+    _log(store, other)
+
+    pages = _pages(lambda after, limit: store.logs_page(flow_id, after, limit), 4)
+    assert [len(p) for p in pages] == [4, 4, 2]
+    entries = sum(pages, [])
+    assert [e["message"] for e in entries] == [f"запись {i}" for i in range(10)]
+    assert [e["seq"] for e in entries] == sorted({e["seq"] for e in entries})
+
+    incom = sum(_pages(lambda after, limit: store.logs_page(flow_id, after, limit, step="incom1"), 2), [])
+    assert [e["message"] for e in incom] == [f"запись {i}" for i in (1, 3, 5, 7, 9)]
+    failed = store.logs_page(flow_id, status="❌")[0]
+    assert [e["message"] for e in failed] == ["запись 0", "запись 5"]
+    assert [e["message"] for e in store.logs_page(flow_id, q="запись 7")[0]] == ["запись 7"]
+    assert store.last_log(flow_id)["message"] == "запись 9"
+    assert store.last_log(flow_id)["seq"] == entries[-1]["seq"]
+
+
+def test_empty_flow_id_gives_empty_results(store):
+    assert store.logs_page(None) == ([], None)
+    assert store.last_log(None) is None
+    assert store.get_logs("") == []
+
+
+# ---------- очистка ----------
+def test_cleanup_removes_old_flows_with_their_rows(store):
+    old, fresh = store.create(), store.create()
+    for flow_id in (old, fresh):
+        store.put_codes(flow_id, "base", ["a", "b"])
+        store.put_diff(flow_id, [(1, "a")])
+        store.add_log(flow_id, {"step": "auth1"})
+    store._conn().execute("UPDATE flows SET updated_at = ? WHERE id = ?", (time.time() - 3600, old))
+
+    assert store.cleanup(max_age=60) == 1
+    assert not store.exists(old) and store.exists(fresh)
+    assert store.get_codes(old, "base") == [] and store.diff_page(old, 1) == ([], None)
+    assert store.get_logs(old) == []
+    assert store.get_codes(fresh, "base") == ["a", "b"] and store.get_logs(fresh)
+
+
+def test_maybe_cleanup_runs_once_per_interval(store):
+    flow_id = store.create()
+    store._conn().execute("UPDATE flows SET updated_at = 0 WHERE id = ?", (flow_id,))
+    assert store.maybe_cleanup(max_age=60, interval=3600) == 1
+    store._conn().execute("UPDATE flows SET updated_at = 0 WHERE id = ?", (store.create(),))
+    assert store.maybe_cleanup(max_age=60, interval=3600) == 0      # второй раз — не чаще interval
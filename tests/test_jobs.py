@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+import jobs
+from flow_store import FlowStore
+from jobs import JobEngine
+from transfer_flow import FlowError
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return FlowStore(str(tmp_path / "flows.sqlite3"))
+
+
+class _Chains:
+    """Подмена run_chain: цепочка ждёт release(flow_id); считаем, сколько цепочек вендора шло сразу"""
+
+    def __init__(self, store: FlowStore):
+        self.store = store
+        self.gates: dict[str, threading.Event] = {}
+        self.started: list[str] = []
+        self.running: dict[str, int] = {}
+        self.peak: dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+
+    def __call__(self, store, flow_id):
+        vendor = store.get(flow_id)["flow_ctx"]["vendor"].upper()
+        with self.cond:
+            self.started.append(flow_id)
+            self.running[vendor] = self.running.get(vendor, 0) + 1
+            self.peak[vendor] = max(self.peak.get(vendor, 0), self.running[vendor])
+            self.cond.notify_all()
+        self.gates.setdefault(flow_id, threading.Event()).wait(5)
+        with self.lock:
+            self.running[vendor] -= 1
+        if store.get(flow_id)["flow_ctx"].get("fail"):
+            raise FlowError("incom1", "Шаг incom1: HTTP 500")
+        return True
+
+    def release(self, flow_id: str):
+        self.gates.setdefault(flow_id, threading.Event()).set()
+
+    def wait_started(self, n: int):
+        with self.cond:
+            assert self.cond.wait_for(lambda: len(self.started) >= n, timeout=5)
+
+
+def _flow(store: FlowStore, vendor: str, **ctx) -> str:
+    flow_id = store.create()
+    store.update(flow_id, flow_ctx={"vendor": vendor, **ctx})
+    return flow_id
+
+
+@pytest.fixture()
+def chains(store, monkeypatch):
+    fake = _Chains(store)
+    monkeypatch.setattr(jobs, "run_chain", fake)
+    return fake
+
+
+def test_vendor_limit_queues_before_the_pool(store, chains):
+    engine = JobEngine(store, workers=2, vendor_limits={"A": 1})
+    a1, a2, b1 = _flow(store, "a"), _flow(store, "A"), _flow(store, "B")
+    futures = [engine.submit(f) for f in (a1, a2, b1)]
+    chains.wait_started(2)
+    assert sorted(chains.started) == sorted([a1, b1])     # a2 ждёт слота A, а не поток пула
+    assert engine.status(a2)["status"] == "queued"
+
+    chains.release(b1)
+    assert futures[2].result(5) == "done"
+    chains.release(a1)
+    chains.wait_started(3)
+    assert chains.started[-1] == a2
+    chains.release(a2)
+    assert [f.result(5) for f in futures[:2]] == ["done", "done"]
+    assert chains.peak == {"A": 1, "B": 1}                 # "a" и "A" — один вендор
+    engine.shutdown()
+
+
+def test_star_limit_applies_to_every_vendor(store, chains):
+    engine = JobEngine(store, workers=4, vendor_limits={"*": 2})
+    flows = [_flow(store, "A") for _ in range(5)]
+    futures = [engine.submit(f) for f in flows]
+    chains.wait_started(2)
+    for flow_id in flows:
+        chains.release(flow_id)
+    assert [f.result(5) for f in futures] == ["done"] * 5
+    assert chains.peak["A"] == 2
+    engine.shutdown()
+
+
+def test_resubmit_of_active_flow_and_failure_status(store, chains):
+    engine = JobEngine(store, workers=1, vendor_limits={})
+    flow_id = _flow(store, "A", fail=True)
+    future = engine.submit(flow_id)
+    chains.wait_started(1)
+    assert engine.submit(flow_id) is None                 # уже идёт — второй раз не ставим
+    chains.release(flow_id)
+    assert future.result(5) == "failed"
+    job = engine.status(flow_id)
+    assert (job["status"], job["step"]) == ("failed", "incom1")
+    assert store.last_log(flow_id)["status"] == "🔴"
+    engine.shutdown()
+
+
+def test_status_without_live_thread_is_interrupted(store):
+    flow_id = _flow(store, "A")
+    store.update(flow_id, job={"status": "running"})
+    assert JobEngine(store, workers=1).status(flow_id)["status"] == "interrupted"
@@ -0,0 +1,54 @@
+import pytest
+
+import metrics
+from metrics import Counter, Histogram, StepTimer, endpoint_of
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram("test_seconds", "тест", ("step",), buckets=(1, 5))
+    metrics._registry.remove(hist)                               # в общий /metrics не попадает
+    for value in (0.5, 1, 3, 10):
+        hist.observe(value, step="a")
+    assert hist.count(step="a") == 4 and hist.count(step="b") == 0
+    lines = hist.render()
+    assert 'test_seconds_bucket{step="a",le="1"} 2' in lines
+    assert 'test_seconds_bucket{step="a",le="5"} 3' in lines
+    assert 'test_seconds_bucket{step="a",le="+Inf"} 4' in lines
+    assert 'test_seconds_sum{step="a"} 14.5' in lines
+
+
+def test_counter_escapes_labels():
+    counter = Counter("test_total", "тест", ("vendor",))
+    metrics._registry.remove(counter)
+    counter.inc(vendor='a"b')
+    counter.inc(2, vendor='a"b')
+    assert counter.get(vendor='a"b') == 3
+    assert counter.render()[-1] == 'test_total{vendor="a\\"b"} 3'
+
+
+def test_step_timer_records_status_sizes_and_codes():
+    url = "http://vendor/api/incom?access-token=secret"
+    labels = {"vendor": "METRICS-TEST", "step": "incom1", "endpoint": "/api/incom"}
+    with StepTimer("METRICS-TEST", "incom1", url) as timer:
+        timer.done(200, request_bytes=100, response_bytes=20, codes=5)
+    assert timer.ms is not None
+    assert metrics.STEP_REQUESTS.get(status=200, **labels) == 1
+    assert metrics.STEP_CODES.get(**labels) == 5
+    assert metrics.STEP_REQUEST_BYTES.count(**labels) == 1
+    assert "secret" not in metrics.render()
+
+
+def test_step_timer_without_done_is_an_error():
+    labels = {"vendor": "METRICS-ERR", "step": "outcom", "endpoint": "/api/outcom"}
+    with pytest.raises(ConnectionError):
+        with StepTimer("METRICS-ERR", "outcom", "http://vendor/api/outcom"):
+            raise ConnectionError("нет сети")
+    assert metrics.STEP_REQUESTS.get(status="error", **labels) == 1
+    assert metrics.STEP_DURATION.count(**labels) == 1
+    metrics.cached_step("METRICS-ERR", "auth1", "http://vendor/api/auth")
+    assert metrics.STEP_REQUESTS.get(status="cached", vendor="METRICS-ERR", step="auth1", endpoint="/api/auth") == 1
+
+
+def test_endpoint_of():
+    assert endpoint_of("https://h/api/x?access-token=1") == "/api/x"
+    assert endpoint_of("https://h") == "/"
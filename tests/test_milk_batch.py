@@ -0,0 +1,72 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import time
+import zipfile
+
+import pytest
+
+import milk_batch
+from code_check import GS, check_digit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GTIN = "0460000000000" + str(check_digit("0460000000000"))
+
+
+def _write_jobs(folder, n: int) -> list[dict]:
+    for i in range(n):
+        doc = {"producer_inn": "7700000000", "production_date": "03.02.2025",
+               "products_list": [{"uit": "", "tnved_code": "0401201100", "production_date": "01.02.2025"}]}
+        with open(os.path.join(folder, f"p{i:02d}.json"), "w", encoding="utf-8") as f:
+            json.dump(doc, f)
+        with open(os.path.join(folder, f"p{i:02d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(f"01{GTIN}21k{i}x{j}{GS}93ab/Z" for j in range(3)))
+    return milk_batch.find_jobs(str(folder))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stream_zip_has_every_xml_and_report(tmp_path, workers):
+    jobs = _write_jobs(tmp_path, 3)
+    data = b"".join(milk_batch.stream_zip(jobs, str(tmp_path), workers=workers))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert sorted(zf.namelist()) == ["p00.xml", "p01.xml", "p02.xml", "report.json"]
+        report = json.loads(zf.read("report.json"))
+    assert (report["ok"], report["failed"]) == (3, 0)
+    assert all(row["codes"] == 3 for row in report["files"])
+    assert not tmp_path.exists()                          # cleanup=True
+
+
+def test_closed_stream_cancels_the_rest(tmp_path):
+    jobs = _write_jobs(tmp_path, 40)
+    out_dir = str(tmp_path / "_xml")
+    rows = milk_batch.convert_all(jobs, out_dir, workers=2)
+    first = next(rows)
+    started = time.perf_counter()
+    rows.close()
+    assert time.perf_counter() - started < 5
+    assert first["error"] is None
+    assert len(os.listdir(out_dir)) < len(jobs)
+
+
+def test_workers_do_not_run_main_module(tmp_path):
+    _write_jobs(tmp_path, 4)
+    marker = tmp_path / "main.log"
+    script = tmp_path / "main.py"
+    script.write_text(textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {ROOT!r})
+        import milk_batch
+
+        with open({str(marker)!r}, "a") as f:              # побочный эффект, как у app.py
+            f.write("x")
+
+        if __name__ == "__main__":
+            jobs = milk_batch.find_jobs({str(tmp_path)!r})
+            rows = list(milk_batch.convert_all(jobs, {str(tmp_path / "_xml")!r}, workers=2))
+            assert all(row["error"] is None for row in rows), rows
+    """))
+    subprocess.run([sys.executable, str(script)], check=True, cwd=str(tmp_path), timeout=60)
+    assert marker.read_text() == "x"
@@ -0,0 +1,84 @@
+import io
+import json
+import os
+import time
+
+import pytest
+
+from milk_cache import MilkUploads, ParseCache, preview
+
+
+def _doc(n: int, inn: str = "7700000000") -> bytes:
+    products = [{"uit": "", "tnved_code": "0401201100", "production_date": "01.02.2025"} for _ in range(n)]
+    return json.dumps({"producer_inn": inn, "products_list": products}).encode("utf-8")
+
+
+@pytest.fixture()
+def uploads(tmp_path):
+    return MilkUploads(folder=str(tmp_path), max_entries=2, max_age=3600)
+
+
+# ---------- LRU ----------
+def test_parse_cache_evicts_least_recently_used():
+    cache = ParseCache(max_entries=2, max_bytes=100)
+    cache.put("a", {"n": 1}, 10)
+    cache.put("b", {"n": 2}, 10)
+    assert cache.get("a") == {"n": 1}                   # a свежее b
+    cache.put("c", {"n": 3}, 10)
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+    assert cache.stats() == {"entries": 2, "bytes": 20, "hits": 3, "misses": 1}
+
+
+def test_parse_cache_respects_byte_limit():
+    cache = ParseCache(max_entries=10, max_bytes=25)
+    cache.put("a", {}, 10)
+    cache.put("b", {}, 10)
+    cache.put("c", {}, 10)                               # 30 > 25 — вытесняется a
+    assert cache.get("a") is None and cache.stats()["bytes"] == 20
+    cache.put("huge", {}, 26)                            # больше всего кэша — не кладём
+    assert cache.get("huge") is None and cache.stats()["entries"] == 2
+    cache.put("b", {}, 5)                                # замена пересчитывает размер
+    assert cache.stats()["bytes"] == 15
+
+
+# ---------- загрузки ----------
+def test_same_upload_is_one_file_and_one_parse(uploads, tmp_path):
+    first, parsed = uploads.save(io.BytesIO(_doc(3)))
+    second, again = uploads.save(io.BytesIO(_doc(3)))
+    assert first == second and again is parsed
+    assert parsed["products_count"] == 3
+    assert os.listdir(tmp_path) == [first + ".json"]
+    assert uploads.cache.stats()["hits"] == 1
+
+
+def test_load_after_eviction_reads_the_file(uploads):
+    digests = [uploads.save(io.BytesIO(_doc(1, inn=str(i))))[0] for i in range(3)]
+    assert uploads.cache.get(digests[0]) is None         # max_entries=2
+    assert uploads.load(digests[0])["producer_inn"] == "0"
+    assert uploads.load(None) is None
+    with pytest.raises(ValueError):
+        uploads.load("../etc/passwd")
+
+
+def test_cleanup_removes_old_files_and_cache_entries(uploads, tmp_path):
+    old, _ = uploads.save(io.BytesIO(_doc(1, inn="1")))
+    fresh, _ = uploads.save(io.BytesIO(_doc(1, inn="2")))
+    stale = time.time() - 7200
+    os.utime(uploads.path_of(old), (stale, stale))
+    (tmp_path / "upload.1.2.tmp").write_bytes(b"{")
+    os.utime(tmp_path / "upload.1.2.tmp", (stale, stale))
+
+    uploads.cleanup()                                    # не прошло CLEANUP_INTERVAL — ничего
+    assert os.path.exists(uploads.path_of(old))
+    uploads.cleanup(force=True)
+    assert sorted(os.listdir(tmp_path)) == [fresh + ".json"]
+    assert uploads.load(old) is None
+    assert uploads.stats()["files"] == 1
+
+
+def test_preview_keeps_counts_and_first_products():
+    parsed = {"producer_inn": "1", "products": list(range(50))}
+    shown = preview(parsed, products=3)
+    assert shown["products"] == [0, 1, 2] and shown["products_count"] == 50
+    assert parsed["products"] == list(range(50)) and preview(None) is None
@@ -0,0 +1,152 @@
+import io
+import json
+
+import pytest
+
+import milk_xml
+from milk_xml import parse_json, parse_json_stream
+
+
+class _Chunky:
+    """Текстовый поток, который отдаёт не больше k символов за read — края буфера в любом месте"""
+
+    def __init__(self, text: str, k: int):
+        self.fp, self.k = io.StringIO(text), k
+
+    def read(self, size: int = -1) -> str:
+        return self.fp.read(self.k if size < 0 else min(size, self.k))
+
+
+def _doc(n: int = 5, key: str = "products_list", **header) -> dict:
+    products = [
+        {
+            "uit": f"0104600000000008215x{i:04d}" if i % 3 else "",
+            "tnved_code": "0401201100" if i % 2 else "0402",
+            "production_date": "01.02.2025" if i % 2 else "2025-02-03T00:00:00",
+            "certificate_document_data": [{"certificate_number": f"RU-{i % 2}", "certificate_date": "5.1.2025"}],
+            "vsd_number": 12345678901234567890 + i,
+            "extra": {"nested": [1, 2.5, None, True, "строка с \"кавычками\" и \\"]},
+        }
+        for i in range(n)
+    ]
+    return {"producer_inn": "7700000000", "production_date": "03.02.2025", **header, key: products}
+
+
+def _stream(text: str, k: int = 1 << 20, keep=milk_xml.KEEP_PRODUCTS, on_product=None) -> dict:
+    return parse_json_stream(_Chunky(text, k), keep=keep, on_product=on_product)
+
+
+# ---------- поток == целиком ----------
+@pytest.mark.parametrize("k", [1, 2, 7, 64])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_stream_matches_parse_json_at_any_chunk_size(k, indent, monkeypatch):
+    monkeypatch.setattr(milk_xml, "READ_CHUNK", 16)      # буфер подрезается по ходу чтения
+    text = json.dumps(_doc(12), ensure_ascii=False, indent=indent)
+    expected = parse_json(text)
+    assert expected["products_count"] == 12
+    assert _stream(text, k, keep=None) == expected
+
+
+def test_number_split_at_buffer_edge():
+    # "123" придёт как "1", "2", "3": raw_decode на "1" уже успешен, но значение ещё не кончилось
+    text = '{"owner_inn": 1234567890, "products": [{"vsd_number": 98765}], "x": 12}'
+    result = _stream(text, k=1, keep=None)
+    assert result["owner_inn"] == 1234567890
+    assert result["products"][0]["vsd_number"] == 98765
+
+
+def test_number_is_last_value_of_stream():
+    reader = milk_xml._Reader(_Chunky("  4711", 2))
+    assert reader.value() == 4711
+
+
+# ---------- продукты ----------
+def test_keep_limits_products_but_not_counts():
+    text = json.dumps(_doc(30))
+    result = _stream(text, k=5, keep=2)
+    full = parse_json(text)
+    assert len(result["products"]) == 2
+    assert result["products"] == full["products"][:2]
+    for field in ("products_count", "products_with_uit", "combos"):
+        assert result[field] == full[field]
+
+
+def test_empty_products_list_falls_back_to_products():
+    doc = _doc(3, key="products")
+    doc["products_list"] = []
+    text = json.dumps(doc)
+    result = _stream(text, k=3)
+    assert result["products_count"] == 3
+    assert result == parse_json(text)
+
+
+def test_products_list_wins_over_products():
+    doc = _doc(2)
+    doc["products"] = _doc(5, key="products")["products"]
+    result = _stream(json.dumps(doc))
+    assert result["products_count"] == 2
+
+
+def test_on_product_receives_source_key():
+    seen = []
+    doc = _doc(3, key="products")
+    doc["products_list"] = []
+    _stream(json.dumps(doc), k=4, keep=0, on_product=lambda key, p: seen.append((key, p["tnved_code"])))
+    assert seen == [("products", "0402"), ("products", "0401201100"), ("products", "0402")]
+
+
+def test_products_not_a_list_is_header_value():
+    result = _stream('{"products": null, "producer_inn": "1"}')
+    assert result["products_count"] == 0
+    assert result["producer_inn"] == "1"
+
+
+# ---------- края ----------
+@pytest.mark.parametrize("text", ["{}", " { } ", "{\n}\n"])
+def test_empty_object(text):
+    result = _stream(text, k=1)
+    assert result == parse_json("{}")
+    assert result["products"] == []
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "[]",
+    '{"a": 1',
+    '{"a": 1,',
+    '{"products": [{"uit": "x"},',
+    '{"products": [{"uit": "x"}',
+    '{"a" 1}',
+    '{"a": 1]',
+    '{"a": tru',
+])
+def test_invalid_or_truncated_json_gives_empty(text):
+    assert _stream(text, k=2) == {}
+
+
+def test_bytes_stream_gives_empty():
+    assert parse_json_stream(io.BytesIO(b'{"products": []}')) == {}
+
+
+# ---------- даты ----------
+def test_dates_are_checked_but_kept_as_is():
+    doc = _doc(4)
+    doc["products_list"][1]["production_date"] = "вчера"
+    doc["products_list"][2]["certificate_document_data"][0]["certificate_date"] = "01.01.1901"
+    text = json.dumps(doc, ensure_ascii=False)
+    for result in (parse_json(text), _stream(text, k=3)):
+        assert result["production_date"] == "03.02.2025"
+        assert [p["production_date"] for p in result["products"]] == [
+            "2025-02-03T00:00:00", "вчера", "2025-02-03T00:00:00", "01.02.2025"]
+        assert result["bad_dates"] == [{"field": "production_date", "value": "вчера", "count": 1}]
+        assert result["suspicious_dates"] == [{"field": "certificate_date", "value": "01.01.1901", "count": 1}]
+
+
+def test_generate_xml_emits_dates_from_json():
+    doc = _doc(1)
+    doc["products_list"][0]["production_date"] = "01.02.2025"
+    parsed = parse_json(json.dumps(doc))
+    xml = milk_xml.generate_xml(parsed, ["0104600000000008215abc"]).getvalue().decode("utf-8")
+    assert "<production_date>03.02.2025</production_date>" in xml
+    assert "<certificate_date>5.1.2025</certificate_date>" in xml
+    assert "2025-02-03" not in xml
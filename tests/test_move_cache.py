@@ -0,0 +1,85 @@
+import io
+
+import pytest
+
+import move_cache
+from code_check import check_digit
+from move_cache import MoveCache
+
+
+def _sscc(i: int) -> str:
+    body = f"{46 * 10 ** 15 + i:017d}"
+    return body + str(check_digit(body))
+
+
+def _xml(doc_num: str, codes: list[str]) -> bytes:
+    body = "".join(f"<sscc>{c}</sscc>" for c in codes)
+    return (f"<move_order_notification><doc_num>{doc_num}</doc_num><doc_date>28.10.2025</doc_date>"
+            f"{body}</move_order_notification>").encode("utf-8")
+
+
+@pytest.fixture()
+def db(tmp_path):
+    return str(tmp_path / "move_cache.sqlite3")
+
+
+def test_second_scan_is_a_hit(db):
+    cache = MoveCache(path=db)
+    data = _xml("N1", [_sscc(i) for i in range(5)] + ["не-SSCC"])
+    first = cache.scan(io.BytesIO(data))
+    second = cache.scan(io.BytesIO(data))
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["codes"] == first["codes"] and second["codes"][-1] == "не-SSCC"
+    assert (second["doc_num"], second["doc_date"]) == ("N1", "28.10.2025")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_unseekable_stream_fills_the_cache(db):
+    class Stream(io.RawIOBase):
+        def __init__(self, data):
+            self.inner = io.BytesIO(data)
+
+        def readable(self):
+            return True
+
+        def readinto(self, b):
+            return self.inner.readinto(b)
+
+        def seekable(self):
+            return False
+
+    cache = MoveCache(path=db)
+    data = _xml("N2", [_sscc(1)])
+    assert not cache.scan(Stream(data))["cached"]
+    assert cache.scan(io.BytesIO(data))["cached"]
+
+
+def test_evicts_least_recently_used(db):
+    cache = MoveCache(path=db, max_entries=2)
+    files = [_xml(f"N{i}", [_sscc(i)]) for i in range(3)]
+    cache.scan(io.BytesIO(files[0]))
+    cache.scan(io.BytesIO(files[1]))
+    assert cache.scan(io.BytesIO(files[0]))["cached"]        # N0 свежее N1
+    cache.scan(io.BytesIO(files[2]))                          # вытесняет N1
+    assert cache.stats()["evictions"] == 1
+    assert cache.scan(io.BytesIO(files[0]))["cached"]
+    assert not cache.scan(io.BytesIO(files[1]))["cached"]
+
+
+def test_other_scanner_version_clears_the_cache(db, monkeypatch):
+    data = _xml("N1", [_sscc(1)])
+    MoveCache(path=db).scan(io.BytesIO(data))
+    assert MoveCache(path=db).scan(io.BytesIO(data))["cached"]
+    monkeypatch.setattr(move_cache, "SCAN_VERSION", move_cache.SCAN_VERSION + 1)
+    cache = MoveCache(path=db)
+    assert cache.stats()["entries"] == 0
+    assert not cache.scan(io.BytesIO(data))["cached"]
+
+
+def test_disabled_cache_always_parses(db):
+    cache = MoveCache(path=db)
+    cache.enabled = False
+    data = _xml("N1", [_sscc(1)])
+    assert [cache.scan(io.BytesIO(data))["cached"] for _ in range(2)] == [False, False]
+    assert cache.stats()["entries"] == 0
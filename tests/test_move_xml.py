@@ -0,0 +1,98 @@
+import io
+
+import pytest
+
+from move_xml import iter_move_tags, scan_move_bytes, scan_move_xml
+
+
+def _collect(pairs) -> dict:
+    out = {"codes": [], "doc_num": None, "doc_date": None}
+    for name, value in pairs:
+        if name == "sscc":
+            out["codes"].append(value)
+        else:
+            assert out[name] is None, f"{name} отдан дважды"
+            out[name] = value
+    return out
+
+
+def _codes(n: int) -> list[str]:
+    return [f"{46 * 10 ** 16 + i:018d}" for i in range(n)]
+
+
+DOC = (
+    "мусор до заголовка\n"
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<ns:move xmlns:ns="urn:x">'
+    "<ns:doc_num> № 601/7 &amp; Ко </ns:doc_num>"
+    "<doc_date>01.02.2025</doc_date>"
+    "<sscc>046000000000000001</sscc>"
+    "<ns:sscc><![CDATA[046000000000000002]]></ns:sscc>"
+    '<SSCC id="3" >046000000000000003</SSCC>'
+    "< sscc>046000000000000004</sscc >"
+    "<sscc/>"
+    '<sscc kind="x"/>'
+    "<sscc>  </sscc>"
+    "<ssccs>000000000000000000</ssccs>"
+    "<sscc>\n  046000000000000005\n</sscc>"
+    "<doc_num>второй</doc_num>"
+    "<doc_date>02.02.2025</doc_date>"
+    "</ns:move>"
+)
+EXPECTED = {
+    "codes": [f"04600000000000000{i}" for i in range(1, 6)],
+    "doc_num": "№ 601/7 & Ко",
+    "doc_date": "01.02.2025",
+}
+
+
+def test_scan_move_bytes_edge_cases():
+    assert scan_move_bytes(DOC.encode("utf-8")) == EXPECTED
+    assert scan_move_bytes(DOC) == EXPECTED
+
+
+@pytest.mark.parametrize("chunk_size", range(1, len(DOC.encode("utf-8")) + 2))
+def test_iter_move_tags_any_chunk_size(chunk_size):
+    assert _collect(iter_move_tags(io.BytesIO(DOC.encode("utf-8")), chunk_size)) == EXPECTED
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 17, 100, 10 ** 6])
+def test_iter_move_tags_str_stream(chunk_size):
+    assert _collect(iter_move_tags(io.StringIO(DOC), chunk_size)) == EXPECTED
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64, 10 ** 6])
+def test_windows_1251_doc_num(chunk_size):
+    doc = '<?xml version="1.0" encoding="windows-1251"?><d><doc_num>№ Пр-1</doc_num><sscc>1</sscc></d>'
+    expected = {"codes": ["1"], "doc_num": "№ Пр-1", "doc_date": None}
+    assert _collect(iter_move_tags(io.BytesIO(doc.encode("cp1251")), chunk_size)) == expected
+    assert scan_move_bytes(doc.encode("cp1251")) == expected
+    # уже раскодированный текст: объявленная кодировка не применяется повторно
+    assert _collect(iter_move_tags(io.StringIO(doc), chunk_size)) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1000])
+def test_many_codes_keep_document_order(chunk_size):
+    codes = _codes(500)
+    doc = "<r>" + "".join(f"<sscc>{c}</sscc>\n" for c in codes) + "</r>"
+    assert scan_move_xml(io.BytesIO(doc.encode("ascii"))) == {"codes": codes, "doc_num": None, "doc_date": None}
+    assert _collect(iter_move_tags(io.BytesIO(doc.encode("ascii")), chunk_size))["codes"] == codes
+
+
+@pytest.mark.parametrize("data", [b"", b"<r/>", b"no xml at all", b"<sscc>1", b"<?xml encoding="])
+def test_empty_and_broken(data):
+    empty = {"codes": [], "doc_num": None, "doc_date": None}
+    assert _collect(iter_move_tags(io.BytesIO(data), 2)) == empty
+    assert scan_move_bytes(data) == empty
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5])
+def test_unclosed_tail_same_in_both_scanners(chunk_size):
+    # битый хвост без ">" сканер прощает — одинаково в потоке и целиком
+    data = b"<r><sscc>1</sscc><sscc>2</sscc"
+    assert _collect(iter_move_tags(io.BytesIO(data), chunk_size)) == scan_move_bytes(data)
+
+
+def test_codes_false_reads_only_doc_fields():
+    assert scan_move_bytes(DOC, codes=False) == {**EXPECTED, "codes": []}
+    assert scan_move_bytes("<doc_date/><doc_date>  </doc_date><doc_date>1</doc_date>", codes=False)["doc_date"] == "1"
@@ -0,0 +1,69 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import token_cache
+from token_cache import TOKENS, TokenCache, on_response, token_from_url
+
+KEY = ("SOTEX", "27")
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(token_cache, "time", SimpleNamespace(monotonic=lambda: now[0]))   # только часы кэша
+    return now
+
+
+def test_token_expires_after_ttl(clock):
+    cache = TokenCache(ttl=60)
+    cache.put(KEY, "t1")
+    clock[0] += 59
+    assert cache.get(KEY) == "t1"
+    clock[0] += 1
+    assert cache.get(KEY) is None
+    cache.put(KEY, "t2", ttl=5)                             # свой TTL из ответа авторизации
+    clock[0] += 4
+    assert cache.get(KEY) == "t2"
+    clock[0] += 1
+    assert cache.get(KEY) is None
+
+
+def test_invalidate_token_drops_every_key_with_it():
+    cache = TokenCache(ttl=60)
+    cache.put(KEY, "t1")
+    cache.put(("SOTEX", "45"), "t1")
+    cache.put(("OTHER", "27"), "t2")
+    cache.invalidate_token("t1")
+    assert cache.get(KEY) is None and cache.get(("SOTEX", "45")) is None
+    assert cache.get(("OTHER", "27")) == "t2"
+
+
+def test_401_in_url_invalidates_shared_cache():
+    TOKENS.clear()
+    try:
+        TOKENS.put(KEY, "abc")
+        on_response("http://vendor/api/incom?access-token=abc", 500)
+        assert TOKENS.get(KEY) == "abc"                       # не 401 — токен живой
+        on_response("http://vendor/api/incom?page=1&access-token=abc", 401)
+        assert TOKENS.get(KEY) is None
+    finally:
+        TOKENS.clear()
+
+
+def test_token_from_url():
+    assert token_from_url("http://vendor/api/outcom?access-token=x1&y=2") == "x1"
+    assert token_from_url("http://vendor/api/outcom") is None
+
+
+def test_lock_for_is_one_lock_per_key():
+    cache = TokenCache(ttl=60)
+    locks = []
+    threads = [threading.Thread(target=lambda: locks.append(cache.lock_for(KEY))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(lock) for lock in locks}) == 1
+    assert cache.lock_for(("OTHER", "27")) is not locks[0]
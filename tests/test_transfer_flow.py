@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+import transfer_flow
+from flow_store import FlowStore
+from mock_vendor import MockVendor
+from token_cache import TOKENS
+from transfer_flow import FlowError, run_chain
+
+CODES = [f"{46 * 10 ** 16 + i:018d}" for i in range(5)]
+
+
+@pytest.fixture()
+def vendor(monkeypatch):
+    mock = MockVendor(latency_ms=0, jitter_ms=0).start()
+    monkeypatch.setattr(transfer_flow, "vendor_base_url", lambda cfg, name: mock.url)
+    TOKENS.clear()
+    yield mock
+    mock.stop()
+    TOKENS.clear()
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return FlowStore(str(tmp_path / "flows.sqlite3"))
+
+
+def _flow(store: FlowStore) -> str:
+    flow_id = store.create()
+    store.update(flow_id, flow_ctx={"vendor": "SOTEX", "md1": "27", "md2": "45", "invoice": "INV-1",
+                                    "transfer_date": "2025-10-28", "doc_num": "N1", "doc_date": "2025-10-27"})
+    store.put_codes(flow_id, "base", CODES)
+    return flow_id
+
+
+def _requests(mock: MockVendor) -> dict:
+    return {path: row["requests"] for path, row in mock.stats()["endpoints"].items()}
+
+
+def _revoke_before(monkeypatch, mock: MockVendor, step_key: str):
+    """Сервер «забывает» все токены прямо перед первой отправкой step_key"""
+    original = transfer_flow.send_step
+    done = []
+
+    def send_step(store, flow_id, key, *args, **kwargs):
+        if key == step_key and not done:
+            done.append(key)
+            with mock._lock:
+                mock._tokens.clear()
+        return original(store, flow_id, key, *args, **kwargs)
+
+    monkeypatch.setattr(transfer_flow, "send_step", send_step)
+
+
+def test_chain_runs_and_reuses_cached_tokens(vendor, store):
+    first, second = _flow(store), _flow(store)
+    assert run_chain(store, first)
+    assert run_chain(store, second)
+    counts = _requests(vendor)
+    assert counts["/api/auth"] == 2                       # вторая цепочка взяла оба токена из кэша
+    assert counts["/api/incom"] == 4 and counts["/api/outcom"] == 2
+    assert store.get(second)["last_step"] == "incom2"
+    tokens = {store.get(first)["flow_ctx"]["token1"], store.get(first)["flow_ctx"]["token2"]}
+    journal = json.dumps(store.get_logs(first), ensure_ascii=False)
+    assert "/api/incom →" in journal and not any(t in journal for t in tokens)
+
+
+def test_401_on_outcom_refreshes_token_and_retries_only_outcom(vendor, store, monkeypatch):
+    _revoke_before(monkeypatch, vendor, "outcom")
+    flow_id = _flow(store)
+    assert run_chain(store, flow_id)
+    counts = _requests(vendor)
+    assert counts["/api/v1/document/tsd-run"] == 2        # accept1/accept2 — по одному разу
+    assert counts["/api/incom"] == 2                      # incom1 не повторялся
+    assert counts["/api/outcom"] == 2                     # 401 + повтор с новым токеном
+    assert counts["/api/auth"] == 3                       # auth1, обновление auth1, auth2
+    ctx = store.get(flow_id)["flow_ctx"]
+    assert "reauth" not in ctx
+    assert store.get_response(flow_id, "outcom")["status"] == 200
+
+
+def test_401_then_failed_refresh_resumes_at_failed_step(vendor, store, monkeypatch):
+    flow_id = _flow(store)
+    _revoke_before(monkeypatch, vendor, "incom1")
+    real_creds = transfer_flow.get_creds_for
+    calls = []
+
+    def creds(cfg, name, object_id):
+        calls.append(object_id)
+        return ("", "") if len(calls) == 2 else real_creds(cfg, name, object_id)   # повторный auth1 — 400
+
+    monkeypatch.setattr(transfer_flow, "get_creds_for", creds)
+    with pytest.raises(FlowError) as exc:
+        run_chain(store, flow_id)
+    assert exc.value.step == "auth1"
+    state = store.get(flow_id)
+    assert state["last_step"] == "accept1"                # не откатились к началу цепочки
+    assert state["flow_ctx"]["reauth"] == "auth1"
+
+    assert run_chain(store, flow_id)                      # продолжение: новый токен → incom1 ещё раз
+    counts = _requests(vendor)
+    assert counts["/api/v1/document/tsd-run"] == 2        # второго документа приёмки нет
+    assert counts["/api/incom"] == 3                      # 401 + повтор incom1 + incom2
+    assert counts["/api/outcom"] == 1
+
+
+def test_failed_step_is_not_marked_done(vendor, store, monkeypatch):
+    flow_id = _flow(store)
+    vendor.settings["max_codes"] = 1                      # incom1 → 413 (одним запросом, без чанков)
+    with pytest.raises(FlowError, match="incom1"):
+        run_chain(store, flow_id)
+    assert store.get(flow_id)["last_step"] == "accept1"
+    vendor.settings["max_codes"] = 0
+    assert run_chain(store, flow_id)
+    assert _requests(vendor)["/api/v1/document/tsd-run"] == 2
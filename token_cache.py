@@ -0,0 +1,78 @@
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import http_client
+
+
+# =========================================================
+# ======= Кэш токенов авторизации (вендор, МД) → token =====
+# =========================================================
+
+DEFAULTS = {
+    "token_ttl": 900     # сек. жизни токена в кэше (сервер может протухнуть раньше — тогда ловим 401)
+}
+
+
+class TokenCache:
+    """Потокобезопасный кэш токенов с TTL; общий для всех сессий процесса"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._tokens: dict[tuple, tuple[str, float]] = {}   # key → (token, expires_at)
+        self._lock = threading.Lock()
+        self._key_locks: dict[tuple, threading.Lock] = {}
+
+    def get(self, key: tuple) -> str | None:
+        with self._lock:
+            item = self._tokens.get(key)
+            if item is None:
+                return None
+            token, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._tokens[key]
+                return None
+            return token
+
+    def put(self, key: tuple, token: str, ttl: float | None = None):
+        with self._lock:
+            self._tokens[key] = (token, time.monotonic() + (self.ttl if ttl is None else ttl))
+
+    def invalidate(self, key: tuple):
+        with self._lock:
+            self._tokens.pop(key, None)
+
+    def invalidate_token(self, token: str):
+        """Сервер ответил 401 на этот токен — выкидываем его, под каким бы ключом он ни лежал"""
+        with self._lock:
+            for key in [k for k, (t, _) in self._tokens.items() if t == token]:
+                del self._tokens[key]
+
+    def lock_for(self, key: tuple) -> threading.Lock:
+        """Лок на ключ: держим его на время авторизации, чтобы остальные дождались токен из кэша"""
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+
+
+def token_from_url(url: str) -> str | None:
+    """'...?access-token=XXX' → 'XXX'"""
+    values = parse_qs(urlsplit(url).query).get("access-token")
+    return values[0] if values else None
+
+
+def on_response(url: str, status: int | None):
+    """Хук после любого запроса: 401 по токену из URL → инвалидация"""
+    if status == 401:
+        token = token_from_url(url)
+        if token:
+            TOKENS.invalidate_token(token)
+
+
+TOKENS = TokenCache(http_client.load_section("AUTH", DEFAULTS)["token_ttl"])
@@ -0,0 +1,376 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+import http_client
+import metrics
+import token_cache
+from app_logging import safe_url
+from batching import should_chunk, send_codes_in_chunks
+from config import Config, get_config
+from flow_store import FlowStore
+from token_cache import TOKENS
+
+
+# =========================================================
+# ===== Цепочка перемещения: шаги без привязки к Flask =====
+# =========================================================
+#
+# auth1 → accept1 → incom1 → outcom → auth2 → accept2 → incom2
+#
+# Всё состояние — в FlowStore по flow_id, поэтому одну и ту же машину шагов
+# крутят и Flask (debug-режим с подтверждениями), и фоновые задачи (jobs.py).
+
+# шаги, где в теле летит весь список кодов — их отправляем чанками (см. varables/http.json → BATCH)
+CHUNKED_STEPS = ("incom1", "outcom", "incom2")
+AUTH_STEPS = {"auth1": "md1", "auth2": "md2"}
+TOKEN_FIELDS = {"auth1": "token1", "auth2": "token2"}     # куда в flow_ctx кладётся токен авторизации
+# какой авторизацией получен токен шага. 401 на шаге → токен мёртв: last_step остаётся на месте,
+# в flow_ctx["reauth"] — эта авторизация; продолжение обновит токен и повторит только упавший шаг
+TOKEN_OF = {"accept1": "auth1", "incom1": "auth1", "outcom": "auth1", "accept2": "auth2", "incom2": "auth2"}
+
+
+@dataclass
+class Step:
+    """Очередной запрос цепочки"""
+    key: str
+    title: str
+    url: str
+    payload: dict
+    method: str = "POST"
+
+
+class FlowError(Exception):
+    """Шаг не может продолжиться (нет токена/document_id и т.п.)"""
+    def __init__(self, step: str, message: str):
+        super().__init__(message)
+        self.step = step
+
+
+def vendor_base_url(cfg: Config, vendor: str) -> str:
+    vendor = vendor.strip().upper()
+    try:
+        return cfg.base_urls[vendor]
+    except KeyError:
+        raise ValueError(f"Нет ссылки dev для {vendor} в varables/links.json")
+
+
+def get_creds_for(cfg: Config, vendor: str, object_id: str) -> tuple[str, str]:
+    # объект → МД берётся из varables/objects.json (OBJECT_TO_MD), сам индекс строит Config
+    account = cfg.account(vendor, object_id)
+    if account is None:
+        raise ValueError(f"Нет логина/пароля для {vendor}:{object_id} (МД {cfg.md_of(object_id)}) в varables/accounts.json")
+    return account.login, account.password
+
+
+def auth_key(vendor: str, object_id: str) -> tuple[str, str]:
+    """Ключ кэша токенов: (вендор, МД) — объект сразу приводим к МД"""
+    return vendor.strip().upper(), get_config().md_of(object_id)
+
+
+def log(store: FlowStore, flow_id: str, step, action, status, message, duration_ms: int | None = None):
+    entry = {
+        "time": datetime.now().strftime("%H:%M:%S"),
+        "step": step,
+        "action": action,
+        "status": status,   # 🟢/🔴
+        "message": message
+    }
+    if duration_ms is not None:
+        entry["duration_ms"] = duration_ms   # сколько шёл запрос шага (колонка «мс» в журнале)
+    store.add_log(flow_id, entry)
+
+
+def response_ok(response: dict) -> bool:
+    """Ответ шага из store — 2xx (у чанков — все чанки ушли)"""
+    status = response.get("status")
+    return isinstance(status, int) and 200 <= status < 300
+
+
+def safe_json(resp):
+    try:
+        return resp.json()
+    except Exception:
+        return None
+
+
+# ---------- шаги ----------
+def auth_step(store: FlowStore, flow_id: str, step_key: str) -> Step:
+    """auth1/auth2 по flow_ctx"""
+    ctx = store.get(flow_id).get("flow_ctx") or {}
+    cfg = get_config()
+    base = vendor_base_url(cfg, ctx["vendor"])
+    login, password = get_creds_for(cfg, ctx["vendor"], ctx[AUTH_STEPS[step_key]])
+    title = "Авторизация (1)" if step_key == "auth1" else "Авторизация (2)"
+    return Step(step_key, title, f"{base}/api/auth", {"login": login, "password": password})
+
+
+def first_step(store: FlowStore, flow_id: str) -> Step:
+    return auth_step(store, flow_id, "auth1")
+
+
+def resume_step(store: FlowStore, flow_id: str) -> Step | None:
+    """Шаг после last_step (с начала, если ничего не выполнено)"""
+    last = store.get(flow_id).get("last_step")
+    return next_step(store, flow_id, last) if last else first_step(store, flow_id)
+
+
+def next_step(store: FlowStore, flow_id: str, step_key: str) -> Step | None:
+    """
+    Переход к следующему шагу цепочки.
+    Извлекаем нужные данные из ответа прошлого шага, сохраняем их в flow_ctx
+    и возвращаем следующий запрос (None — цепочка завершена).
+    """
+    ctx = store.get(flow_id).get("flow_ctx") or {}
+    cfg = get_config()
+
+    vendor = ctx.get("vendor")
+    base = vendor_base_url(cfg, vendor)
+
+    # ответы и коды читаем из store только там, где они нужны
+    # auth:   {"token":{"id": "..."}}
+    # accept: {"data":{"id": "..."}}
+    def raw(step_name):
+        return store.get_response(flow_id, step_name)
+
+    def get_token(step_name):
+        j = raw(step_name).get("json") or {}
+        return (((j.get("token") or {}).get("id")) if isinstance(j, dict) else None)
+
+    def get_doc_id(step_name):
+        j = raw(step_name).get("json") or {}
+        data = j.get("data") if isinstance(j, dict) else None
+        if isinstance(data, dict):
+            return data.get("id") or data.get("doc_id")
+        return None
+
+    # шаг ответил ошибкой — дальше не идём: last_step на нём не сдвинулся, продолжение повторит его
+    last = raw(step_key)
+    if not response_ok(last):
+        raise FlowError(step_key, f"Шаг {step_key} не выполнен: HTTP {last.get('status') or 'нет ответа'}")
+
+    if step_key == "auth1":
+        token1 = get_token("auth1")
+        if not token1:
+            raise FlowError("auth1", "Не получили token1")
+        ctx["token1"] = token1
+        store.update(flow_id, flow_ctx=ctx)
+        if raw("auth1").get("text") != "cached":
+            TOKENS.put(auth_key(vendor, ctx["md1"]), token1)
+        # → заявка 1
+        payload = {
+            "data": {"action_id": 701, "doc_date_mdlp": ctx["doc_date"], "doc_num_mdlp": ctx["doc_num"]},
+            "doc_date": ctx["doc_date"],
+            "doc_id": ctx["doc_num"],
+            "doc_num": ctx["doc_num"],
+            "facility_id": int(ctx["md1"]),
+            "object_id": int(ctx["md1"]),
+            "product_group_id": 12,
+            "type_id": 35
+        }
+        url = f'{base}/api/v1/document/tsd-run?access-token={token1}'
+        return Step("accept1", "Заявка на приёмку (1)", url, payload)
+
+    if step_key == "accept1":
+        doc_id1 = get_doc_id("accept1")
+        if not doc_id1:
+            raise FlowError("accept1", "Не получили document_id (1)")
+        ctx["doc_id1"] = doc_id1
+        store.update(flow_id, flow_ctx=ctx)
+        # → имитация ТСД (1)
+        payload = {
+            "codes": store.get_codes(flow_id, "base"),
+            "document_id": doc_id1,
+            "hasStaffed": True,
+            "object_uid": int(ctx["md1"])
+        }
+        url = f'{base}/api/incom?access-token={ctx["token1"]}'
+        return Step("incom1", "Имитация ТСД (1)", url, payload)
+
+    if step_key == "incom1":
+        # → перемещение
+        payload = {
+            "codes": store.get_codes(flow_id, "base"),
+            "hasStaffed": False,
+            "invoice": ctx["invoice"],
+            "invoiceDate": ctx["transfer_date"],
+            "object_uid": int(ctx["md2"])
+        }
+        url = f'{base}/api/outcom?access-token={ctx["token1"]}'
+        return Step("outcom", "Перемещение", url, payload)
+
+    if step_key == "outcom":
+        # → авторизация 2
+        return auth_step(store, flow_id, "auth2")
+
+    if step_key == "auth2":
+        token2 = get_token("auth2")
+        if not token2:
+            raise FlowError("auth2", "Не получили token2")
+        ctx["token2"] = token2
+        store.update(flow_id, flow_ctx=ctx)
+        if raw("auth2").get("text") != "cached":
+            TOKENS.put(auth_key(vendor, ctx["md2"]), token2)
+        # → заявка 2
+        payload = {
+            "data": {"action_id": 701, "doc_date_mdlp": ctx["transfer_date"], "doc_num_mdlp": ctx["invoice"]},
+            "doc_date": ctx["transfer_date"],
+            "doc_id": ctx["invoice"],
+            "doc_num": ctx["invoice"],
+            "facility_id": int(ctx["md2"]),
+            "object_id": int(ctx["md2"]),
+            "product_group_id": 12,
+            "type_id": 35
+        }
+        url = f'{base}/api/v1/document/tsd-run?access-token={token2}'
+        return Step("accept2", "Заявка на приёмку (2)", url, payload)
+
+    if step_key == "accept2":
+        doc_id2 = get_doc_id("accept2")
+        if not doc_id2:
+            raise FlowError("accept2", "Не получили document_id (2)")
+        ctx["doc_id2"] = doc_id2
+        store.update(flow_id, flow_ctx=ctx)
+        # → имитация ТСД (2)
+        payload = {
+            "codes": store.get_codes(flow_id, "base"),
+            "document_id": doc_id2,
+            "hasStaffed": True,
+            "object_uid": int(ctx["md2"])
+        }
+        url = f'{base}/api/incom?access-token={ctx["token2"]}'
+        return Step("incom2", "Имитация ТСД (2)", url, payload)
+
+    # incom2 (или неизвестный шаг) — дальше идти некуда
+    return None
+
+
+def use_cached_auth(store: FlowStore, flow_id: str, step: Step, mark_done: bool = True) -> bool:
+    """Шаг авторизации: если для (вендор, МД) есть живой токен — кладём его как ответ и не ходим в сеть"""
+    if step.key not in AUTH_STEPS:
+        return False
+    ctx = store.get(flow_id).get("flow_ctx") or {}
+    object_id = ctx[AUTH_STEPS[step.key]]
+    token = TOKENS.get(auth_key(ctx["vendor"], object_id))
+    if not token:
+        return False
+    log(store, flow_id, step.key, "Токен из кэша", "🟢", f"{ctx['vendor']}:{object_id} — авторизация пропущена")
+    metrics.cached_step(ctx["vendor"], step.key, step.url)
+    store.set_response(flow_id, step.key, {
+        "status": 200,
+        "json": {"token": {"id": token}},
+        "text": "cached"
+    })
+    if mark_done:
+        store.update(flow_id, last_step=step.key)
+    return True
+
+
+def needs_reauth(store: FlowStore, flow_id: str, step_key: str) -> bool:
+    """Токен этого шага уже получал 401 — перед отправкой его надо обновить"""
+    ctx = store.get(flow_id).get("flow_ctx") or {}
+    return step_key in TOKEN_OF and ctx.get("reauth") == TOKEN_OF[step_key]
+
+
+def refresh_token(store: FlowStore, flow_id: str, step_key: str) -> str:
+    """
+    Заново пройти авторизацию step_key (auth1/auth2) после 401: ответ и новый токен — в store,
+    flow_ctx и кэш токенов. last_step не трогаем — продолжение повторит только упавший шаг.
+    """
+    ctx = store.get(flow_id).get("flow_ctx") or {}
+    step = auth_step(store, flow_id, step_key)
+    key = auth_key(ctx["vendor"], ctx[AUTH_STEPS[step_key]])
+    with TOKENS.lock_for(key):
+        if not use_cached_auth(store, flow_id, step, mark_done=False):
+            send_step(store, flow_id, step.key, step.url, step.payload, step.method, mark_done=False)
+        response = store.get_response(flow_id, step_key)
+        j = response.get("json")
+        token = ((j.get("token") or {}).get("id")) if isinstance(j, dict) else None
+        if not response_ok(response) or not token:
+            raise FlowError(step_key, f"Не удалось обновить токен: HTTP {response.get('status') or 'нет ответа'}")
+        if response.get("text") != "cached":
+            TOKENS.put(key, token)
+    ctx = store.get(flow_id).get("flow_ctx") or {}
+    ctx[TOKEN_FIELDS[step_key]] = token
+    ctx.pop("reauth", None)
+    store.update(flow_id, flow_ctx=ctx)
+    log(store, flow_id, step_key, "Токен обновлён", "🟢", "после 401 — повторяем только упавший шаг")
+    return token
+
+
+def send_step(store: FlowStore, flow_id: str, step_key: str, url: str, payload: dict, method: str = "POST",
+              mark_done: bool = True) -> dict:
+    """
+    Фактическая отправка запроса шага: ответ — в store (следующий шаг вытащит из него токен/id),
+    короткая запись — в журнал. Последним выполненным (для продолжения) шаг отмечается,
+    только если ответ успешный (и mark_done) — иначе продолжение отправит его ещё раз.
+    401 на шаге с токеном помечает токен для обновления (needs_reauth).
+    Длительность, размеры тел, число кодов и статус уходят в metrics (/metrics).
+    """
+    vendor = (store.get(flow_id).get("flow_ctx") or {}).get("vendor")
+    codes = len(payload.get("codes") or [])
+    if step_key in CHUNKED_STEPS and should_chunk(payload.get("codes") or []):
+        # большой список кодов: шлём чанками параллельно, сохраняем агрегат
+        with metrics.StepTimer(vendor, step_key, url) as timer:
+            result = send_codes_in_chunks(url, payload, method=method)
+            timer.done(result["status"] or "error", result["request_bytes"], result["response_bytes"], codes)
+        token_cache.on_response(url, result["status"])
+        log(store, flow_id, step_key, f"HTTP {method} (чанки)", "🟢" if result["ok"] else "🔴",
+            f"{safe_url(url)} → {result['text']}", timer.ms)
+        response = {"status": result["status"], "json": result["json"], "text": result["text"]}
+        ok = result["ok"]
+    else:
+        with metrics.StepTimer(vendor, step_key, url) as timer:
+            resp = http_client.request(method, url, json=payload, headers={"Content-Type": "application/json"})
+            timer.done(resp.status_code, len(resp.request.body or b""), len(resp.content), codes)
+        token_cache.on_response(url, resp.status_code)
+        # короткий лог
+        log(store, flow_id, step_key, f"HTTP {method}", "🟢" if resp.ok else "🔴",
+            f"{safe_url(url)} → {resp.status_code}", timer.ms)
+        response = {
+            "status": resp.status_code,
+            "json": safe_json(resp),
+            "text": resp.text[:1000]  # safety
+        }
+        ok = resp.ok
+    store.set_response(flow_id, step_key, response)
+    if ok and mark_done:
+        store.update(flow_id, last_step=step_key)
+    elif response["status"] == 401 and step_key in TOKEN_OF:
+        ctx = store.get(flow_id).get("flow_ctx") or {}
+        ctx["reauth"] = TOKEN_OF[step_key]
+        store.update(flow_id, flow_ctx=ctx)
+        log(store, flow_id, step_key, "Токен отклонён", "🔴", "401 — обновим токен и повторим этот шаг")
+    return response
+
+
+def run_chain(store: FlowStore, flow_id: str, should_stop=lambda: False):
+    """
+    Прогнать цепочку до конца без подтверждений.
+    Продолжает с шага после last_step (если он есть) — так перезапуск не повторяет сделанное.
+    Шаг, получивший 401, повторяется (один раз за прогон) с обновлённым токеном.
+    Бросает FlowError / исключения HTTP.
+    """
+    step = resume_step(store, flow_id)
+    retried = set()
+    while step is not None:
+        if should_stop():
+            return False
+        store.update(flow_id, current_step=step.key)
+        if needs_reauth(store, flow_id, step.key):
+            refresh_token(store, flow_id, TOKEN_OF[step.key])
+            step = resume_step(store, flow_id)        # тот же шаг, но с новым токеном в URL
+        if step.key in AUTH_STEPS:
+            # параллельные цепочки с тем же (вендор, МД) ждут одну авторизацию, а не шлют свои
+            ctx = store.get(flow_id).get("flow_ctx") or {}
+            with TOKENS.lock_for(auth_key(ctx["vendor"], ctx[AUTH_STEPS[step.key]])):
+                if not use_cached_auth(store, flow_id, step):
+                    send_step(store, flow_id, step.key, step.url, step.payload, step.method)
+                step = next_step(store, flow_id, step.key)   # здесь токен попадает в кэш
+            continue
+        send_step(store, flow_id, step.key, step.url, step.payload, step.method)
+        if step.key not in retried and needs_reauth(store, flow_id, step.key):
+            retried.add(step.key)
+            continue
+        step = next_step(store, flow_id, step.key)
+    log(store, flow_id, "finish", "Готово", "🟢", "Цепочка завершена")
+    return True